@@ -40,7 +40,9 @@ CREATE TABLE books (
     ratings_4 INT,
     ratings_5 INT,
     image_url VARCHAR(500),
-    small_image_url VARCHAR(500)
+    small_image_url VARCHAR(500),
+    weighted_rating DECIMAL(5,4),  -- Bayesian-average rating, filled by Dashboard603/weighted_ratings.py
+    INDEX idx_books_weighted_rating (weighted_rating, ratings_count)
 );
 
 -- Tags table
@@ -59,10 +61,13 @@ CREATE TABLE book_tags (
 );
 
 -- User ratings
+-- rating_id increases with every appended rating; summaries.py uses it as a refresh watermark
 CREATE TABLE ratings (
+    rating_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
     user_id INT,
     book_id INT,
     rating INT,
+    INDEX idx_ratings_user (user_id),
     FOREIGN KEY (book_id) REFERENCES books(book_id)
 );
 
@@ -122,7 +127,8 @@ CREATE TABLE to_read (
 -- INTO TABLE ratings
 -- FIELDS TERMINATED BY ','
 -- ENCLOSED BY '"'
--- IGNORE 1 ROWS;
+-- IGNORE 1 ROWS
+-- (user_id, book_id, rating);
 --
 -- LOAD DATA LOCAL INFILE '/path/to/Dashboard603/data/to_read.csv'
 -- INTO TABLE to_read
@@ -239,3 +245,34 @@ JOIN tags t ON t.tag_id = bt.tag_id;
 -- Example usage:
 -- SELECT * FROM book_with_tags LIMIT 20;
 
+
+
+-- ---------------------------------------------------------
+-- PART 8: SUMMARY TABLES
+--
+-- Precomputed aggregates read by the dashboard instead of scanning ratings.
+-- Populate and refresh them with:
+--        python3 Dashboard603/summaries.py          (incremental)
+--        python3 Dashboard603/summaries.py --full   (rebuild)
+-- ---------------------------------------------------------
+
+-- Per-user rating aggregates (Top Contributors)
+CREATE TABLE IF NOT EXISTS user_rating_summary (
+    user_id INT PRIMARY KEY,
+    books_rated INT NOT NULL,
+    rating_sum BIGINT NOT NULL,
+    min_rating INT NOT NULL,
+    max_rating INT NOT NULL,
+    INDEX idx_user_summary_books_rated (books_rated)
+);
+
+-- Catalog-wide counts (Collection Metrics); always a single row with id = 1
+CREATE TABLE IF NOT EXISTS rating_stats (
+    id TINYINT PRIMARY KEY,
+    book_count INT NOT NULL,
+    user_count INT NOT NULL,
+    rating_count BIGINT NOT NULL,
+    last_rating_id BIGINT NOT NULL,
+    refreshed_at DATETIME NOT NULL,
+    rebuilt_at DATETIME  -- last full rebuild; summaries.py rebuilds every SUMMARIES_REBUILD_INTERVAL
+);
@@ -1,7 +1,8 @@
+import time
+
 import streamlit as st
 import pandas as pd
 from neo4j_queries import (
-    driver,
     get_all_tags,
     get_all_book_titles,
     get_books_by_tag,
@@ -17,7 +18,20 @@ from neo4j_queries import (
     get_book_with_most_tags,
 )
 import sql_queries as sql
-from graph_utils import build_recommendation_graph
+import book_ratings
+import search_index
+import recommendations
+import collaborative
+import path_service
+import config
+import instrumentation
+import neo4j_db
+import neo4j_schema
+import tag_catalog
+from cache import data_reloaded
+from graph_utils import build_recommendation_graph, level_of_detail, render_graph_html
+from graph_component import recommendation_graph
+from panel_scheduler import PanelScheduler
 import streamlit.components.v1 as components
 
 # Page config with custom theme
@@ -153,8 +167,69 @@ st.markdown("""
 # Helper to run Neo4j read transactions
 # ------------------------------
 def run_neo4j_read(fn, *args, **kwargs):
-    with driver.session() as session:
-        return session.execute_read(fn, *args, **kwargs)
+    # Cached results are served without a session; otherwise one is borrowed from the
+    # bounded session pool in neo4j_db.py
+    return neo4j_db.read(fn, *args, **kwargs)
+
+
+def load_dropdown_tags():
+    # Served from the precomputed tag catalog; Cypher only if it is missing or stale
+    tags = tag_catalog.get_all_tags()
+    if tags is None:
+        tags = run_neo4j_read(get_all_tags)
+    return [t["tag"] for t in tags]
+
+
+@st.cache_resource(show_spinner="Checking Neo4j indexes...")
+def missing_neo4j_indexes():
+    # Tag and title lookups match on indexed lowercase properties. The dashboard only reads
+    # the graph; the indexes are created by ingest.py or `python neo4j_schema.py bootstrap`.
+    # Checked once per process; failures raise, so they are not cached
+    return neo4j_schema.missing_indexes()
+
+
+def neo4j_lookup_ready(index_name):
+    # The tag and title lookups match only the lowercase copies the bootstrap writes, so on a
+    # graph without them they would return nothing; show why instead of an empty panel
+    try:
+        missing = missing_neo4j_indexes()
+    except Exception:
+        return True  # could not check; already warned about at the top of the page
+    if index_name in missing:
+        st.error(f"This panel needs the Neo4j index {index_name}. Run: python neo4j_schema.py bootstrap")
+        return False
+    return True
+
+
+def show_performance_panel(placeholder, rerun, rerun_seconds):
+    # Filled in after the page has rendered, so it covers every call of this rerun
+    events = instrumentation.rerun_events(rerun["id"])
+    with placeholder.container():
+        with st.expander("Performance", expanded=False):
+            st.caption(
+                f"Triggered by: {rerun['trigger']} | {rerun_seconds * 1000:.0f} ms | {len(events)} calls"
+            )
+            if events:
+                st.dataframe(pd.DataFrame([{
+                    "function": e["name"].split(".", 1)[-1],
+                    "kind": e["kind"],
+                    "ms": round(e["seconds"] * 1000, 1),
+                    "rows": e["rows"],
+                    "KB": round(e["bytes"] / 1024, 1),
+                    "cache": "error" if e["error"] else {True: "hit", False: "miss", None: "-"}[e["cache"]],
+                } for e in events]), use_container_width=True, hide_index=True)
+            st.markdown("**Slowest Recent Calls**")
+            slowest = instrumentation.slowest(10)
+            if slowest:
+                st.dataframe(pd.DataFrame(slowest).round(1), use_container_width=True, hide_index=True)
+            st.download_button(
+                "Export Metrics",
+                instrumentation.prometheus_text(),
+                file_name="dashboard_metrics.prom",
+                mime="text/plain",
+                key="export_metrics_btn",
+                help="All timings in the Prometheus text format",
+            )
 
 
 # ------------------------------
@@ -165,13 +240,35 @@ def main():
     st.markdown("<p style='text-align: center; color: #654321; font-size: 1.1rem;'>Multi-Database Analytics for Personalized Book Discovery</p>", unsafe_allow_html=True)
 
     st.sidebar.header("Navigation")
-    page = st.sidebar.radio("Select Analysis Type", ["Graph Database Insights", "SQL Database Analytics"])
+    page = st.sidebar.radio("Select Analysis Type", ["Graph Database Insights", "SQL Database Analytics"], key="nav_page")
+
+    # Every query and graph build from here on is attributed to this rerun and its trigger
+    rerun = instrumentation.begin_rerun(page, st.session_state)
+    instrumentation.serve()  # /metrics endpoint, when METRICS_PORT is set
+    performance_placeholder = st.sidebar.empty()
+
+    # Query results are cached; clear them after the databases have been reloaded. A background
+    # thread clears them once book_ratings.py has folded newly appended ratings into books
+    book_ratings.watch_for_updates()
+    if st.sidebar.button("Refresh Cached Data", help="Re-query MySQL and Neo4j on the next render", key="refresh_cache_btn"):
+        data_reloaded()
 
     if page == "Graph Database Insights":
+        try:
+            missing = missing_neo4j_indexes()
+        except Exception as e:
+            st.warning(f"Could not check Neo4j indexes: {e}")
+        else:
+            if missing:
+                st.warning(f"Neo4j indexes missing or not online: {', '.join(missing)}. Queries may be slow, "
+                           "and tag and title lookups are disabled until you run: python neo4j_schema.py bootstrap")
         neo4j_page()
     else:
         sql_page()
 
+    rerun_seconds = instrumentation.end_rerun(st.session_state)
+    show_performance_panel(performance_placeholder, rerun, rerun_seconds)
+
 
 # ------------------------------
 # NEO4J PAGE
@@ -179,9 +276,11 @@ def main():
 def neo4j_page():
     st.header("Graph Database Analysis")
     
+    # The page's independent queries run concurrently (see panel_scheduler.py)
+    scheduler = PanelScheduler()
+
     # Key Insight: Book with Most Tags
-    try:
-        most_tagged_books = run_neo4j_read(get_book_with_most_tags)
+    def show_most_tagged(most_tagged_books):
         if most_tagged_books:
             top_book = most_tagged_books[0]
             st.markdown("""
@@ -202,8 +301,9 @@ def neo4j_page():
                 top_book["author"] or "Unknown",
                 top_book["rating"] or 0
             ), unsafe_allow_html=True)
-    except Exception as e:
-        st.warning(f"Could not load tag insight: {e}")
+
+    scheduler.panel(show_most_tagged, run_neo4j_read, get_book_with_most_tags,
+                    on_error=lambda e: st.warning(f"Could not load tag insight: {e}"))
 
     # Two subtabs: existing explorer + graph algorithms
     tab1, tab2 = st.tabs(["Book Discovery & Recommendations", "Advanced Graph Algorithms"])
@@ -215,24 +315,26 @@ def neo4j_page():
         st.subheader("Browse High-Rated Books by Genre/Tag")
 
         # Load tags
-        tags = run_neo4j_read(get_all_tags)
-        tag_list = [t["tag"] for t in tags]
+        tag_list = load_dropdown_tags()
 
         # Default to "action" if available
         default_idx = tag_list.index("action") if "action" in tag_list else 0
 
-        selected_tag = st.selectbox("Select Genre/Tag", tag_list, index=default_idx)
+        selected_tag = st.selectbox("Select Genre/Tag", tag_list, index=default_idx, key="browse_tag")
 
-        min_rating = st.slider("Minimum Average Rating", 3.0, 5.0, 4.5, 0.1)
+        min_rating = st.slider("Minimum Average Rating", 3.0, 5.0, 4.5, 0.1, key="browse_min_rating")
 
-        try:
-            rows = run_neo4j_read(get_books_by_tag, selected_tag, min_rating)
+        def show_books_by_tag(rows):
             if rows:
                 st.dataframe(pd.DataFrame(rows))
             else:
                 st.info("No books found for this filter.")
-        except Exception as e:
-            st.error(f"Error querying Neo4j: {e}")
+
+        if neo4j_lookup_ready("tag_name_lower"):
+            scheduler.panel(show_books_by_tag, run_neo4j_read, get_books_by_tag, selected_tag, min_rating,
+                            on_error=lambda e: st.error(f"Error querying Neo4j: {e}"))
+        # Fill both panels before the recommendation sections below run their own queries
+        scheduler.run()
 
         st.markdown("---")
 
@@ -249,14 +351,43 @@ def neo4j_page():
             st.session_state.selected_title = None
 
         # Search bar
-        keyword = st.text_input("Search for a Book by Title", "hunger games", placeholder="Enter book title or keyword...")
+        keyword = st.text_input("Search for a Book by Title", "hunger games", placeholder="Enter book title or keyword...",
+                                key="book_keyword")
 
-        if st.button("Search Books", use_container_width=True):
-            st.session_state.search_results = run_neo4j_read(
-                search_books_by_keyword, keyword
-            )
+        if st.button("Search Books", use_container_width=True, key="search_books_btn"):
+            matches = search_index.search(keyword, limit=30, order_by="rating")
+            if matches is not None:
+                st.session_state.search_results = matches.to_dict("records")
+            elif neo4j_lookup_ready("book_title_lower"):
+                st.session_state.search_results = run_neo4j_read(
+                    search_books_by_keyword, keyword
+                )
+            else:
+                st.session_state.search_results = []
             st.session_state.selected_title = None
 
+        with st.expander("Recommendations for a Reader", expanded=False):
+            if collaborative.load_model() is None:
+                st.info("No rating-based model available. Train one with: python collaborative.py train")
+            else:
+                with st.form("cf_reader_form"):
+                    reader_id = st.number_input("Reader (User ID)", min_value=1, value=1, step=1, key="cf_user_id")
+                    if st.form_submit_button("Recommend", use_container_width=True):
+                        rated = sql.get_user_rated_book_ids(int(reader_id))
+                        exclude = rated["book_id"].tolist() if not rated.empty else []
+                        st.session_state.reader_recs = (
+                            collaborative.get_user_recommendations(int(reader_id), limit=10, exclude_book_ids=exclude),
+                            len(exclude),
+                        )
+
+                if "reader_recs" in st.session_state:
+                    reader_recs, excluded = st.session_state.reader_recs
+                    if reader_recs:
+                        st.dataframe(pd.DataFrame(reader_recs), use_container_width=True)
+                        st.caption(f"Predicted from rating patterns | {excluded} books already rated by this reader are excluded")
+                    else:
+                        st.info("The rating-based model has no recommendations for this reader.")
+
         # Show dropdown only if results exist
         if st.session_state.search_results:
             titles = [m["title"] for m in st.session_state.search_results]
@@ -267,6 +398,7 @@ def neo4j_page():
                 index=titles.index(st.session_state.selected_title)
                 if st.session_state.selected_title in titles
                 else 0,
+                key="selected_result",
             )
 
             # Save selected title
@@ -274,17 +406,35 @@ def neo4j_page():
 
             st.success(f"Selected Book: {st.session_state.selected_title}")
 
-            # Tag-based recommendations
-            recs = run_neo4j_read(
-                get_recommendations_for_book, st.session_state.selected_title
+            backend_keys = list(recommendations.BACKENDS)
+            rec_backend = st.selectbox(
+                "Similarity Model",
+                backend_keys,
+                index=backend_keys.index(config.RECOMMENDATION_BACKEND),
+                format_func=recommendations.BACKENDS.get,
+                key="rec_backend",
+                help="TF-IDF down-weights ubiquitous tags like 'to-read' and uses how often each tag was applied"
             )
 
+            # Tag-based recommendations, from the selected index unless it is missing or stale
+            recs = recommendations.get_recommendations(st.session_state.selected_title, backend=rec_backend)
+            if recs is None:
+                recs = run_neo4j_read(
+                    get_recommendations_for_book, st.session_state.selected_title
+                )
+
             if recs:
                 st.subheader("Recommended Books Based on Shared Tags")
                 st.dataframe(pd.DataFrame(recs), use_container_width=True)
             else:
                 st.info("No recommendations available for this book.")
 
+            # Collaborative filtering over user ratings (available once collaborative.py has been trained)
+            also_liked = collaborative.get_similar_books(st.session_state.selected_title)
+            if also_liked:
+                st.subheader("Readers Who Liked This Also Liked")
+                st.dataframe(pd.DataFrame(also_liked), use_container_width=True)
+
             # ============================================================
             # 3. RECOMMENDATION GRAPH VISUALIZATION
             # ============================================================
@@ -361,13 +511,27 @@ def neo4j_page():
                         help="Higher = keeps graph more centered"
                     )
             
+            # The graph stays up across reruns once generated, so clusters can be expanded
             if st.button("Generate Network Graph", key="generate_graph_btn", use_container_width=True):
-                graph_data = run_neo4j_read(
-                    get_recommendation_graph_data, 
+                st.session_state.graph_title = st.session_state.selected_title
+                st.session_state.graph_expanded = []
+
+            if st.session_state.get("graph_title") == st.session_state.selected_title:
+                graph_data = recommendations.get_recommendation_graph_data(
                     st.session_state.selected_title,
                     num_similar_books,
-                    min_book_rating
+                    min_book_rating,
+                    backend=rec_backend
                 )
+                if graph_data is None:
+                    # Record dicts, as level_of_detail and build_recommendation_graph consume
+                    # them; a few hundred rows gain nothing from streaming into a DataFrame
+                    graph_data = run_neo4j_read(
+                        get_recommendation_graph_data,
+                        st.session_state.selected_title,
+                        num_similar_books,
+                        min_book_rating
+                    )
 
                 if graph_data:
                     # Enhanced legend with stats
@@ -382,8 +546,40 @@ def neo4j_page():
                         <span style="background-color: #D4A84B; color: #333; padding: 2px 8px; border-radius: 50%; margin-right: 5px;">●</span> Orange = Tags
                         <span style="margin: 0 10px;">|</span>
                         <span style="background-color: #10b981; color: white; padding: 2px 8px; border-radius: 10px; margin-right: 5px;">○</span> Green = Similar Books
+                        <span style="margin: 0 10px;">|</span>
+                        <span style="background-color: #9ca3af; color: white; padding: 2px 8px; margin-right: 5px;">◆</span> Grey = Clustered Tags
                     </div>
                     """, unsafe_allow_html=True)
+
+                    # Level of detail: collapse minor tags so large networks stay responsive
+                    lod_col1, lod_col2 = st.columns([1, 2])
+                    with lod_col1:
+                        node_budget = st.slider(
+                            "Node Budget",
+                            min_value=50,
+                            max_value=400,
+                            value=config.GRAPH_NODE_BUDGET,
+                            step=25,
+                            key="graph_node_budget",
+                            help="Tags beyond this many nodes are grouped into clusters"
+                        )
+                    graph_rows, clusters = level_of_detail(
+                        graph_data, node_budget, expanded=st.session_state.get("graph_expanded", [])
+                    )
+                    # Drop expansions of clusters that no longer exist after a slider change
+                    st.session_state.graph_expanded = [
+                        cluster_id for cluster_id in st.session_state.get("graph_expanded", [])
+                        if cluster_id in clusters
+                    ]
+                    with lod_col2:
+                        if clusters:
+                            st.multiselect(
+                                "Expand Clusters",
+                                list(clusters),
+                                format_func=lambda cluster_id: clusters[cluster_id]["label"],
+                                key="graph_expanded",
+                                help="Show the tags inside a grey cluster node individually"
+                            )
                     
                     # Pass physics settings from sliders
                     physics_settings = {
@@ -392,150 +588,33 @@ def neo4j_page():
                         'damping': physics_damping,
                         'central': physics_central
                     }
-                    net = build_recommendation_graph(graph_data, physics_settings)
+                    build_start = time.perf_counter()
+                    net = build_recommendation_graph(
+                        graph_rows,
+                        physics_settings,
+                        layout_key=(st.session_state.selected_title, num_similar_books, min_book_rating, rec_backend,
+                                    node_budget, tuple(sorted(st.session_state.graph_expanded))),
+                    )
+                    build_ms = (time.perf_counter() - build_start) * 1000
                     if net:
-                        net.save_graph("recommendations_graph.html")
+                        render_start = time.perf_counter()
+                        if config.GRAPH_RENDERER == "component":
+                            # Only the changes since the last rerun are sent to the browser
+                            payload_bytes = recommendation_graph(net, height=820)
+                        else:
+                            # Rendered in memory, so concurrent sessions never share a file
+                            html_content = render_graph_html(net)
+                            payload_bytes = len(html_content)
+                            components.html(html_content, height=820, scrolling=False)
+                        render_ms = (time.perf_counter() - render_start) * 1000
+                        instrumentation.record("graph_utils.render", "render", render_ms / 1000,
+                                               rows=len(net.nodes), nbytes=payload_bytes)
 
-                        with open("recommendations_graph.html", "r", encoding="utf-8") as f:
-                            html_content = f.read()
-                        
-                        # Control buttons CSS
-                        control_buttons_css = """
-                        <style>
-                            .graph-controls {
-                                display: flex;
-                                gap: 10px;
-                                padding: 10px;
-                                background: #1a202c;
-                                border-radius: 8px 8px 0 0;
-                                justify-content: center;
-                            }
-                            .graph-btn {
-                                padding: 10px 20px;
-                                border: none;
-                                border-radius: 6px;
-                                cursor: pointer;
-                                font-weight: 600;
-                                font-size: 14px;
-                                transition: all 0.2s ease;
-                                display: flex;
-                                align-items: center;
-                                gap: 8px;
-                            }
-                            .graph-btn:hover {
-                                transform: translateY(-2px);
-                                box-shadow: 0 4px 12px rgba(0,0,0,0.3);
-                            }
-                            .btn-start {
-                                background: linear-gradient(135deg, #10b981, #059669);
-                                color: white;
-                            }
-                            .btn-stop {
-                                background: linear-gradient(135deg, #ef4444, #dc2626);
-                                color: white;
-                            }
-                            .btn-fullscreen {
-                                background: linear-gradient(135deg, #3b82f6, #2563eb);
-                                color: white;
-                            }
-                            .graph-wrapper {
-                                position: relative;
-                            }
-                            #mynetwork:fullscreen, #mynetwork:-webkit-full-screen {
-                                background-color: #2d3748;
-                                width: 100vw !important;
-                                height: 100vh !important;
-                            }
-                        </style>
-                        """
-                        
-                        # Control buttons HTML - placed BEFORE the network div
-                        control_buttons_html = """
-                        <div class="graph-controls">
-                            <button class="graph-btn btn-start" onclick="startPhysics()" title="Resume graph animation">
-                                ▶ Start
-                            </button>
-                            <button class="graph-btn btn-stop" onclick="stopPhysics()" title="Freeze graph position">
-                                ⏹ Stop
-                            </button>
-                            <button class="graph-btn btn-fullscreen" onclick="toggleFullscreen()" title="Toggle fullscreen mode">
-                                ⛶ Fullscreen
-                            </button>
-                        </div>
-                        """
-                        
-                        # JavaScript control functions - using slider values
-                        control_functions_js = f"""
-                        <script>
-                        function startPhysics() {{
-                            if (typeof network !== 'undefined') {{
-                                network.setOptions({{ 
-                                    physics: {{ 
-                                        enabled: true,
-                                        solver: 'barnesHut',
-                                        barnesHut: {{
-                                            gravitationalConstant: -{physics_repulsion},
-                                            centralGravity: {physics_central},
-                                            springLength: {physics_spring},
-                                            springConstant: 0.005,
-                                            damping: {physics_damping},
-                                            avoidOverlap: 1
-                                        }},
-                                        maxVelocity: 25,
-                                        minVelocity: 0.5,
-                                        timestep: 0.35
-                                    }} 
-                                }});
-                            }}
-                        }}
-                        
-                        function stopPhysics() {{
-                            if (typeof network !== 'undefined') {{
-                                network.setOptions({{ physics: {{ enabled: false }} }});
-                            }}
-                        }}
-                        
-                        function toggleFullscreen() {{
-                            var elem = document.getElementById('mynetwork');
-                            if (!document.fullscreenElement && !document.webkitFullscreenElement) {{
-                                if (elem.requestFullscreen) {{
-                                    elem.requestFullscreen();
-                                }} else if (elem.webkitRequestFullscreen) {{
-                                    elem.webkitRequestFullscreen();
-                                }}
-                            }} else {{
-                                if (document.exitFullscreen) {{
-                                    document.exitFullscreen();
-                                }} else if (document.webkitExitFullscreen) {{
-                                    document.webkitExitFullscreen();
-                                }}
-                            }}
-                        }}
-                        </script>
-                        """
-                        
-                        # Inject CSS into head
-                        html_content = html_content.replace(
-                            "</head>",
-                            control_buttons_css + control_functions_js + "\n</head>"
-                        )
-                        
-                        # Inject control buttons BEFORE the card div
-                        html_content = html_content.replace(
-                            '<div class="card" style="width: 100%">',
-                            '<div class="graph-wrapper">' + control_buttons_html + '<div class="card" style="width: 100%">'
-                        )
-                        
-                        # Close the wrapper div at the end
-                        html_content = html_content.replace(
-                            '</body>',
-                            '</div></body>'
+                        st.caption(
+                            f"{len(net.nodes)} nodes, {len(net.edges)} edges | "
+                            f"built in {build_ms:.0f} ms, rendered in {render_ms:.0f} ms "
+                            f"({payload_bytes / 1024:.0f} KB sent)"
                         )
-                        
-                        # Keep physics enabled after stabilization (don't disable it)
-                        # This allows the graph to continue moving and responding to interactions
-                        
-                        components.html(html_content, height=820, scrolling=False)
                     else:
                         st.warning("Graph generation failed - insufficient data")
                 else:
@@ -557,8 +636,8 @@ def neo4j_page():
         # Load book titles for dropdown
         if 'book_titles' not in st.session_state:
             try:
-                book_records = run_neo4j_read(get_all_book_titles, limit=1000)
-                st.session_state.book_titles = [b["title"] for b in book_records]
+                titles = neo4j_db.read_frame(get_all_book_titles, limit=1000, columns=["title"])
+                st.session_state.book_titles = titles["title"].tolist()
             except:
                 st.session_state.book_titles = []
         
@@ -584,12 +663,15 @@ def neo4j_page():
                 key="sp_book2",
             )
 
-        if st.button("Find Connection Path", use_container_width=True):
+        num_paths = st.slider("Number of Paths to Show", 1, 5, 1, key="sp_num_paths",
+                              help="Also list alternative routes, shortest first")
+
+        if st.button("Find Connection Path", use_container_width=True, key="find_path_btn"):
             try:
-                with driver.session() as session:
-                    path_records = session.execute_read(
-                        get_shortest_path, book1, book2
-                    )
+                # In-memory path service first; Cypher if the graph is not exported or the search times out
+                path_records = path_service.get_shortest_path(book1, book2, k=num_paths)
+                if path_records is None:
+                    path_records = run_neo4j_read(get_shortest_path, book1, book2)
 
                 if path_records:
                     record = dict(path_records[0])
@@ -602,6 +684,10 @@ def neo4j_page():
                         st.write(" → ".join(nodes))
                         if hops is not None:
                             st.metric("Degrees of Separation", hops)
+                        if len(path_records) > 1:
+                            st.write("### Alternative Paths:")
+                            for alt in path_records[1:]:
+                                st.write(f"{alt['hops']} hops: " + " → ".join(alt["path_nodes"]))
                     else:
                         st.warning("Path exists but details unavailable.")
                 else:
@@ -621,8 +707,7 @@ def neo4j_page():
         
         with col_a:
             # Get all tags for filter
-            all_tags_records = run_neo4j_read(get_all_tags)
-            tag_options = ["All Genres"] + [t["tag"] for t in all_tags_records]
+            tag_options = ["All Genres"] + load_dropdown_tags()
             
             selected_genre = st.selectbox(
                 "Filter by Genre/Tag",
@@ -637,31 +722,31 @@ def neo4j_page():
                 key="author_sort"
             )
 
-        if st.button("Analyze Authors", key="show_centrality_btn", use_container_width=True):
+        if st.button("Analyze Authors", key="show_centrality_btn", use_container_width=True) and (
+                selected_genre == "All Genres" or neo4j_lookup_ready("tag_name_lower")):
             try:
-                with driver.session() as session:
-                    if selected_genre == "All Genres":
-                        # Show top authors overall
-                        top_authors_records = session.execute_read(get_top_authors, limit=100)
-                        authors_df = pd.DataFrame([dict(r) for r in top_authors_records])
-                    else:
-                        # Show authors filtered by genre
-                        authors_by_genre = session.execute_read(get_authors_by_tag, selected_genre, limit=100)
-                        authors_df = pd.DataFrame([dict(r) for r in authors_by_genre])
+                if selected_genre == "All Genres":
+                    # Show top authors overall
+                    top_authors_records = run_neo4j_read(get_top_authors, limit=100)
+                    authors_df = pd.DataFrame([dict(r) for r in top_authors_records])
+                else:
+                    # Show authors filtered by genre
+                    authors_by_genre = run_neo4j_read(get_authors_by_tag, selected_genre, limit=100)
+                    authors_df = pd.DataFrame([dict(r) for r in authors_by_genre])
+                
+                if not authors_df.empty:
+                    # Apply sorting
+                    if sort_by == "Highest Rated" and 'avg_rating' in authors_df.columns:
+                        authors_df = authors_df.sort_values('avg_rating', ascending=False)
                     
-                    if not authors_df.empty:
-                        # Apply sorting
-                        if sort_by == "Highest Rated" and 'avg_rating' in authors_df.columns:
-                            authors_df = authors_df.sort_values('avg_rating', ascending=False)
-                        
-                        genre_text = f" in {selected_genre}" if selected_genre != "All Genres" else ""
-                        st.write(f"### Top Authors{genre_text}")
-                        st.dataframe(authors_df, use_container_width=True, height=400)
-                        
-                        # Show count
-                        st.caption(f"Displaying {len(authors_df)} authors | Sorted by: {sort_by}")
-                    else:
-                        st.warning("No authors found for the selected genre.")
+                    genre_text = f" in {selected_genre}" if selected_genre != "All Genres" else ""
+                    st.write(f"### Top Authors{genre_text}")
+                    st.dataframe(authors_df, use_container_width=True, height=400)
+                    
+                    # Show count
+                    st.caption(f"Displaying {len(authors_df)} authors | Sorted by: {sort_by}")
+                else:
+                    st.warning("No authors found for the selected genre.")
                         
             except Exception as e:
                 st.error(f"Error running query: {e}")
@@ -671,9 +756,10 @@ def neo4j_page():
         # Show top tags separately
         if st.button("View Top Tags & Genres", key="show_tags_btn", use_container_width=True):
             try:
-                with driver.session() as session:
-                    top_tags_records = session.execute_read(get_top_tags, limit=50)
-                    tags_df = pd.DataFrame([dict(r) for r in top_tags_records])
+                top_tags_records = tag_catalog.get_top_tags(50)
+                if top_tags_records is None:
+                    top_tags_records = run_neo4j_read(get_top_tags, limit=50)
+                tags_df = pd.DataFrame([dict(r) for r in top_tags_records])
                 
                 st.write("### Most Popular Tags/Genres")
                 st.dataframe(tags_df, use_container_width=True, height=400)
@@ -699,12 +785,11 @@ def neo4j_page():
 
         col3, col4 = st.columns(2)
         with col3:
-            if st.button("Find by Similar Tags", use_container_width=True):
+            if st.button("Find by Similar Tags", use_container_width=True, key="related_tags_btn"):
                 try:
-                    with driver.session() as session:
-                        related_tag_records = session.execute_read(
-                            get_related_books_by_tags, traversal_title
-                        )
+                    related_tag_records = run_neo4j_read(
+                        get_related_books_by_tags, traversal_title
+                    )
                     related_tag_df = pd.DataFrame(
                         [dict(r) for r in related_tag_records]
                     )
@@ -714,12 +799,11 @@ def neo4j_page():
                     st.error(f"Query error: {e}")
 
         with col4:
-            if st.button("Find by Same Author", use_container_width=True):
+            if st.button("Find by Same Author", use_container_width=True, key="related_author_btn"):
                 try:
-                    with driver.session() as session:
-                        related_author_records = session.execute_read(
-                            get_related_books_by_author, traversal_title
-                        )
+                    related_author_records = run_neo4j_read(
+                        get_related_books_by_author, traversal_title
+                    )
                     related_author_df = pd.DataFrame(
                         [dict(r) for r in related_author_records]
                     )
@@ -735,8 +819,13 @@ def neo4j_page():
 def sql_page():
     st.header("Relational Database Analytics")
 
+    # Every panel query below starts as soon as its widgets are read and runs concurrently;
+    # scheduler.run() at the end fills each panel as its result arrives
+    scheduler = PanelScheduler()
+
     # Create tabs for different analytics
-    tab1, tab2, tab3, tab4 = st.tabs(["Database Overview", "Author Analytics", "Publication Trends", "Rating Analysis"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Database Overview", "Author Analytics", "Publication Trends", "Rating Analysis",
+                                            "Reading Lists"])
 
     # ============================================================
     # TAB 1 – OVERVIEW
@@ -745,24 +834,18 @@ def sql_page():
         st.subheader("Database Statistics")
         
         # Get basic stats
-        try:
-            from sqlalchemy import text
-            engine = sql.get_engine()
-            
-            with st.spinner("🔄 Running SQL queries..."):
-                with engine.connect() as conn:
-                    book_count = conn.execute(text("SELECT COUNT(*) FROM books")).scalar()
-                    user_count = conn.execute(text("SELECT COUNT(DISTINCT user_id) FROM ratings")).scalar()
-                    rating_count = conn.execute(text("SELECT COUNT(*) FROM ratings")).scalar()
-            
-            st.markdown("### Collection Metrics")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Books in Catalog", f"{book_count:,}")
-            col2.metric("Active Users", f"{user_count:,}")
-            col3.metric("Total Ratings", f"{rating_count:,}")
-            
-        except Exception as e:
-            st.error(f"Database error: {e}")
+        def show_metrics(metrics):
+            if not metrics.empty:
+                stats = metrics.iloc[0]
+                st.markdown("### Collection Metrics")
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Books in Catalog", f"{int(stats['book_count']):,}")
+                col2.metric("Active Users", f"{int(stats['user_count']):,}")
+                col3.metric("Total Ratings", f"{int(stats['rating_count']):,}")
+            else:
+                st.error("Database error: could not load collection metrics.")
+
+        scheduler.panel(show_metrics, sql.get_collection_metrics, pending="🔄 Running SQL queries...")
         
         st.markdown("---")
         
@@ -775,30 +858,36 @@ def sql_page():
         with col_b:
             num_books = st.selectbox("Show Top", [25, 50, 100, 200], index=1, key="num_top_books")
         
-        with st.spinner("🔄 Querying top-rated books..."):
-            top_books = sql.get_top_rated_books(limit=num_books, min_ratings=min_ratings)
-        if not top_books.empty:
-            # Add ranking column
-            top_books_display = top_books.copy()
-            top_books_display.insert(0, 'Rank', range(1, len(top_books_display) + 1))
-            
-            st.dataframe(top_books_display, use_container_width=True, height=400)
-            st.caption(f"Showing {len(top_books)} books with {min_ratings:,}+ ratings | Sorted by average rating")
-        else:
-            st.info(f"No books found with at least {min_ratings:,} ratings. Try lowering the threshold.")
+        def show_top_books(top_books):
+            if not top_books.empty:
+                # Add ranking column
+                top_books_display = top_books.copy()
+                top_books_display.insert(0, 'Rank', range(1, len(top_books_display) + 1))
+                
+                st.dataframe(top_books_display, use_container_width=True, height=400)
+                order = "weighted (Bayesian) rating" if "weighted_rating" in top_books else "average rating"
+                st.caption(f"Showing {len(top_books)} books with {min_ratings:,}+ ratings | Sorted by {order}")
+            else:
+                st.info(f"No books found with at least {min_ratings:,} ratings. Try lowering the threshold.")
+
+        scheduler.panel(show_top_books, sql.get_top_rated_books, limit=num_books, min_ratings=min_ratings,
+                        pending="🔄 Querying top-rated books...")
         
         st.markdown("---")
         
         # Most Rated Books
         st.subheader("🔥 Most Reviewed Books")
         num_popular = st.selectbox("Number of Books to Display", [20, 50, 100], index=1, key="num_popular")
-        with st.spinner("🔄 Querying most reviewed books..."):
-            most_rated = sql.get_most_rated_books(limit=num_popular)
-        if not most_rated.empty:
-            most_rated_display = most_rated.copy()
-            most_rated_display.insert(0, 'Rank', range(1, len(most_rated_display) + 1))
-            st.dataframe(most_rated_display, use_container_width=True, height=400)
-            st.caption(f"Top {len(most_rated)} books by review volume | Useful for identifying trending titles")
+
+        def show_most_rated(most_rated):
+            if not most_rated.empty:
+                most_rated_display = most_rated.copy()
+                most_rated_display.insert(0, 'Rank', range(1, len(most_rated_display) + 1))
+                st.dataframe(most_rated_display, use_container_width=True, height=400)
+                st.caption(f"Top {len(most_rated)} books by review volume | Useful for identifying trending titles")
+
+        scheduler.panel(show_most_rated, sql.get_most_rated_books, limit=num_popular,
+                        pending="🔄 Querying most reviewed books...")
 
     # ============================================================
     # TAB 2 – AUTHORS
@@ -812,30 +901,30 @@ def sql_page():
         with col2:
             show_chart = st.checkbox("Show Visualization", value=True, key="show_author_chart")
         
-        with st.spinner("🔄 Querying author analytics..."):
-            top_authors_df = sql.get_top_authors(limit=limit)
-        
-        if not top_authors_df.empty:
-            # Add ranking
-            top_authors_display = top_authors_df.copy()
-            top_authors_display.insert(0, 'Rank', range(1, len(top_authors_display) + 1))
-            st.dataframe(top_authors_display, use_container_width=True, height=400)
-            st.caption(f"Top {len(top_authors_df)} authors by catalog presence")
-            
-            # Visualization
-            if show_chart:
-                import matplotlib.pyplot as plt
-                fig, ax = plt.subplots(figsize=(10, 6))
-                display_count = min(15, len(top_authors_df))
-                ax.barh(top_authors_df['authors'][:display_count], top_authors_df['book_count'][:display_count])
-                ax.set_xlabel('Number of Published Books')
-                ax.set_ylabel('Author Name')
-                ax.set_title(f'Top {display_count} Most Prolific Authors')
-                ax.invert_yaxis()
-                plt.tight_layout()
-                st.pyplot(fig)
-        else:
-            st.info("No author data available in the database.")
+        def show_top_authors(top_authors_df):
+            if not top_authors_df.empty:
+                # Add ranking
+                top_authors_display = top_authors_df.copy()
+                top_authors_display.insert(0, 'Rank', range(1, len(top_authors_display) + 1))
+                st.dataframe(top_authors_display, use_container_width=True, height=400)
+                st.caption(f"Top {len(top_authors_df)} authors by catalog presence")
+                
+                # Visualization
+                if show_chart:
+                    import matplotlib.pyplot as plt
+                    fig, ax = plt.subplots(figsize=(10, 6))
+                    display_count = min(15, len(top_authors_df))
+                    ax.barh(top_authors_df['authors'][:display_count], top_authors_df['book_count'][:display_count])
+                    ax.set_xlabel('Number of Published Books')
+                    ax.set_ylabel('Author Name')
+                    ax.set_title(f'Top {display_count} Most Prolific Authors')
+                    ax.invert_yaxis()
+                    plt.tight_layout()
+                    st.pyplot(fig)
+            else:
+                st.info("No author data available in the database.")
+
+        scheduler.panel(show_top_authors, sql.get_top_authors, limit=limit, pending="🔄 Querying author analytics...")
 
     # ============================================================
     # TAB 3 – TRENDS
@@ -843,20 +932,20 @@ def sql_page():
     with tab3:
         st.subheader("📅 Historical Publication Analysis")
         
-        with st.spinner("🔄 Analyzing publication trends..."):
-            trends = sql.get_publication_trends()
-        
-        if not trends.empty:
-            st.markdown("### Publications Over Time")
-            st.line_chart(trends.set_index('year')['book_count'])
-            st.caption("Number of books published per year (1900-2025)")
-            
-            st.markdown("---")
-            st.subheader("🌍 Language Distribution")
-            
-            with st.spinner("🔄 Querying language distribution..."):
-                lang_data = sql.get_books_by_language()
+        def show_trends(trends):
+            if not trends.empty:
+                st.markdown("### Publications Over Time")
+                st.line_chart(trends.set_index('year')['book_count'])
+                st.caption("Number of books published per year (1900-2025)")
+            else:
+                st.info("Publication trend data not available.")
+
+        scheduler.panel(show_trends, sql.get_publication_trends, pending="🔄 Analyzing publication trends...")
+
+        def show_languages(lang_data):
             if not lang_data.empty:
+                st.markdown("---")
+                st.subheader("🌍 Language Distribution")
                 st.dataframe(lang_data.head(20), use_container_width=True)
                 
                 # Bar chart
@@ -871,8 +960,8 @@ def sql_page():
                 plt.tight_layout()
                 st.pyplot(fig)
                 st.caption("Distribution of books by language code")
-        else:
-            st.info("Publication trend data not available.")
+
+        scheduler.panel(show_languages, sql.get_books_by_language, pending="🔄 Querying language distribution...")
 
     # ============================================================
     # TAB 4 – RATINGS
@@ -881,25 +970,26 @@ def sql_page():
         st.subheader("User Rating Insights")
         
         # Rating distribution
-        with st.spinner("🔄 Analyzing rating distribution..."):
-            rating_dist = sql.get_rating_distribution()
-        
-        if not rating_dist.empty:
-            st.markdown("### Rating Distribution Across Catalog")
-            st.bar_chart(rating_dist.set_index('rating_bucket')['book_count'])
-            st.caption("Distribution of average book ratings (0.0 - 5.0 scale)")
-            
-            st.markdown("---")
-            
-            # User rating stats
-            st.subheader("🏆 Top Contributors")
-            with st.spinner("🔄 Querying user statistics..."):
-                user_stats = sql.get_user_rating_stats(limit=20)
+        def show_rating_distribution(rating_dist):
+            if not rating_dist.empty:
+                st.markdown("### Rating Distribution Across Catalog")
+                st.bar_chart(rating_dist.set_index('rating_bucket')['book_count'])
+                st.caption("Distribution of average book ratings (0.0 - 5.0 scale)")
+            else:
+                st.info("Rating analytics data not available.")
+
+        scheduler.panel(show_rating_distribution, sql.get_rating_distribution,
+                        pending="🔄 Analyzing rating distribution...")
+
+        # User rating stats
+        def show_user_stats(user_stats):
             if not user_stats.empty:
+                st.markdown("---")
+                st.subheader("🏆 Top Contributors")
                 st.dataframe(user_stats, use_container_width=True)
                 st.caption("Most active users by number of ratings submitted")
-        else:
-            st.info("Rating analytics data not available.")
+
+        scheduler.panel(show_user_stats, sql.get_user_rating_stats, limit=20, pending="🔄 Querying user statistics...")
         
         st.markdown("---")
         
@@ -916,7 +1006,7 @@ def sql_page():
         
         if st.button("Execute Search", key="sql_search_btn", use_container_width=True):
             with st.spinner("🔄 Searching database..."):
-                search_results = sql.search_books(keyword=search_keyword if search_keyword else "", min_rating=min_rating_filter)
+                search_results = sql.search_books(keyword=search_keyword if search_keyword else "", min_rating=min_rating_filter, limit=search_limit)
             
             # Limit results to selected amount
             if not search_results.empty:
@@ -929,6 +1019,67 @@ def sql_page():
             else:
                 st.info("No books match the specified search criteria. Try adjusting the rating threshold.")
 
+    # ============================================================
+    # TAB 5 – READING LISTS (to_read)
+    # ============================================================
+    with tab5:
+        st.subheader("📖 Most Wanted Books")
+        num_wanted = st.selectbox("Number of Books to Display", [20, 50, 100], index=0, key="num_wanted")
+
+        def show_most_wanted(most_wanted):
+            if not most_wanted.empty:
+                most_wanted_display = most_wanted.copy()
+                most_wanted_display.insert(0, 'Rank', range(1, len(most_wanted_display) + 1))
+                st.dataframe(most_wanted_display, use_container_width=True, height=400)
+                st.caption("Books on the most to-read lists | already_rated: readers who wanted the book and have since rated it")
+            else:
+                st.info("Reading list data not available.")
+
+        scheduler.panel(show_most_wanted, sql.get_most_wanted_books, limit=num_wanted,
+                        pending="🔄 Counting to-read lists...")
+
+        st.markdown("---")
+        st.subheader("Readers Who Want This Also Want")
+
+        wanted_keyword = st.text_input("Find a Book", "hunger games", key="wanted_keyword",
+                                       placeholder="Enter book title or keyword...")
+        matches = search_index.search(wanted_keyword, limit=20)
+        wanted_titles = matches["title"].tolist() if matches is not None else [wanted_keyword]
+        if wanted_titles:
+            wanted_title = st.selectbox("Book", wanted_titles, key="wanted_title")
+
+            def show_also_wanted(also_wanted):
+                if not also_wanted.empty:
+                    st.dataframe(also_wanted, use_container_width=True)
+                    st.caption(f"share: fraction of the readers who want {wanted_title} that also want the book")
+                else:
+                    st.info("No reader has this book on their to-read list.")
+
+            scheduler.panel(show_also_wanted, sql.get_also_wanted_books, wanted_title, limit=10,
+                            pending="🔄 Comparing to-read lists...")
+        else:
+            st.info("No books match this keyword.")
+
+        st.markdown("---")
+        st.subheader("Reading List vs. Ratings")
+        list_user_id = st.number_input("Reader (User ID)", min_value=1, value=1, step=1, key="to_read_user_id")
+
+        def show_reading_list(reading_list):
+            if not reading_list.empty:
+                rated = int(reading_list["rated"].sum())
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Books To Read", f"{len(reading_list):,}")
+                col2.metric("Since Rated", f"{rated:,}")
+                col3.metric("Overlap", f"{rated / len(reading_list):.0%}")
+                st.dataframe(reading_list, use_container_width=True, height=400)
+            else:
+                st.info("This reader has no books on their to-read list.")
+
+        scheduler.panel(show_reading_list, sql.get_user_reading_list, int(list_user_id),
+                        pending="🔄 Loading reading list...")
+
+    scheduler.run()
+
 
 # ------------------------------
 # RUN APP
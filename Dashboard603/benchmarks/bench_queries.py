@@ -0,0 +1,237 @@
+"""
+Benchmark every dashboard query function on synthetic data at a chosen scale.
+
+The dataset comes from benchmarks/synthetic.py (generated on first use). The SQL functions
+in sql_queries.py run against its embedded DuckDB copy (duckdb_store.py), so no server is
+needed. Neo4j has no embedded mode: pass --neo4j DATABASE to load the synthetic graph into
+that (scratch) database on the server configured in config.py, via ingest.py, and time
+neo4j_queries.py against it.
+build_recommendation_graph is timed on the network rows of the book with the most tags.
+
+Each function is called uncached (through __wrapped__) --repeat times and reported with
+p50/p95 latency, rows returned per second at p50 and peak Python heap use (tracemalloc,
+one extra call). --save-baseline writes the results as JSON; --baseline compares against
+such a file and exits with status 1 when a p50 is more than --threshold slower.
+
+Usage (from Dashboard603/):
+    python -m benchmarks.bench_queries --scale 1 --save-baseline artifacts/bench/1x.json
+    python -m benchmarks.bench_queries --scale 10 --baseline artifacts/bench/10x.json
+    python -m benchmarks.bench_queries --scale 1 --neo4j bench --repeat 5
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import config
+from benchmarks import synthetic
+
+
+def use_dataset(scale):
+    """Point data loading and the SQL engine at the synthetic dataset, generating and building it if needed."""
+    root = synthetic.dataset_dir(scale)
+    config.DATA_DIR = os.path.join(root, "data")
+    config.ARTIFACT_DIR = os.path.join(root, "artifacts")
+    config.DUCKDB_PATH = os.path.join(config.ARTIFACT_DIR, "duckdb", "goodbooks.duckdb")
+    config.SQL_BACKEND = "duckdb"
+
+    if not os.path.exists(os.path.join(config.DATA_DIR, "to_read.csv")):
+        print(f"Generating the {scale:g}x dataset...")
+        synthetic.generate(scale)
+    if not os.path.exists(config.DUCKDB_PATH):
+        import duckdb_store
+        print("Building the DuckDB stand-in...")
+        duckdb_store.build()
+    if not os.path.exists(os.path.join(config.ARTIFACT_DIR, "reading_lists", "meta.json")):
+        import reading_lists
+        print("Building the to-read bitmaps...")
+        reading_lists.build()
+
+
+def graph_rows(num_books=20):
+    """Rows shaped like get_recommendation_graph_data for the book with the most tags."""
+    from datasets import load_book_tags, load_books
+
+    book_tags = load_book_tags()
+    ratings = load_books().drop_duplicates("title").set_index("title")["average_rating"]
+    main = book_tags["title"].value_counts().index[0]
+    main_tags = set(book_tags.loc[book_tags["title"] == main, "tag_name"])
+    shared = book_tags[book_tags["tag_name"].isin(main_tags)]
+    ranked = shared[shared["title"] != main].groupby("title").size().sort_values(ascending=False)
+    books = [main] + list(ranked.index[:num_books])
+    rows = shared[shared["title"].isin(books)]
+    return [
+        {"main_book": main, "book_title": title, "tag": tag, "is_main": int(title == main),
+         "rating": float(ratings.get(title, 0))}
+        for title, tag in zip(rows["title"], rows["tag_name"])
+    ], main
+
+
+def sql_cases():
+    import sql_queries as sql
+    user_id = int(sql.get_user_rating_stats.__wrapped__(limit=1)["user_id"].iloc[0])
+    wanted = sql._most_wanted_books_join.__wrapped__(1)["title"].iloc[0]
+    return [
+        ("sql.get_collection_metrics", sql.get_collection_metrics.__wrapped__, ()),
+        ("sql.get_top_rated_books", sql.get_top_rated_books.__wrapped__, (50, 500)),
+        ("sql.get_most_rated_books", sql.get_most_rated_books.__wrapped__, (50,)),
+        ("sql.get_top_authors", sql.get_top_authors.__wrapped__, (50,)),
+        ("sql.get_publication_trends", sql.get_publication_trends.__wrapped__, ()),
+        ("sql.get_books_by_language", sql.get_books_by_language.__wrapped__, ()),
+        ("sql.get_rating_distribution", sql.get_rating_distribution.__wrapped__, ()),
+        ("sql.get_user_rating_stats", sql.get_user_rating_stats.__wrapped__, (20,)),
+        ("sql.search_books", sql.search_books, ("book 1", 3.0, 100)),
+        ("sql._search_books_like", sql._search_books_like.__wrapped__, ("book 1", 3.0, 100)),
+        ("sql.get_user_rated_book_ids", sql.get_user_rated_book_ids.__wrapped__, (user_id,)),
+        ("sql.get_most_wanted_books", sql.get_most_wanted_books, (50,)),
+        ("sql._most_wanted_books_join", sql._most_wanted_books_join.__wrapped__, (50,)),
+        ("sql.get_also_wanted_books", sql.get_also_wanted_books, (wanted, 10)),
+        ("sql._also_wanted_books_join", sql._also_wanted_books_join.__wrapped__, (wanted, 10)),
+        ("sql.get_user_reading_list", sql.get_user_reading_list, (user_id,)),
+        ("sql._user_reading_list_join", sql._user_reading_list_join.__wrapped__, (user_id,)),
+    ]
+
+
+def neo4j_cases(title, other_title, tag):
+    import neo4j_db
+    import neo4j_queries as q
+
+    def read(fn):
+        return lambda *args: neo4j_db.read(fn.__wrapped__, *args)
+    return [
+        ("neo4j.get_all_tags", read(q.get_all_tags), ()),
+        ("neo4j.get_all_book_titles", read(q.get_all_book_titles), (1000,)),
+        ("neo4j.get_books_by_tag", read(q.get_books_by_tag), (tag, 3.5)),
+        ("neo4j.search_books_by_keyword", read(q.search_books_by_keyword), ("book 1",)),
+        ("neo4j.get_recommendations_for_book", read(q.get_recommendations_for_book), (title,)),
+        ("neo4j.get_recommendation_graph_data", read(q.get_recommendation_graph_data), (title, 10, 3.5)),
+        ("neo4j.get_shortest_path", read(q.get_shortest_path), (title, other_title)),
+        ("neo4j.get_top_authors", read(q.get_top_authors), (50,)),
+        ("neo4j.get_authors_by_tag", read(q.get_authors_by_tag), (tag,)),
+        ("neo4j.get_top_tags", read(q.get_top_tags), (50,)),
+        ("neo4j.get_book_with_most_tags", read(q.get_book_with_most_tags), ()),
+        ("neo4j.get_related_books_by_tags", read(q.get_related_books_by_tags), (title,)),
+        ("neo4j.get_related_books_by_author", read(q.get_related_books_by_author), (title,)),
+    ]
+
+
+def graph_cases(rows):
+    from graph_utils import build_recommendation_graph, level_of_detail, render_graph_html
+
+    def build(data):
+        return build_recommendation_graph(level_of_detail(data)[0])
+
+    def build_and_render(data):
+        net = build(data)
+        render_graph_html(net)
+        return net
+    return [
+        ("graph.build_recommendation_graph", build, (rows,)),
+        ("graph.render_graph_html", build_and_render, (rows,)),
+    ]
+
+
+def _rows(result):
+    if result is None:
+        return 0
+    if hasattr(result, "nodes"):
+        return len(result.nodes)
+    return len(result)
+
+
+def measure(fn, args, repeat):
+    """Time repeat calls; returns p50/p95 ms, rows, rows/s at p50 and peak heap KB."""
+    samples = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = _rows(fn(*args))
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p50 = statistics.median(samples)
+    p95 = samples[math.ceil(len(samples) * 0.95) - 1]
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "rows": rows,
+        "rows_per_s": rows / (p50 / 1000) if p50 else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print each result next to its baseline; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'function':<38} {'p50 ms':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<38} {result['p50_ms']:>10.2f} {'-':>10} {'new':>8}")
+            continue
+        change = result["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<38} {result['p50_ms']:>10.2f} {base['p50_ms']:>10.2f} {change:>+8.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard query functions on synthetic data.")
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size as a multiple of the real export")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--only", help="run only functions whose name contains this text")
+    parser.add_argument("--neo4j", metavar="DATABASE",
+                        help="load the synthetic graph into this Neo4j database (it is written to) and time its queries")
+    parser.add_argument("--baseline", help="JSON file from --save-baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown counted as a regression")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    use_dataset(args.scale)
+    rows, title = graph_rows()
+    cases = sql_cases() + graph_cases(rows)
+    if args.neo4j:
+        import ingest
+        config.NEO4J_DATABASE = args.neo4j
+        from datasets import load_books
+        print("Loading the synthetic graph into Neo4j...")
+        ingest.load_neo4j()
+        other_title = load_books().sort_values("ratings_count")["title"].iloc[-2]
+        cases += neo4j_cases(title, other_title, rows[0]["tag"])
+    if args.only:
+        cases = [case for case in cases if args.only in case[0]]
+
+    results = {}
+    print(f"{'function':<38} {'p50 ms':>10} {'p95 ms':>10} {'rows':>9} {'rows/s':>12} {'peak KB':>10}")
+    for name, fn, fn_args in cases:
+        result = results[name] = measure(fn, fn_args, args.repeat)
+        print(f"{name:<38} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['rows']:>9,} "
+              f"{result['rows_per_s']:>12,.0f} {result['peak_kb']:>10,.0f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"scale": args.scale, "repeat": args.repeat, "created_at": time.time(), "results": results},
+                      f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"Warning: baseline was recorded at scale {baseline.get('scale')}")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
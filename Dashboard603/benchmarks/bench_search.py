@@ -0,0 +1,87 @@
+"""
+Benchmark the in-process search index against the LIKE / CONTAINS queries it replaces.
+
+The LIKE query runs against an in-memory SQLite copy of books.csv, so no server is needed.
+Pass --mysql and/or --neo4j to also time the original queries on the live databases.
+
+Usage (from Dashboard603/):
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --mysql --neo4j --repeat 50
+"""
+
+import argparse
+import sqlite3
+import statistics
+import time
+
+import search_index
+from datasets import load_books
+
+
+KEYWORDS = ["hunger games", "harry", "tolkien", "the", "love", "king", "xyzzy", ""]
+
+LIKE_QUERY = """
+SELECT title, authors, average_rating, ratings_count, original_publication_year
+FROM books
+WHERE (LOWER(title) LIKE LOWER(:keyword) OR LOWER(authors) LIKE LOWER(:keyword))
+    AND average_rating >= :min_rating
+ORDER BY ratings_count DESC
+LIMIT 50
+"""
+
+
+def time_calls(fn, keywords, repeat):
+    """Median and p95 latency in milliseconds over every keyword x repeat call."""
+    samples = []
+    for _ in range(repeat):
+        for keyword in keywords:
+            start = time.perf_counter()
+            fn(keyword)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def sqlite_books():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    load_books().to_sql("books", conn, index=False)
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark book search implementations.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--min-rating", type=float, default=3.0)
+    parser.add_argument("--mysql", action="store_true", help="also time the LIKE query on MySQL")
+    parser.add_argument("--neo4j", action="store_true", help="also time the CONTAINS query on Neo4j")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = search_index.get_index()
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.0f} ms, {len(index.vocabulary):,} tokens")
+
+    runs = {
+        "inverted index": lambda kw: index.search(kw, min_rating=args.min_rating),
+    }
+
+    conn = sqlite_books()
+    sqlite_query = LIKE_QUERY.replace(":keyword", "?").replace(":min_rating", "?")
+    runs["sqlite LIKE scan"] = lambda kw: conn.execute(sqlite_query, (f"%{kw}%", f"%{kw}%", args.min_rating)).fetchall()
+
+    if args.mysql:
+        import sql_queries
+        runs["mysql LIKE scan"] = lambda kw: sql_queries._search_books_like.__wrapped__(kw, args.min_rating)
+
+    if args.neo4j:
+        import neo4j_db
+        from neo4j_queries import search_books_by_keyword
+        runs["neo4j CONTAINS scan"] = lambda kw: neo4j_db.read(search_books_by_keyword.__wrapped__, kw)
+
+    print(f"{'implementation':<22} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, fn in runs.items():
+        p50, p95 = time_calls(fn, KEYWORDS, args.repeat)
+        print(f"{name:<22} {p50:>10.3f} {p95:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Synthetic Goodbooks tables at a configurable multiple of the real dataset's size.
+
+Scale 1 matches the published export (10k books, 34k tags, 1M book_tags, 6M ratings,
+900k to_read entries); every table grows linearly with the scale. Book popularity and tag
+usage follow Zipf-like distributions, so the skew that makes "most rated" and "top tags"
+queries expensive is preserved. The CSVs have the same columns as the real export, so
+duckdb_store.py, ingest.py and the in-process indexes build from them unchanged.
+
+Usage (from Dashboard603/):
+    python -m benchmarks.synthetic --scale 10      # -> artifacts/bench/10x/data/
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from datasets import replace_file
+
+
+# Row counts at scale 1
+BASE_BOOKS = 10_000
+BASE_TAGS = 34_252
+BASE_TAGS_PER_BOOK = 100
+BASE_USERS = 53_424
+BASE_RATINGS = 5_976_479
+BASE_TO_READ = 912_705
+
+GENRES = [
+    "to-read", "favorites", "fiction", "fantasy", "young-adult", "classics", "romance",
+    "mystery", "science-fiction", "historical-fiction", "non-fiction", "thriller", "horror",
+    "biography", "poetry", "humor", "dystopian", "paranormal", "memoir", "adventure",
+]
+LANGUAGES = ["eng", "en-US", "en-GB", "spa", "fre", "ger", "ita", "jpn", "por", "ara"]
+LANGUAGE_WEIGHTS = [0.64, 0.2, 0.06, 0.02, 0.02, 0.02, 0.01, 0.01, 0.01, 0.01]
+
+
+def dataset_dir(scale):
+    """Root of a generated dataset: data/ holds the CSVs, artifacts/ its built stand-ins."""
+    return os.path.join(config.ARTIFACT_DIR, "bench", f"{scale:g}x")
+
+
+def _zipf_weights(n, exponent, rng):
+    # Popularity rank is shuffled so popular ids are spread over the id range
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _write_csv(path, chunks):
+    """Write DataFrame chunks as one CSV; returns the number of rows."""
+    rows = 0
+
+    def write(tmp_path):
+        nonlocal rows
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(chunk)
+    replace_file(path, write)
+    return rows
+
+
+def make_books(n_books, popularity, rng):
+    book_id = np.arange(1, n_books + 1)
+    goodreads_id = book_id * 7 + 13
+    n_authors = max(n_books * 2 // 5, 1)
+    author = rng.integers(0, n_authors, n_books)
+    co_author = np.where(rng.random(n_books) < 0.1, rng.integers(0, n_authors, n_books), -1)
+    authors = [f"Author {a}" if c < 0 else f"Author {a}, Author {c}" for a, c in zip(author, co_author)]
+    series = rng.integers(0, n_books // 4 + 1, n_books)
+    in_series = rng.random(n_books) < 0.3
+    original = [f"Synthetic Book {i}" for i in book_id]
+    titles = [f"{o} (Series {s}, #{i % 5 + 1})" if flag else o
+              for o, s, i, flag in zip(original, series, book_id, in_series)]
+
+    # ratings_count is the Goodreads-wide count, about 90x the sampled ratings table
+    ratings_count = np.maximum((popularity * BASE_RATINGS * 90 * n_books / BASE_BOOKS).astype(np.int64), 1)
+    average = np.clip(rng.normal(3.95, 0.25, n_books), 1.0, 5.0).round(2)
+    # Star counts roughly consistent with the average rating
+    shares = np.stack([np.exp(-((star - average) ** 2)) for star in range(1, 6)], axis=1)
+    stars = (shares / shares.sum(axis=1, keepdims=True) * ratings_count[:, None]).astype(np.int64)
+
+    isbn = rng.integers(10**8, 10**9, n_books)
+    return pd.DataFrame({
+        "book_id": book_id,
+        "goodreads_book_id": goodreads_id,
+        "best_book_id": goodreads_id,
+        "work_id": goodreads_id + 1,
+        "books_count": rng.integers(1, 300, n_books),
+        "isbn": isbn.astype(str),
+        "isbn13": (9780000000000 + isbn).astype(np.float64),
+        "authors": authors,
+        "original_publication_year": rng.integers(1900, 2018, n_books).astype(np.float64),
+        "original_title": original,
+        "title": titles,
+        "language_code": rng.choice(LANGUAGES, n_books, p=LANGUAGE_WEIGHTS),
+        "average_rating": average,
+        "ratings_count": ratings_count,
+        "work_ratings_count": (ratings_count * 1.05).astype(np.int64),
+        "work_text_reviews_count": ratings_count // 30,
+        **{f"ratings_{star}": stars[:, star - 1] for star in range(1, 6)},
+        "image_url": [f"https://images.example.com/books/{g}m.jpg" for g in goodreads_id],
+        "small_image_url": [f"https://images.example.com/books/{g}s.jpg" for g in goodreads_id],
+    })
+
+
+def make_tags(n_tags):
+    names = GENRES + [f"{GENRES[i % len(GENRES)]}-{i}" for i in range(len(GENRES), n_tags)]
+    return pd.DataFrame({"tag_id": np.arange(n_tags), "tag_name": names[:n_tags]})
+
+
+def iter_book_tags(goodreads_ids, n_tags, rng, chunk_books=20_000):
+    tag_weights = _zipf_weights(n_tags, 1.1, rng)
+    for start in range(0, len(goodreads_ids), chunk_books):
+        books = goodreads_ids[start:start + chunk_books]
+        pairs = pd.DataFrame({
+            "goodreads_book_id": np.repeat(books, BASE_TAGS_PER_BOOK),
+            "tag_id": rng.choice(n_tags, len(books) * BASE_TAGS_PER_BOOK, p=tag_weights),
+        }).drop_duplicates()
+        pairs["count"] = rng.zipf(1.6, len(pairs)).clip(1, 50_000)
+        yield pairs
+
+
+def iter_user_books(n_rows, n_users, popularity, rng, columns, chunk_rows=2_000_000):
+    """User/book pairs; books drawn by popularity. Repeated pairs are rare and kept."""
+    for start in range(0, n_rows, chunk_rows):
+        size = min(chunk_rows, n_rows - start)
+        chunk = {
+            "user_id": rng.integers(1, n_users + 1, size, dtype=np.int32),
+            "book_id": rng.choice(len(popularity), size, p=popularity).astype(np.int32) + 1,
+        }
+        if "rating" in columns:
+            chunk["rating"] = rng.choice(np.arange(1, 6, dtype=np.int8), size, p=[0.02, 0.06, 0.23, 0.36, 0.33])
+        yield pd.DataFrame(chunk)[columns]
+
+
+def generate(scale=1.0, seed=0):
+    """Write books, tags, book_tags, ratings and to_read CSVs; returns {file: rows}."""
+    rng = np.random.default_rng(seed)
+    out = os.path.join(dataset_dir(scale), "data")
+    os.makedirs(out, exist_ok=True)
+
+    n_books = max(int(BASE_BOOKS * scale), 10)
+    n_tags = max(int(BASE_TAGS * scale), len(GENRES))
+    n_users = max(int(BASE_USERS * scale), 10)
+    popularity = _zipf_weights(n_books, 0.9, rng)
+
+    books = make_books(n_books, popularity, rng)
+    tables = {
+        "books.csv": [books],
+        "tags.csv": [make_tags(n_tags)],
+        "book_tags.csv": iter_book_tags(books["goodreads_book_id"].to_numpy(), n_tags, rng),
+        "ratings.csv": iter_user_books(int(BASE_RATINGS * scale), n_users, popularity, rng,
+                                       ["user_id", "book_id", "rating"]),
+        "to_read.csv": iter_user_books(int(BASE_TO_READ * scale), n_users, popularity, rng,
+                                       ["user_id", "book_id"]),
+    }
+    return {filename: _write_csv(os.path.join(out, filename), chunks) for filename, chunks in tables.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Goodbooks CSVs for benchmarking.")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of the real dataset size, e.g. 1, 10, 100")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.scale, args.seed)
+    for filename, rows in counts.items():
+        print(f"{filename:<14} {rows:>14,} rows")
+    print(f"Generated in {time.perf_counter() - start:.1f}s -> {os.path.join(dataset_dir(args.scale), 'data')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+Keep the denormalized rating columns of books in step with the ratings table.
+
+books.average_rating, ratings_count, work_ratings_count and ratings_1..5 come from the
+Goodreads export, while the ratings table holds only a sample of those ratings. The columns
+therefore cannot be recomputed from it: the export's values are kept as a baseline, and
+ratings appended afterwards are added on top.
+
+- The first run copies the rating columns into book_rating_baseline. It also records the
+  highest rating_id present as the baseline watermark, because those ratings are already
+  part of the exported counts.
+- refresh aggregates only ratings above the last watermark into per-book star counts. The
+  touched books get their histogram, counts and an average recomputed from the histogram,
+  plus their weighted_rating (weighted_ratings.py) rescored with the stored prior. They are
+  written with batched UPDATEs in the transaction that advances the watermark.
+- The same books are then written to the Neo4j Book nodes with batched UNWIND SETs. The
+  graph has its own watermark, so a failed or skipped graph update is caught up on the
+  next run.
+- reconcile rebuilds every book from its baseline plus all ratings above the baseline
+  watermark, which repairs any drift. It then recomputes the weighted-rating prior and
+  every score, and rewrites every Book node. refresh runs it
+  itself once BOOK_RATINGS_RECONCILE_INTERVAL has passed since the last one.
+
+append inserts a CSV of new ratings into the ratings table and then refreshes, together
+with the summaries.py tables on MySQL. The dashboard starts watch_for_updates(), a daemon
+thread that polls the watermark and drops cached query results once a refresh has moved it,
+so no page waits on MySQL for the check. It also publishes the current ratings of every
+book rated since the baseline as the datasets.rating_overlay, so the in-process search and
+TF-IDF indexes (built from the exported ratings) show and filter on the folded-in values.
+
+Usage (from Dashboard603/):
+    python book_ratings.py append new_ratings.csv [--no-neo4j]
+    python book_ratings.py refresh [--no-neo4j]      # e.g. from cron
+    python book_ratings.py reconcile [--no-neo4j]
+"""
+
+import argparse
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, text
+
+import config
+import instrumentation
+import weighted_ratings
+from cache import data_reloaded
+from sql_queries import get_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+STAR_COLUMNS = [f"ratings_{star}" for star in range(1, 6)]
+COUNT_COLUMNS = ["ratings_count", "work_ratings_count"]
+RATING_COLUMNS = ["average_rating"] + COUNT_COLUMNS + STAR_COLUMNS
+
+CREATE_BASELINE = """
+CREATE TABLE IF NOT EXISTS book_rating_baseline (
+    book_id INT PRIMARY KEY,
+    average_rating DECIMAL(3, 2),
+    ratings_count BIGINT NOT NULL,
+    work_ratings_count BIGINT NOT NULL,
+    ratings_1 BIGINT NOT NULL,
+    ratings_2 BIGINT NOT NULL,
+    ratings_3 BIGINT NOT NULL,
+    ratings_4 BIGINT NOT NULL,
+    ratings_5 BIGINT NOT NULL
+)
+"""
+
+CREATE_STATE = """
+CREATE TABLE IF NOT EXISTS book_rating_state (
+    id TINYINT PRIMARY KEY,
+    baseline_rating_id BIGINT NOT NULL,
+    last_rating_id BIGINT NOT NULL,
+    neo4j_rating_id BIGINT NOT NULL,
+    refreshed_at DATETIME NOT NULL,
+    reconciled_at DATETIME NOT NULL
+)
+"""
+
+# Books without a baseline row (the first run, or books loaded since) take their current values
+SNAPSHOT_NEW_BOOKS = """
+INSERT INTO book_rating_baseline
+    (book_id, average_rating, ratings_count, work_ratings_count, ratings_1, ratings_2, ratings_3, ratings_4, ratings_5)
+SELECT
+    b.book_id,
+    b.average_rating,
+    COALESCE(b.ratings_count, 0),
+    COALESCE(b.work_ratings_count, 0),
+    COALESCE(b.ratings_1, 0),
+    COALESCE(b.ratings_2, 0),
+    COALESCE(b.ratings_3, 0),
+    COALESCE(b.ratings_4, 0),
+    COALESCE(b.ratings_5, 0)
+FROM books b
+LEFT JOIN book_rating_baseline base ON base.book_id = b.book_id
+WHERE base.book_id IS NULL
+"""
+
+STAR_DELTAS = """
+SELECT
+    book_id,
+    SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as ratings_1,
+    SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END) as ratings_2,
+    SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END) as ratings_3,
+    SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END) as ratings_4,
+    SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END) as ratings_5
+FROM ratings
+WHERE rating_id > :low AND rating_id <= :high
+GROUP BY book_id
+"""
+
+# Current values of the books whose ratings differ from the export (datasets.set_rating_overlay)
+RATING_OVERLAY = """
+SELECT b.book_id, b.title, b.average_rating, b.ratings_count
+FROM books b
+WHERE b.book_id IN (
+    SELECT DISTINCT r.book_id
+    FROM ratings r
+    WHERE r.rating_id > (SELECT baseline_rating_id FROM book_rating_state WHERE id = 1)
+)
+"""
+
+# Book nodes are matched on book_id, as ingest.py MERGEs them. Graphs restored from the dump
+# without that property fall back to the title, which every graph query uses.
+SET_BOOK_NODES = """
+UNWIND $rows AS row
+OPTIONAL MATCH (byId:Book {book_id: row.book_id})
+OPTIONAL MATCH (byTitle:Book {title: row.title}) WHERE byId IS NULL
+WITH row, coalesce(byId, byTitle) AS b
+WHERE b IS NOT NULL
+SET b.average_rating = row.average_rating,
+    b.ratings_count = row.ratings_count,
+    b.ratings_1 = row.ratings_1,
+    b.ratings_2 = row.ratings_2,
+    b.ratings_3 = row.ratings_3,
+    b.ratings_4 = row.ratings_4,
+    b.ratings_5 = row.ratings_5,
+    b.weighted_rating = row.weighted_rating
+"""
+
+
+def ensure_schema(engine=None):
+    """
+    Create the baseline and state tables and snapshot the rating columns of books not yet in the baseline.
+
+    Also adds books.weighted_rating (weighted_ratings.py), which refresh keeps up to date,
+    and scores books loaded since the last weighted-rating build.
+    """
+    import summaries
+
+    engine = engine or get_engine()
+    if engine.dialect.name == "mysql":
+        summaries.ensure_schema(engine)  # adds ratings.rating_id to databases that predate it
+    weighted_ratings.ensure_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_BASELINE))
+        conn.execute(text(CREATE_STATE))
+        conn.execute(text(SNAPSHOT_NEW_BOOKS))
+        if conn.execute(text("SELECT COUNT(*) FROM book_rating_state")).scalar() == 0:
+            high = conn.execute(text("SELECT COALESCE(MAX(rating_id), 0) FROM ratings")).scalar()
+            now = datetime.datetime.now()
+            conn.execute(text("""
+                INSERT INTO book_rating_state
+                    (id, baseline_rating_id, last_rating_id, neo4j_rating_id, refreshed_at, reconciled_at)
+                VALUES (1, :high, :high, :high, :now, :now)
+            """), {"high": high, "now": now})
+    weighted_ratings.score_new_books(engine)
+
+
+def _read_state(conn, lock=False):
+    # FOR UPDATE serialises concurrent refreshes, so no rating is folded in twice
+    query = "SELECT * FROM book_rating_state WHERE id = 1"
+    if lock and conn.dialect.name == "mysql":
+        query += " FOR UPDATE"
+    return conn.execute(text(query)).mappings().one()
+
+
+def _read_books(conn, table, book_ids=None, columns=RATING_COLUMNS):
+    """Rating columns of table (books or book_rating_baseline), optionally for some book ids only."""
+    query = f"SELECT book_id, {', '.join(columns)} FROM {table}"
+    if book_ids is None:
+        return pd.read_sql(text(query), conn)
+    statement = text(query + " WHERE book_id IN :ids").bindparams(bindparam("ids", expanding=True))
+    ids = [int(book_id) for book_id in book_ids]
+    frames = [pd.read_sql(statement, conn, params={"ids": ids[start:start + config.BOOK_RATINGS_BATCH_SIZE]})
+              for start in range(0, len(ids), config.BOOK_RATINGS_BATCH_SIZE)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.read_sql(text(query + " WHERE 1 = 0"), conn)
+
+
+def _normalize(books):
+    books = books.copy()
+    for column in COUNT_COLUMNS + STAR_COLUMNS:
+        books[column] = pd.to_numeric(books[column]).fillna(0).astype(np.int64)
+    books["average_rating"] = pd.to_numeric(books["average_rating"]).astype(float).round(2)
+    return books.set_index("book_id")
+
+
+def combine(base, deltas):
+    """
+    Rating columns of the books in base after adding the per-star counts in deltas.
+
+    base has book_id plus RATING_COLUMNS; deltas has book_id plus STAR_COLUMNS. Counts grow
+    by the number of new ratings, and the average is recomputed from the histogram for every
+    book that received any. Other books keep their base values, average included.
+    """
+    books = _normalize(base)
+    deltas = deltas.set_index("book_id")[STAR_COLUMNS].astype(np.int64).reindex(books.index, fill_value=0)
+    added = deltas.sum(axis=1)
+    books[STAR_COLUMNS] += deltas
+    for column in COUNT_COLUMNS:
+        books[column] += added
+    stars = books[STAR_COLUMNS].to_numpy()
+    totals = stars.sum(axis=1)
+    averages = stars @ np.arange(1, 6) / np.maximum(totals, 1)
+    changed = (added > 0) & (totals > 0)
+    books.loc[changed, "average_rating"] = np.round(averages[changed.to_numpy()], 2)
+    return books.reset_index()
+
+
+def _update_books(conn, books):
+    # Every column of books besides book_id is written; weighted_rating only when it was scored
+    columns = [column for column in books.columns if column != "book_id"]
+    statement = text(f"UPDATE books SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE book_id = :book_id")
+    rows = books.astype(object).where(books.notna(), None).to_dict("records")
+    for start in range(0, len(rows), config.BOOK_RATINGS_BATCH_SIZE):
+        conn.execute(statement, rows[start:start + config.BOOK_RATINGS_BATCH_SIZE])
+
+
+def _changed(updated, current):
+    # Only write the books whose values differ, so a reconcile of a consistent table is read-only
+    current = _normalize(current).reindex(updated["book_id"])
+    updated = updated.set_index("book_id")
+    differs = (updated[RATING_COLUMNS] != current[RATING_COLUMNS]).any(axis=1)
+    return updated[differs.to_numpy()].reset_index()
+
+
+def _reconcile_due(state):
+    elapsed = datetime.datetime.now() - pd.Timestamp(state["reconciled_at"]).to_pydatetime()
+    return elapsed.total_seconds() >= config.BOOK_RATINGS_RECONCILE_INTERVAL
+
+
+def refresh(full=False, neo4j=True, engine=None):
+    """
+    Fold ratings appended since the last run into books and then the Neo4j Book nodes.
+
+    With full=True, or when the last reconcile is older than BOOK_RATINGS_RECONCILE_INTERVAL,
+    every book is rebuilt from the baseline instead. Returns a dict with the ratings folded
+    in (all since the baseline for a reconcile), the books updated, whether a reconcile ran
+    and the Book nodes written.
+    """
+    engine = engine or get_engine()
+    ensure_schema(engine)
+    with engine.begin() as conn:
+        state = _read_state(conn, lock=True)
+        reconciled = full or _reconcile_due(state)
+        low = state["baseline_rating_id"] if reconciled else state["last_rating_id"]
+        high = conn.execute(text("SELECT COALESCE(MAX(rating_id), 0) FROM ratings")).scalar()
+        deltas = pd.read_sql(text(STAR_DELTAS), conn, params={"low": low, "high": high})
+
+        if reconciled:
+            updated = combine(_read_books(conn, "book_rating_baseline"), deltas)
+            changed = _changed(updated, _read_books(conn, "books"))
+        else:
+            changed = combine(_read_books(conn, "books", deltas["book_id"]), deltas)
+            prior = weighted_ratings.load_prior(conn)
+            if prior is not None:
+                changed["weighted_rating"] = weighted_ratings.score(changed[STAR_COLUMNS], *prior)
+        _update_books(conn, changed)
+
+        conn.execute(text(
+            "UPDATE book_rating_state SET last_rating_id = :high, refreshed_at = :now"
+            + (", reconciled_at = :now" if reconciled else "") + " WHERE id = 1"
+        ), {"high": high, "now": datetime.datetime.now()})
+
+    if reconciled:
+        # A reconcile also refreshes the prior and rescores every book
+        weighted_ratings.build(neo4j=False, engine=engine)
+    result = {
+        "ratings": int(deltas[STAR_COLUMNS].to_numpy().sum()),
+        "books": len(changed),
+        "reconciled": reconciled,
+        "nodes": None,
+    }
+    if neo4j:
+        result["nodes"] = sync_neo4j(full=reconciled, engine=engine)
+    return result
+
+
+def sync_neo4j(full=False, engine=None):
+    """
+    Copy the rating columns of books onto their Neo4j Book nodes; returns the rows written.
+
+    Only books rated since the graph's watermark are written, unless full=True. The
+    watermark advances once every batch has been written.
+    """
+    import neo4j_db
+
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        state = _read_state(conn)
+        high = state["last_rating_id"]
+        if not full and state["neo4j_rating_id"] >= high:
+            return 0
+        columns = ["title", "average_rating", "ratings_count"] + STAR_COLUMNS + ["weighted_rating"]
+        if full:
+            books = _read_books(conn, "books", columns=columns)
+        else:
+            rated = conn.execute(text(
+                "SELECT DISTINCT book_id FROM ratings WHERE rating_id > :low AND rating_id <= :high"
+            ), {"low": state["neo4j_rating_id"], "high": high}).scalars().all()
+            books = _read_books(conn, "books", rated, columns=columns)
+
+    for column in ("average_rating", "weighted_rating"):
+        books[column] = pd.to_numeric(books[column]).astype(float)
+    rows = books.astype(object).where(books.notna(), None).to_dict("records")
+    if rows:
+        with neo4j_db.session() as session:
+            for start in range(0, len(rows), config.BOOK_RATINGS_BATCH_SIZE):
+                batch = rows[start:start + config.BOOK_RATINGS_BATCH_SIZE]
+                session.execute_write(lambda tx: tx.run(SET_BOOK_NODES, rows=batch).consume())
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE book_rating_state SET neo4j_rating_id = :high WHERE id = 1"), {"high": high})
+    return len(rows)
+
+
+def append(csv_path, neo4j=True, engine=None, chunk_size=50_000):
+    """
+    Insert the ratings in csv_path (user_id, book_id, rating) and fold them in.
+
+    Returns the refresh() result with the number of rows inserted under "inserted".
+    """
+    import ingest
+    import summaries
+
+    engine = engine or get_engine()
+    dtypes = {"user_id": "int32", "book_id": "int32", "rating": "int8"}
+    inserted = 0
+    for chunk in pd.read_csv(csv_path, usecols=list(dtypes), dtype=dtypes, chunksize=chunk_size):
+        with engine.begin() as conn:
+            conn.execute(ingest.ratings_table.insert(), chunk.astype(object).to_dict("records"))
+        inserted += len(chunk)
+    result = refresh(neo4j=neo4j, engine=engine)
+    if engine.dialect.name == "mysql":
+        summaries.refresh_summaries(engine=engine)
+    return dict(result, inserted=inserted)
+
+
+def _folded_watermark():
+    try:
+        with get_engine().connect() as conn:
+            return conn.execute(text("SELECT last_rating_id FROM book_rating_state WHERE id = 1")).scalar()
+    except Exception:
+        return None  # not set up, or a backend without the table (DuckDB)
+
+
+def load_rating_overlay(engine=None):
+    """book_id, title, average_rating and ratings_count of every book rated since the baseline."""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        overlay = pd.read_sql(text(RATING_OVERLAY), conn)
+    overlay["average_rating"] = pd.to_numeric(overlay["average_rating"]).astype(float)
+    overlay["ratings_count"] = pd.to_numeric(overlay["ratings_count"]).fillna(0).astype(np.int64)
+    return overlay
+
+
+_seen_watermark = None
+_seen_lock = threading.Lock()
+
+
+def check_for_updates():
+    """
+    Pick up ratings that a refresh has folded into books.
+
+    When the watermark moves (or is first seen), the rating overlay is republished for the in-process indexes, and on a
+    move every cached query result is dropped. Returns True when the cache was cleared.
+    """
+    import datasets
+
+    global _seen_watermark
+    watermark = _folded_watermark()
+    if watermark is None:
+        return False
+    with _seen_lock:
+        previous, _seen_watermark = _seen_watermark, watermark
+    if previous == watermark:
+        return False
+    try:
+        datasets.set_rating_overlay(load_rating_overlay())
+    except Exception as e:
+        logger.error("Error loading folded-in book ratings: %s", e)
+        instrumentation.record_error(f"{__name__}.load_rating_overlay")
+    if previous is None:
+        return False
+    data_reloaded()
+    return True
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def _watch(interval):
+    while True:
+        try:
+            check_for_updates()
+        except Exception as e:
+            logger.error("Error checking for folded-in book ratings: %s", e)
+        time.sleep(interval)
+
+
+def watch_for_updates(interval=None):
+    """
+    Run check_for_updates() every interval seconds (default BOOK_RATINGS_POLL_INTERVAL)
+    from a daemon thread; once per process.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch, args=(interval or config.BOOK_RATINGS_POLL_INTERVAL,),
+                                        name="book-ratings", daemon=True)
+            _watcher.start()
+        return _watcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep books' rating columns in step with appended ratings.")
+    parser.add_argument("--sql-url", help="SQLAlchemy URL (default: the dashboard's engine from config.py)")
+    parser.add_argument("--no-neo4j", action="store_true", help="update SQL only; the graph catches up on a later run")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    append_parser = subparsers.add_parser("append", help="insert new ratings from a CSV and fold them in")
+    append_parser.add_argument("ratings_csv", help="CSV with user_id, book_id, rating columns")
+    subparsers.add_parser("refresh", help="fold in ratings appended since the last run")
+    subparsers.add_parser("reconcile", help="rebuild every book from the baseline and all appended ratings")
+    args = parser.parse_args()
+
+    engine = create_engine(args.sql_url) if args.sql_url else get_engine()
+    start = time.perf_counter()
+    if args.command == "append":
+        result = append(args.ratings_csv, neo4j=not args.no_neo4j, engine=engine)
+        print(f"Inserted {result['inserted']:,} ratings")
+    else:
+        result = refresh(full=args.command == "reconcile", neo4j=not args.no_neo4j, engine=engine)
+    action = "Reconciled" if result["reconciled"] else "Folded in"
+    print(f"{action} {result['ratings']:,} ratings: {result['books']:,} books updated"
+          + (f", {result['nodes']:,} Book nodes written" if result["nodes"] is not None else ""))
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
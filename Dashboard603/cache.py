@@ -0,0 +1,174 @@
+"""
+Result cache shared by the SQL and Neo4j query functions.
+
+The Goodbooks catalog changes only when data is reloaded, so query results are kept in a
+process-wide LRU cache keyed on the query function and its parameters. Entries expire after
+a per-function TTL, the cache is capped by an estimated memory size, and data_reloaded()
+drops everything after an import.
+"""
+
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import config
+
+
+MISS = object()
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # key -> (expires_at, size_bytes, value)
+_generation = 0
+_total_bytes = 0
+_stats = {}                # function name -> {"hits": n, "misses": n}
+_calls = threading.local() # per thread: whether the last cached call was a hit
+
+
+def _estimate_size(value):
+    """Rough in-memory size of a cached result in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (list, tuple)):
+        size = sys.getsizeof(value)
+        for item in value:
+            size += sys.getsizeof(item)
+            if hasattr(item, "values"):
+                size += sum(sys.getsizeof(v) for v in item.values())
+        return size
+    return sys.getsizeof(value)
+
+
+def _make_key(name, signature, args, kwargs):
+    # Bind against the signature so f(5), f(limit=5) and f() with default 5 share an entry
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return (name, tuple(bound.arguments.items()))
+
+
+def _count(name, field):
+    counters = _stats.setdefault(name, {"hits": 0, "misses": 0})
+    counters[field] += 1
+
+
+def _get(key, name):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            _evict(key)
+            return MISS
+        _entries.move_to_end(key)
+        _count(name, "hits")
+        return value
+
+
+def _evict(key):
+    global _total_bytes
+    _, size, _ = _entries.pop(key)
+    _total_bytes -= size
+
+
+def _put(key, value, ttl, generation):
+    global _total_bytes
+    size = _estimate_size(value)
+    if size > config.CACHE_MAX_BYTES:
+        return
+    with _lock:
+        # A reload happened while this query was running; its result may be stale.
+        if generation != _generation:
+            return
+        if key in _entries:
+            _evict(key)
+        _entries[key] = (time.monotonic() + ttl, size, value)
+        _total_bytes += size
+        while _total_bytes > config.CACHE_MAX_BYTES and _entries:
+            _evict(next(iter(_entries)))
+
+
+def cached(ttl=None, skip_args=0, cache_empty=False):
+    """
+    Cache a query function's results keyed on its name and parameters.
+
+    ttl: seconds before an entry expires (defaults to config.CACHE_DEFAULT_TTL).
+    skip_args: number of leading positional arguments left out of the key, e.g. 1 for
+               Neo4j transaction functions whose first argument is the transaction.
+
+    Empty results are not cached, because the SQL query functions return an empty
+    DataFrame when the database is unreachable; cache_empty=True stores them too, for
+    functions whose empty result is a real answer. Cached values are shared between
+    callers and must not be modified in place.
+
+    The wrapper exposes lookup(*args, **kwargs), which returns a cached value or MISS
+    without running the function (args given without the skipped leading arguments).
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        entry_ttl = config.CACHE_DEFAULT_TTL if ttl is None else ttl
+        signature = inspect.signature(fn)
+        key_signature = signature.replace(parameters=list(signature.parameters.values())[skip_args:])
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = _make_key(name, key_signature, args[skip_args:], kwargs)
+            value = _get(key, name)
+            if value is not MISS:
+                _calls.hit = True
+                return value
+            with _lock:
+                _count(name, "misses")
+                generation = _generation
+            value = fn(*args, **kwargs)
+            if cache_empty or not hasattr(value, "__len__") or len(value) > 0:
+                _put(key, value, entry_ttl, generation)
+            _calls.hit = False
+            return value
+
+        def lookup(*args, **kwargs):
+            return _get(_make_key(name, key_signature, args, kwargs), name)
+
+        wrapper.lookup = lookup
+        return wrapper
+    return decorator
+
+
+def last_call_hit():
+    """
+    Whether the most recent cached function call on this thread was served from the cache.
+
+    None if no cached function has been called on this thread yet.
+    """
+    return getattr(_calls, "hit", None)
+
+
+def data_reloaded():
+    """
+    Invalidate every cached result.
+
+    Call after the MySQL or Neo4j data has been (re)loaded so the next render queries
+    the databases again. Queries already in flight will not store their results.
+    """
+    global _generation, _total_bytes
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _total_bytes = 0
+
+
+def get_cache_stats():
+    """
+    Get hit/miss counters per cached function plus overall cache occupancy.
+
+    Returns a dict with "functions" ({name: {"hits", "misses"}}), "entries" and "bytes".
+    """
+    with _lock:
+        return {
+            "functions": {name: dict(counts) for name, counts in _stats.items()},
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+        }
@@ -0,0 +1,318 @@
+"""
+Collaborative-filtering recommendations learned from the ratings table.
+
+A biased matrix-factorisation model (rating ~ mean + user bias + book bias + p_u . q_b)
+is trained with vectorised mini-batch SGD while ratings are streamed in chunks, so peak
+memory is the factor matrices plus one chunk regardless of table size. Factors are saved
+as .npy files under artifacts/cf and memory-mapped by the dashboard, which answers
+"readers who liked X also liked" and per-user top-N with a single dense product.
+
+New ratings are folded in without retraining: the affected users' (and books') factors
+are re-solved in closed form with the other side held fixed.
+
+Usage (from Dashboard603/):
+    python collaborative.py train [--source csv|sql] [--epochs 10]
+    python collaborative.py fold-in new_ratings.csv
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import instrumentation
+from datasets import iter_ratings, load_books, replace_file, write_json, write_npy
+
+
+logger = logging.getLogger(__name__)
+
+
+ARRAYS = ("user_factors", "item_factors", "user_bias", "item_bias")
+
+
+def model_dir():
+    return os.path.join(config.ARTIFACT_DIR, "cf")
+
+
+class CFModel:
+    """Factor matrices indexed directly by user_id and book_id."""
+
+    def __init__(self, user_factors, item_factors, user_bias, item_bias, global_mean, meta=None):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_bias = user_bias
+        self.item_bias = item_bias
+        self.global_mean = global_mean
+        self.meta = meta or {}
+        self._item_unit = None
+
+    @classmethod
+    def initialise(cls, n_users, n_items, factors, global_mean, seed=0):
+        rng = np.random.default_rng(seed)
+        return cls(
+            (rng.standard_normal((n_users, factors)) * 0.1).astype(np.float32),
+            (rng.standard_normal((n_items, factors)) * 0.1).astype(np.float32),
+            np.zeros(n_users, dtype=np.float32),
+            np.zeros(n_items, dtype=np.float32),
+            global_mean,
+        )
+
+    @classmethod
+    def load(cls, writable=False):
+        """Load a saved model; arrays are memory-mapped read-only unless writable=True."""
+        path = model_dir()
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = None if writable else "r"
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS]
+        model = cls(*arrays, meta["global_mean"], meta)
+        model.meta_mtime = os.path.getmtime(os.path.join(path, "meta.json"))
+        return model
+
+    def save(self, **meta):
+        path = model_dir()
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            replace_file(os.path.join(path, f"{name}.npy"), write_npy(np.asarray(getattr(self, name))))
+        self.meta.update(meta, global_mean=float(self.global_mean), saved_at=time.time(),
+                         users=len(self.user_bias), books=len(self.item_bias))
+        replace_file(os.path.join(path, "meta.json"), write_json(self.meta))
+
+    def sgd_epoch(self, chunks, learning_rate, regularization, batch_size=20_000, seed=0):
+        """One pass of mini-batch SGD over an iterable of rating chunks; returns the RMSE."""
+        rng = np.random.default_rng(seed)
+        P, Q, bu, bi = self.user_factors, self.item_factors, self.user_bias, self.item_bias
+        squared_error, seen = 0.0, 0
+        for chunk in chunks:
+            order = rng.permutation(len(chunk))
+            users = chunk["user_id"].to_numpy()[order]
+            items = chunk["book_id"].to_numpy()[order]
+            ratings = chunk["rating"].to_numpy(dtype=np.float32)[order]
+            for start in range(0, len(order), batch_size):
+                u = users[start:start + batch_size]
+                i = items[start:start + batch_size]
+                pu, qi = P[u], Q[i]
+                err = ratings[start:start + batch_size] - (self.global_mean + bu[u] + bi[i] + np.einsum("ij,ij->i", pu, qi))
+                squared_error += float(err @ err)
+                seen += len(err)
+                # Average the updates for ids that repeat within a batch (popular books
+                # appear thousands of times) so each id takes at most one SGD-sized step
+                u_step = (learning_rate / np.bincount(u)[u])[:, None]
+                i_step = (learning_rate / np.bincount(i)[i])[:, None]
+                np.add.at(bu, u, u_step[:, 0] * (err - regularization * bu[u]))
+                np.add.at(bi, i, i_step[:, 0] * (err - regularization * bi[i]))
+                np.add.at(P, u, u_step * (err[:, None] * qi - regularization * pu))
+                np.add.at(Q, i, i_step * (err[:, None] * pu - regularization * qi))
+        return (squared_error / max(seen, 1)) ** 0.5
+
+    def fold_in(self, ratings, regularization=None):
+        """
+        Absorb new ratings without retraining.
+
+        Users (then books) that appear in ratings get their bias and factors re-solved by
+        ridge regression on the new ratings with the other side held fixed. Known rows are
+        pulled towards their current values (weighted like CF_FOLD_IN_ANCHOR ratings) so
+        their history is not forgotten; unknown ids grow the factor matrices.
+        """
+        regularization = config.CF_REGULARIZATION if regularization is None else regularization
+        users = ratings["user_id"].to_numpy()
+        items = ratings["book_id"].to_numpy()
+        values = ratings["rating"].to_numpy(dtype=np.float32)
+        known_users, known_items = len(self.user_bias), len(self.item_bias)
+        self._grow(users.max() + 1, items.max() + 1)
+
+        self._solve_rows(self.user_factors, self.user_bias, known_users, users, items, values,
+                         self.item_factors, self.item_bias, regularization)
+        self._solve_rows(self.item_factors, self.item_bias, known_items, items, users, values,
+                         self.user_factors, self.user_bias, regularization)
+        self._item_unit = None
+
+    def _grow(self, n_users, n_items):
+        factors = self.user_factors.shape[1]
+        if n_users > len(self.user_bias):
+            extra = n_users - len(self.user_bias)
+            self.user_factors = np.vstack([self.user_factors, np.zeros((extra, factors), np.float32)])
+            self.user_bias = np.concatenate([self.user_bias, np.zeros(extra, np.float32)])
+        if n_items > len(self.item_bias):
+            extra = n_items - len(self.item_bias)
+            self.item_factors = np.vstack([self.item_factors, np.zeros((extra, factors), np.float32)])
+            self.item_bias = np.concatenate([self.item_bias, np.zeros(extra, np.float32)])
+
+    def _solve_rows(self, factors, bias, known, rows, others, values, other_factors, other_bias, regularization):
+        # Minimise |D x - t|^2 + w |x - x_current|^2 per row, where x is [factors, bias];
+        # new rows have x_current = 0 and w = regularization, i.e. plain ridge regression
+        order = np.argsort(rows, kind="stable")
+        rows, others, values = rows[order], others[order], values[order]
+        boundaries = np.flatnonzero(np.diff(rows)) + 1
+        k = factors.shape[1]
+        identity = np.eye(k + 1, dtype=np.float32)
+        for row_others, row_values, row in zip(np.split(others, boundaries), np.split(values, boundaries),
+                                               rows[np.r_[0, boundaries]]):
+            design = np.hstack([other_factors[row_others], np.ones((len(row_others), 1), np.float32)])
+            target = row_values - self.global_mean - other_bias[row_others]
+            current = np.append(factors[row], bias[row])
+            weight = config.CF_FOLD_IN_ANCHOR if row < known else regularization
+            solution = np.linalg.solve(design.T @ design + weight * identity,
+                                       design.T @ target + weight * current)
+            factors[row] = solution[:k]
+            bias[row] = solution[k]
+
+    def similar_items(self, book_id, n):
+        """(book_ids, cosine) of the n books whose factors are closest to book_id's."""
+        if self._item_unit is None:
+            norms = np.linalg.norm(self.item_factors, axis=1, keepdims=True)
+            self._item_unit = np.asarray(self.item_factors) / np.where(norms > 0, norms, 1)
+        scores = self._item_unit @ self._item_unit[book_id]
+        scores[book_id] = -np.inf
+        return _top(scores, n)
+
+    def recommend(self, user_id, n, exclude=()):
+        """(book_ids, predicted rating) of the n best unseen books for a user."""
+        scores = self.global_mean + np.asarray(self.item_bias) + self.item_factors @ self.user_factors[user_id]
+        scores[0] = -np.inf  # book ids start at 1
+        scores[[b for b in exclude if b < len(scores)]] = -np.inf
+        return _top(scores, n)
+
+
+def _top(scores, n):
+    n = min(n, len(scores))
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    top = top[np.isfinite(scores[top])]
+    return top, scores[top]
+
+
+def train(source="csv", epochs=None, factors=None, chunk_size=None):
+    """Train a model by streaming ratings, then save it. Returns the final training RMSE."""
+    epochs = epochs or config.CF_EPOCHS
+    factors = factors or config.CF_FACTORS
+    chunk_size = chunk_size or config.CF_CHUNK_SIZE
+
+    # First pass: id ranges and the global mean
+    max_user = max_item = count = 0
+    total = 0.0
+    for chunk in iter_ratings(chunk_size, source):
+        max_user = max(max_user, int(chunk["user_id"].max()))
+        max_item = max(max_item, int(chunk["book_id"].max()))
+        total += float(chunk["rating"].to_numpy().sum(dtype=np.float64))
+        count += len(chunk)
+
+    model = CFModel.initialise(max_user + 1, max_item + 1, factors, total / max(count, 1))
+    rmse = None
+    for epoch in range(epochs):
+        rmse = model.sgd_epoch(iter_ratings(chunk_size, source), config.CF_LEARNING_RATE,
+                               config.CF_REGULARIZATION, seed=epoch)
+        print(f"epoch {epoch + 1}/{epochs}: train RMSE {rmse:.4f}")
+    model.save(source=source, epochs=epochs, factors=factors, ratings=count, rmse=rmse)
+    return rmse
+
+
+def fold_in(ratings):
+    """Fold a DataFrame of new ratings (user_id, book_id, rating) into the saved model."""
+    model = CFModel.load(writable=True)
+    model.fold_in(ratings)
+    model.save(folded_in=model.meta.get("folded_in", 0) + len(ratings))
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_model():
+    """The saved model, memory-mapped once per process and reloaded after retraining."""
+    global _model
+    meta_path = os.path.join(model_dir(), "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _model_lock:
+        if _model is None or _model.meta_mtime != mtime:
+            try:
+                _model = CFModel.load()
+            except Exception as e:
+                logger.error("Error loading collaborative-filtering model: %s", e)
+                instrumentation.record_error(f"{__name__}.load_model", kind="load")
+                return None
+        return _model
+
+
+@functools.lru_cache(maxsize=None)
+def _titles():
+    books = load_books()
+    return dict(zip(books["book_id"].tolist(), books["title"]))
+
+
+@functools.lru_cache(maxsize=None)
+def _book_ids():
+    books = load_books().drop_duplicates("title")
+    return dict(zip(books["title"], books["book_id"].tolist()))
+
+
+def _book_id(title):
+    return _book_ids().get(title)
+
+
+def get_similar_books(title, limit=10):
+    """
+    "Readers who liked this also liked": books with the closest rating factors.
+
+    Returns a list of {"title", "similarity"} dicts, or None if no model is available or
+    the book is unknown to it.
+    """
+    model = load_model()
+    book_id = _book_id(title)
+    if model is None or book_id is None or book_id >= len(model.item_bias):
+        return None
+    book_ids, scores = model.similar_items(book_id, limit)
+    titles = _titles()
+    return [{"title": titles.get(int(b), f"book {b}"), "similarity": round(float(s), 3)}
+            for b, s in zip(book_ids, scores)]
+
+
+def get_user_recommendations(user_id, limit=10, exclude_book_ids=()):
+    """
+    Top-N books for a user by predicted rating, skipping exclude_book_ids.
+
+    Returns a list of {"title", "predicted_rating"} dicts, or None if no model is available
+    or the user is unknown to it.
+    """
+    model = load_model()
+    if model is None or not 0 < user_id < len(model.user_bias):
+        return None
+    book_ids, scores = model.recommend(user_id, limit, exclude_book_ids)
+    titles = _titles()
+    return [{"title": titles.get(int(b), f"book {b}"), "predicted_rating": round(float(min(s, 5.0)), 2)}
+            for b, s in zip(book_ids, scores)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or update the collaborative-filtering model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="train from the full ratings table")
+    train_parser.add_argument("--source", choices=["csv", "sql"], default="csv")
+    train_parser.add_argument("--epochs", type=int, default=config.CF_EPOCHS)
+    train_parser.add_argument("--factors", type=int, default=config.CF_FACTORS)
+    fold_parser = subparsers.add_parser("fold-in", help="fold new ratings into the saved model")
+    fold_parser.add_argument("ratings_csv", help="CSV with user_id, book_id, rating columns")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "train":
+        train(args.source, args.epochs, args.factors)
+    else:
+        ratings = pd.read_csv(args.ratings_csv, usecols=["user_id", "book_id", "rating"])
+        fold_in(ratings)
+        print(f"Folded in {len(ratings):,} ratings")
+    print(f"Done in {time.perf_counter() - start:.1f}s -> {model_dir()}")
+
+
+if __name__ == "__main__":
+    main()
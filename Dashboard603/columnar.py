@@ -0,0 +1,225 @@
+"""
+Memory-mapped columnar copies of books.csv and tags.csv.
+
+Every in-process engine (search index, recommendation indexes, ingestion, cache warm-up)
+needs book metadata, and re-parsing 3 MB of CSV text costs each Streamlit process a few
+hundred milliseconds. This module converts the CSVs once into one .npy file per column
+under artifacts/columnar/<table>/:
+
+- numeric columns are stored with their parsed dtype
+- string columns are dictionary-encoded: <col>.codes.npy (int32, -1 for missing) indexes
+  into the distinct values, stored as UTF-8 bytes (<col>.dict.npy) plus offsets
+  (<col>.offsets.npy)
+
+ColumnarTable opens the files with mmap_mode="r", so columns are zero-copy views whose
+pages are shared by every process on the machine. datasets.load_books/load_tags use it
+when it is up to date with the CSVs.
+
+Usage (from Dashboard603/):
+    python columnar.py build
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import instrumentation
+from datasets import csv_fingerprint, replace_file, write_json, write_npy
+
+
+logger = logging.getLogger(__name__)
+
+
+def table_dir(name):
+    return os.path.join(config.ARTIFACT_DIR, "columnar", name)
+
+
+def _encode_strings(values):
+    """Dictionary-encode a string Series into (codes, utf-8 bytes, offsets)."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    encoded = [str(value).encode("utf-8") for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return codes.astype(np.int32), data, offsets
+
+
+def convert(name, df, source):
+    """Write a DataFrame as per-column .npy files plus meta.json; source is the CSV filename."""
+    path = table_dir(name)
+    os.makedirs(path, exist_ok=True)
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_extension_array_dtype(values):
+            replace_file(os.path.join(path, f"{column}.npy"), write_npy(values.to_numpy()))
+            columns[column] = str(values.dtype)
+        else:
+            codes, data, offsets = _encode_strings(values)
+            replace_file(os.path.join(path, f"{column}.codes.npy"), write_npy(codes))
+            replace_file(os.path.join(path, f"{column}.dict.npy"), write_npy(data))
+            replace_file(os.path.join(path, f"{column}.offsets.npy"), write_npy(offsets))
+            columns[column] = "string"
+    # meta.json is written last; a changed mtime tells running processes to reload
+    replace_file(os.path.join(path, "meta.json"), write_json({
+        "rows": len(df),
+        "columns": columns,
+        "source": source,
+        "fingerprint": csv_fingerprint([source])[source],
+        "built_at": time.time(),
+    }))
+
+
+class StringColumn:
+    """Dictionary-encoded strings backed by memory-mapped codes, bytes and offsets."""
+
+    def __init__(self, codes, data, offsets):
+        self.codes = codes
+        self.data = data
+        self.offsets = offsets
+        self._dictionary = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        code = self.codes[row]
+        if code < 0:
+            return None
+        return self.data[self.offsets[code]:self.offsets[code + 1]].tobytes().decode("utf-8")
+
+    @property
+    def dictionary(self):
+        """The distinct values, decoded once."""
+        if self._dictionary is None:
+            raw = self.data.tobytes()
+            offsets = self.offsets.tolist()
+            self._dictionary = np.array(
+                [raw[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1], offsets[1:])],
+                dtype=object,
+            )
+        return self._dictionary
+
+    def to_pandas(self):
+        codes = np.asarray(self.codes)
+        values = np.empty(len(codes), dtype=object)
+        present = codes >= 0
+        values[present] = self.dictionary[codes[present]]
+        values[~present] = pd.NA
+        return pd.array(values, dtype="string")
+
+
+class ColumnarTable:
+    """A converted table; columns are memory-mapped when the table is opened."""
+
+    def __init__(self, name):
+        path = table_dir(name)
+        self.meta_path = os.path.join(path, "meta.json")
+        self.meta_mtime = os.path.getmtime(self.meta_path)
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.columns = {}
+        for column, kind in self.meta["columns"].items():
+            if kind == "string":
+                self.columns[column] = StringColumn(*(
+                    np.load(os.path.join(path, f"{column}.{part}.npy"), mmap_mode="r")
+                    for part in ("codes", "dict", "offsets")
+                ))
+            else:
+                self.columns[column] = np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        """Zero-copy view of a column: a read-only ndarray or a StringColumn."""
+        return self.columns[name]
+
+    def is_stale(self):
+        """True when the source CSV changed since conversion (a missing CSV is not stale)."""
+        try:
+            source = self.meta["source"]
+            return csv_fingerprint([source])[source] != self.meta["fingerprint"]
+        except OSError:
+            return False
+
+    def to_pandas(self, columns=None, dtypes=None):
+        """
+        Materialise columns as a DataFrame.
+
+        Numeric columns wrap the memory-mapped arrays without copying where dtypes allow;
+        strings are decoded into pandas "string" columns.
+        """
+        dtypes = dtypes or {}
+        data = {}
+        for column in columns or list(self.columns):
+            values = self.columns[column]
+            if isinstance(values, StringColumn):
+                data[column] = pd.Series(values.to_pandas(), name=column)
+            else:
+                data[column] = pd.Series(values, name=column, copy=False)
+            if column in dtypes and str(data[column].dtype) != dtypes[column]:
+                data[column] = data[column].astype(dtypes[column])
+        return pd.DataFrame(data, copy=False)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def load_table(name):
+    """
+    The converted table, reopened if it was rebuilt since it was opened.
+
+    Returns None if the table has not been converted or its CSV has changed since, so
+    callers parse the CSV instead.
+    """
+    meta_path = os.path.join(table_dir(name), "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _tables_lock:
+        table = _tables.get(name)
+        if table is None or table.meta_mtime != mtime:
+            try:
+                table = ColumnarTable(name)
+            except Exception as e:
+                logger.error("Error loading columnar table %s: %s", name, e)
+                instrumentation.record_error(f"{__name__}.load_table", kind="load")
+                return None
+            _tables[name] = table
+    return None if table.is_stale() else table
+
+
+def build():
+    """Convert books.csv (every column) and tags.csv; returns {table: rows}."""
+    from datasets import BOOK_DTYPES, TAG_DTYPES, data_path
+    books = pd.read_csv(data_path("books.csv"), dtype=BOOK_DTYPES)
+    tags = pd.read_csv(data_path("tags.csv"), dtype=TAG_DTYPES, keep_default_na=False)
+    convert("books", books, "books.csv")
+    convert("tags", tags, "tags.csv")
+    return {"books": len(books), "tags": len(tags)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert books.csv and tags.csv to memory-mapped columns.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="(re)convert the CSVs")
+    parser.parse_args()
+
+    start = time.perf_counter()
+    counts = build()
+    print(", ".join(f"{name}: {rows:,} rows" for name, rows in counts.items()),
+          f"converted in {time.perf_counter() - start:.1f}s -> {os.path.dirname(table_dir('books'))}")
+
+
+if __name__ == "__main__":
+    main()
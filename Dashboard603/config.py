@@ -1,7 +1,17 @@
+import os
+
 # Neo4j Configuration
-NEO4J_URI = "bolt://localhost:7687"
+NEO4J_URI = "neo4j://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "adminadmin"  # Change this to your Neo4j password
+NEO4J_DATABASE = "goodbooks-2025-11-20t18-16-45"  # Name of the database restored from the dump
+
+# Neo4j driver and session pool (one shared driver per process, neo4j_db.py)
+NEO4J_MAX_POOL_SIZE = 20             # Bolt connections kept per driver
+NEO4J_MAX_SESSIONS = 20              # Sessions open at once; callers beyond this wait for a free slot
+NEO4J_SESSION_TIMEOUT = 30           # Seconds to wait for a session slot or a pooled connection
+NEO4J_MAX_CONNECTION_LIFETIME = 1800 # Reconnect connections older than this (seconds)
+NEO4J_FETCH_SIZE = 1000              # Records pulled from the server per batch while streaming a result
 
 # MySQL Configuration
 MYSQL_USER = "root"
@@ -10,3 +20,89 @@ MYSQL_HOST = "localhost"
 MYSQL_DATABASE = "goodbooks"
 
 SQL_CONNECTION_STRING = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+
+# Engine behind sql_queries.py:
+#   "mysql"  - the server above
+#   "duckdb" - embedded DuckDB over Parquet copies of data/*.csv (build with duckdb_store.py)
+SQL_BACKEND = "mysql"
+
+# MySQL connection pool (one shared engine per process)
+SQL_POOL_SIZE = 5          # Connections kept open in the pool
+SQL_MAX_OVERFLOW = 10      # Extra connections allowed above SQL_POOL_SIZE under load
+SQL_POOL_TIMEOUT = 30      # Seconds to wait for a free connection before giving up
+SQL_POOL_RECYCLE = 1800    # Reconnect connections older than this (seconds), below MySQL wait_timeout
+SQL_POOL_PRE_PING = True   # Test connections on checkout so stale ones are replaced transparently
+
+# Dashboard panels whose queries run concurrently (panel_scheduler.py)
+PANEL_WORKERS = 8          # Query threads shared by all sessions; keep below SQL_POOL_SIZE + SQL_MAX_OVERFLOW
+PANEL_QUERY_TIMEOUT = 30   # Seconds a panel waits for its query before showing a timeout warning
+
+# Query instrumentation and the sidebar Performance panel (instrumentation.py)
+METRICS_RECENT_EVENTS = 2000   # Recent calls kept for the panel's per-function percentiles
+METRICS_PORT = None            # Serve Prometheus text metrics at http://<host>:<port>/metrics, e.g. 9108; None disables
+METRICS_HOST = "127.0.0.1"     # Interface the metrics endpoint binds to; "0.0.0.0" exposes query names and pool stats to the network
+METRICS_LOG_PATH = None        # Append every call and rerun as a JSON line to this file; None disables
+
+# Precomputed rating summaries (summaries.py)
+SUMMARIES_REBUILD_INTERVAL = 24 * 3600  # Seconds between full rebuilds, which pick up ratings the watermark skipped
+
+# Incremental book rating aggregates (book_ratings.py)
+BOOK_RATINGS_BATCH_SIZE = 1000               # Books per batched UPDATE / Neo4j UNWIND write
+BOOK_RATINGS_RECONCILE_INTERVAL = 24 * 3600  # Seconds between the full reconciles that "refresh" runs itself
+BOOK_RATINGS_POLL_INTERVAL = 30              # Seconds between dashboard checks for newly folded-in ratings
+
+# Bayesian-average ranking for the Top-Rated and by-tag panels (weighted_ratings.py)
+WEIGHTED_RATING_PRIOR_QUANTILE = 0.25  # Prior weight = this quantile of the books' rating counts
+
+# In-process book search (search_index.py)
+SEARCH_INDEX_RETRY_INTERVAL = 60  # Seconds before a failed index build is retried; searches query the database meanwhile
+
+# Query result cache (shared by sql_queries and neo4j_queries)
+CACHE_DEFAULT_TTL = 3600             # Seconds a cached result stays valid unless a function overrides it
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # Approximate memory cap; least recently used results are evicted first
+
+# Local data files (CSV exports of the Goodbooks tables)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Precomputed indexes and other build artifacts (created by the build commands, not committed)
+ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+
+# Embedded SQL database used when SQL_BACKEND = "duckdb" (duckdb_store.py)
+DUCKDB_PATH = os.path.join(ARTIFACT_DIR, "duckdb", "goodbooks.duckdb")
+
+# Shared-tag similarity index (similarity_index.py)
+SIMILARITY_TOP_N = 50                       # Neighbours precomputed per book
+SIMILARITY_INDEX_MAX_AGE = 7 * 24 * 3600    # Seconds before the index is considered stale
+
+# Default engine for tag-based recommendations:
+#   "index"  - precomputed shared-tag counts (similarity_index.py)
+#   "tfidf"  - TF-IDF weighted cosine similarity (tag_similarity.py)
+#   "cypher" - live Neo4j queries
+# The Cypher queries are always used when the selected index is missing or stale.
+RECOMMENDATION_BACKEND = "index"
+
+# Collaborative-filtering model trained on ratings (collaborative.py)
+CF_FACTORS = 32          # Latent factors per user and book
+CF_EPOCHS = 10           # Passes over the ratings during a full training run
+CF_LEARNING_RATE = 0.01
+CF_REGULARIZATION = 0.05
+CF_CHUNK_SIZE = 500_000  # Ratings held in memory at once while training
+CF_FOLD_IN_ANCHOR = 5.0  # How strongly folded-in users/books keep their trained factors (in ratings)
+
+# To-read analytics bitmaps (reading_lists.py)
+READING_LIST_INDEX_MAX_AGE = 24 * 3600   # Seconds before the bitmaps are considered stale and SQL is queried instead
+
+# Shortest-path service (path_service.py)
+PATH_MAX_HOPS = 6          # Same bound as the Cypher shortestPath query
+PATH_HUB_DEGREE = 2000     # Nodes with more neighbours than this are not expanded on the first attempt
+PATH_TIME_BUDGET = 0.5     # Seconds per request before falling back to Cypher
+
+# Recommendation network rendering (graph_utils.py)
+# GRAPH_RENDERER: "component" sends JSON diffs to the component in lib/index.html;
+# "html" embeds a complete pyvis page on every rerun
+GRAPH_RENDERER = "component"
+GRAPH_LAYOUT_MAX_ITERATIONS = 1000    # Server-side force-layout steps before giving up on convergence
+GRAPH_STABILIZATION_ITERATIONS = 100  # Browser-side vis.js stabilisation from the precomputed positions
+GRAPH_NODE_BUDGET = 150               # Books + tags drawn before minor tags are collapsed into clusters
+GRAPH_EDGE_BUDGET = 600               # Heaviest book-tag edges kept when clustering is on
+GRAPH_CLUSTER_EXPAND_LIMIT = 50       # Tags shown when the user expands one cluster
@@ -0,0 +1,190 @@
+"""
+Loaders for the Goodbooks CSV exports in Dashboard603/data.
+
+Each table is parsed once per process and shared by the in-process engines
+(search index, recommendation indexes) that work from the raw data instead of a database.
+Ratings folded into the books table after the export (book_ratings.py) are published as a
+rating overlay that those engines apply on top of the exported values.
+
+The artifacts derived from these files under ARTIFACT_DIR share the helpers at the end of
+this module: a fingerprint of the source files, stored with each artifact so a changed export
+marks it as stale, and atomic file writers.
+"""
+
+import functools
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import config
+
+
+BOOK_DTYPES = {
+    "book_id": "int32",
+    "goodreads_book_id": "int64",
+    "authors": "string",
+    "original_publication_year": "float32",
+    "original_title": "string",
+    "title": "string",
+    "language_code": "string",
+    "average_rating": "float32",
+    "ratings_count": "int64",
+    "ratings_1": "int64",
+    "ratings_2": "int64",
+    "ratings_3": "int64",
+    "ratings_4": "int64",
+    "ratings_5": "int64",
+}
+
+
+def data_path(filename):
+    """Absolute path of a file in the data directory."""
+    return os.path.join(config.DATA_DIR, filename)
+
+
+TAG_DTYPES = {"tag_id": "int32", "tag_name": "string"}
+
+
+def _load_columnar(name, dtypes):
+    # Prefer the memory-mapped copy written by columnar.py when it matches the CSV
+    import columnar
+    table = columnar.load_table(name)
+    if table is None:
+        return None
+    return table.to_pandas(list(dtypes), dtypes)
+
+
+@functools.lru_cache(maxsize=None)
+def load_books():
+    """
+    Load books.csv with the columns the dashboard uses (URLs and ISBNs are skipped).
+
+    Read from the columnar copy (columnar.py) when it is current, else parsed from the CSV.
+    The returned DataFrame is shared between callers and must not be modified in place.
+    """
+    books = _load_columnar("books", BOOK_DTYPES)
+    if books is not None:
+        return books
+    return pd.read_csv(data_path("books.csv"), usecols=list(BOOK_DTYPES), dtype=BOOK_DTYPES)
+
+
+_rating_overlay = (0, None)  # (version, DataFrame)
+_rating_overlay_lock = threading.Lock()
+
+
+def set_rating_overlay(ratings):
+    """
+    Publish the current ratings of books whose ratings changed since the export.
+
+    ratings is a DataFrame with book_id, title, average_rating and ratings_count
+    (book_ratings.load_rating_overlay). It replaces the previous overlay.
+    """
+    global _rating_overlay
+    with _rating_overlay_lock:
+        _rating_overlay = (_rating_overlay[0] + 1, ratings)
+
+
+def rating_overlay():
+    """(version, DataFrame or None) of the latest set_rating_overlay call; version 0 means none yet."""
+    return _rating_overlay
+
+
+@functools.lru_cache(maxsize=None)
+def load_tags():
+    """Load tags.csv (tag_id, tag_name), from the columnar copy when it is current."""
+    tags = _load_columnar("tags", TAG_DTYPES)
+    if tags is not None:
+        return tags
+    return pd.read_csv(data_path("tags.csv"), dtype=TAG_DTYPES, keep_default_na=False)
+
+
+@functools.lru_cache(maxsize=None)
+def load_book_tags():
+    """
+    Load book_tags.csv joined to book titles and tag names.
+
+    Returns columns goodreads_book_id, tag_id, count, title, tag_name; duplicate
+    (book, tag) rows in the export are merged by summing their counts.
+    """
+    book_tags = pd.read_csv(
+        data_path("book_tags.csv"),
+        dtype={"goodreads_book_id": "int64", "tag_id": "int32", "count": "int64"},
+    )
+    book_tags = book_tags.groupby(["goodreads_book_id", "tag_id"], as_index=False)["count"].sum()
+    books = load_books()[["goodreads_book_id", "title"]]
+    book_tags = book_tags.merge(books, on="goodreads_book_id").merge(load_tags(), on="tag_id")
+    return book_tags
+
+
+def _iter_table(filename, table, dtypes, chunksize, source):
+    if source == "csv":
+        yield from pd.read_csv(data_path(filename), usecols=list(dtypes), dtype=dtypes, chunksize=chunksize)
+        return
+
+    from sqlalchemy import text
+    from sql_queries import get_engine
+    query = text(f"SELECT {', '.join(dtypes)} FROM {table}")
+    with get_engine().connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+            yield chunk.astype(dtypes)
+
+
+def iter_ratings(chunksize=500_000, source="csv"):
+    """
+    Stream the ratings table as DataFrames of user_id, book_id, rating.
+
+    source "csv" reads data/ratings.csv; "sql" streams the MySQL ratings table through a
+    server-side cursor. Only one chunk is held in memory at a time.
+    """
+    dtypes = {"user_id": "int32", "book_id": "int32", "rating": "int8"}
+    yield from _iter_table("ratings.csv", "ratings", dtypes, chunksize, source)
+
+
+def iter_to_read(chunksize=500_000, source="csv"):
+    """Stream the to_read table (user_id, book_id) like iter_ratings."""
+    dtypes = {"user_id": "int32", "book_id": "int32"}
+    yield from _iter_table("to_read.csv", "to_read", dtypes, chunksize, source)
+
+
+def csv_fingerprint(filenames):
+    """{filename: [size, mtime]} of the given data files."""
+    fingerprint = {}
+    for filename in filenames:
+        stat = os.stat(data_path(filename))
+        fingerprint[filename] = [stat.st_size, int(stat.st_mtime)]
+    return fingerprint
+
+
+def source_fingerprint(source, filenames):
+    """Fingerprint of an artifact's input files when it is built from the CSVs; None for the graph."""
+    return csv_fingerprint(filenames) if source == "csv" else None
+
+
+def replace_file(path, write):
+    """
+    Write a file with write(tmp_path) next to path and rename it over path.
+
+    Processes that still have the old file memory-mapped keep reading the old inode instead
+    of a truncated file.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_json(value):
+    """A replace_file writer for a JSON document."""
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+    return write
+
+
+def write_npy(array):
+    """A replace_file writer for a NumPy array."""
+    def write(path):
+        with open(path, "wb") as f:
+            np.save(f, array)
+    return write
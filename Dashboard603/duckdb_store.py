@@ -0,0 +1,151 @@
+"""
+Embedded columnar copy of the Goodbooks tables for the SQL dashboard.
+
+With SQL_BACKEND = "duckdb" in config.py, sql_queries.py runs its queries against a local
+DuckDB database instead of MySQL: no server, no network hop, and vectorised GROUP BYs over
+the ratings table. This module builds that database once from Dashboard603/data:
+
+- each CSV is converted to a typed Parquet file under artifacts/duckdb/ (skipped when the
+  Parquet file is newer than its CSV)
+- goodbooks.duckdb holds views over those files with the MySQL table and column names,
+  plus the user_rating_summary and rating_stats tables that summaries.py maintains in MySQL
+- the books view adds the weighted_rating column that weighted_ratings.py stores in MySQL,
+  computed from the ratings_1..5 columns with the prior taken at build time
+
+Usage (from Dashboard603/):
+    python duckdb_store.py build [--force]
+"""
+
+import argparse
+import os
+import time
+
+import config
+import weighted_ratings
+from datasets import data_path, replace_file
+
+
+# CSV column types that auto-detection gets wrong, and the SELECT that types each table
+# like the MySQL schema in Analytical SQL Queries.sql
+TABLES = {
+    "books": (
+        "books.csv",
+        {"isbn": "VARCHAR", "isbn13": "DOUBLE", "original_publication_year": "DOUBLE",
+         "original_title": "VARCHAR", "language_code": "VARCHAR"},
+        """SELECT * REPLACE (
+               CAST(isbn13 AS BIGINT) AS isbn13,
+               CAST(original_publication_year AS INTEGER) AS original_publication_year,
+               CAST(average_rating AS DECIMAL(3, 2)) AS average_rating
+           )""",
+    ),
+    "tags": ("tags.csv", {"tag_id": "INTEGER", "tag_name": "VARCHAR"}, "SELECT *"),
+    "book_tags": ("book_tags.csv", {"goodreads_book_id": "INTEGER", "tag_id": "INTEGER", "count": "INTEGER"},
+                  "SELECT *"),
+    # rating_id numbers rows in file order, as AUTO_INCREMENT does for LOAD DATA
+    "ratings": ("ratings.csv", {"user_id": "INTEGER", "book_id": "INTEGER", "rating": "TINYINT"},
+                "SELECT row_number() OVER () AS rating_id, *"),
+    "to_read": ("to_read.csv", {"user_id": "INTEGER", "book_id": "INTEGER"}, "SELECT *"),
+}
+
+SUMMARY_TABLES = [
+    """
+    CREATE TABLE user_rating_summary AS
+    SELECT
+        user_id,
+        COUNT(*) AS books_rated,
+        SUM(rating) AS rating_sum,
+        MIN(rating) AS min_rating,
+        MAX(rating) AS max_rating
+    FROM ratings
+    GROUP BY user_id
+    """,
+    """
+    CREATE TABLE rating_stats AS
+    SELECT
+        1 AS id,
+        (SELECT COUNT(*) FROM books) AS book_count,
+        COUNT(DISTINCT user_id) AS user_count,
+        COUNT(*) AS rating_count,
+        COALESCE(MAX(rating_id), 0) AS last_rating_id,
+        now() AS refreshed_at
+    FROM ratings
+    """,
+]
+
+
+def store_dir():
+    return os.path.join(config.ARTIFACT_DIR, "duckdb")
+
+
+def _sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def convert(con, name, force=False):
+    """Write one CSV as Parquet; returns the Parquet path, or None if the CSV is missing."""
+    filename, types, select = TABLES[name]
+    csv_path = data_path(filename)
+    parquet_path = os.path.join(store_dir(), f"{name}.parquet")
+    if not os.path.exists(csv_path):
+        return parquet_path if os.path.exists(parquet_path) else None
+    if not force and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return parquet_path
+
+    type_overrides = "{" + ", ".join(f"{_sql_string(c)}: {_sql_string(t)}" for c, t in types.items()) + "}"
+    source = f"read_csv({_sql_string(csv_path)}, header = true, types = {type_overrides})"
+    replace_file(parquet_path, lambda path: con.execute(
+        f"COPY ({select} FROM {source}) TO {_sql_string(path)} (FORMAT PARQUET, COMPRESSION ZSTD)"
+    ))
+    return parquet_path
+
+
+def build(force=False):
+    """Convert the CSVs and (re)create the DuckDB database; returns {table: rows}."""
+    import duckdb
+
+    os.makedirs(store_dir(), exist_ok=True)
+    counts = {}
+    tmp_db = f"{config.DUCKDB_PATH}.tmp{os.getpid()}"
+    if os.path.exists(tmp_db):
+        os.remove(tmp_db)
+    con = duckdb.connect(tmp_db)
+    try:
+        for name in TABLES:
+            parquet_path = convert(con, name, force)
+            if parquet_path is None:
+                print(f"{name}: skipped, {TABLES[name][0]} not found")
+                continue
+            source = f"read_parquet({_sql_string(parquet_path)})"
+            columns = "*"
+            if name == "books":
+                stars = con.execute(f"SELECT {', '.join(weighted_ratings.STAR_COLUMNS)} FROM {source}").df()
+                prior = weighted_ratings.prior(stars.fillna(0).to_numpy())
+                columns = f"*, {weighted_ratings.score_sql(*prior)} AS weighted_rating"
+            con.execute(f"CREATE VIEW {name} AS SELECT {columns} FROM {source}")
+            counts[name] = con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        if "ratings" in counts and "books" in counts:
+            for statement in SUMMARY_TABLES:
+                con.execute(statement)
+    finally:
+        con.close()
+    # Swap the finished database in, so running dashboards never see a half-built file
+    os.replace(tmp_db, config.DUCKDB_PATH)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the embedded DuckDB/Parquet copy of the SQL tables.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="convert data/*.csv to Parquet and create the database")
+    build_parser.add_argument("--force", action="store_true", help="reconvert CSVs even if the Parquet files are current")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = build(args.force)
+    for name, rows in counts.items():
+        print(f"{name:<12} {rows:>12,} rows")
+    print(f"Built in {time.perf_counter() - start:.1f}s -> {config.DUCKDB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Streamlit component that renders the recommendation network from JSON diffs.
+
+components.html ships a complete pyvis page (vis-network bootstrap included) on every
+rerun. This component is served from Dashboard603/lib, loads vis-network once, and per
+rerun receives only the nodes, edges and options that changed since the version it is
+showing, so moving a slider re-sends a few kilobytes instead of the whole document.
+"""
+
+import json
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from graph_utils import diff_payload, graph_payload
+
+
+_component = components.declare_component(
+    "recommendation_graph",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"),
+)
+
+
+def recommendation_graph(net, height=820, key="recommendation_graph"):
+    """
+    Show a network built by build_recommendation_graph.
+
+    The last payload sent by this session is kept in st.session_state, so each rerun only
+    sends its diff. Returns the size in bytes of the message sent this rerun.
+    """
+    state = st.session_state.setdefault(f"{key}_state", {"version": 0, "payload": None, "message": None, "resynced": None})
+    current = graph_payload(net)
+
+    # The frontend asks for a full snapshot when it missed a version (e.g. it was remounted)
+    reply = st.session_state.get(key) or {}
+    resync = reply.get("resync") is not None and reply.get("resync") != state["resynced"]
+
+    if state["payload"] is None or resync:
+        state["resynced"] = reply.get("resync", state["resynced"])
+        message = {
+            "version": state["version"] + 1,
+            "base": None,
+            "nodes": {"upsert": list(current["nodes"].values()), "remove": []},
+            "edges": {"upsert": list(current["edges"].values()), "remove": []},
+            "options": current["options"],
+        }
+    else:
+        diff = diff_payload(state["payload"], current)
+        message = state["message"] if diff is None else dict(diff, version=state["version"] + 1, base=state["version"])
+
+    state.update(version=message["version"], payload=current, message=message)
+    _component(message=message, key=key, default=None, height=height)
+    return len(json.dumps(message))
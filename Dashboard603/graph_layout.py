@@ -0,0 +1,68 @@
+"""
+Server-side force-directed layout for the recommendation network.
+
+vis.js otherwise stabilises every graph in the browser (thousands of physics iterations
+before first paint). force_layout runs the same model as vis-network's barnesHut solver
+(inverse-square repulsion between all nodes, springs along edges, constant central
+gravity, damped velocity integration) as dense NumPy array operations, so the browser
+receives positions that are already at rest and only needs a short stabilisation pass.
+"""
+
+import numpy as np
+
+
+def force_layout(positions, edges, edge_length, repulsion, central, damping,
+                 spring_constant=0.005, timestep=0.35, max_velocity=25.0, min_velocity=0.5,
+                 max_iterations=1000, fixed=None):
+    """
+    Relax node positions under barnesHut-style forces.
+
+    positions: (n, 2) float array of starting coordinates
+    edges: (m, 2) int array of node index pairs
+    repulsion: magnitude of vis' gravitationalConstant; central: centralGravity
+    fixed: optional boolean mask of nodes that keep their starting position
+
+    Stops once every node moves slower than min_velocity (vis' own stopping rule) or after
+    max_iterations. Returns the final (n, 2) positions.
+    """
+    pos = np.array(positions, dtype=np.float64)
+    n = len(pos)
+    if n < 2:
+        return pos
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    movable = np.ones(n, dtype=bool) if fixed is None else ~np.asarray(fixed, dtype=bool)
+    velocity = np.zeros_like(pos)
+    src, dst = edges[:, 0], edges[:, 1]
+    x, y = pos[:, 0], pos[:, 1]  # views, updated in place
+    forces = np.empty_like(pos)
+
+    for _ in range(max_iterations):
+        # Pairwise repulsion, |F| = repulsion / d^2 along the separating vector
+        dx = x[:, None] - x[None, :]
+        dy = y[:, None] - y[None, :]
+        dist = np.maximum(np.sqrt(dx * dx + dy * dy), 0.1)
+        strength = repulsion / (dist * dist * dist)
+        np.fill_diagonal(strength, 0)
+        forces[:, 0] = (dx * strength).sum(axis=1)
+        forces[:, 1] = (dy * strength).sum(axis=1)
+
+        # Springs pull or push each edge towards edge_length
+        if len(edges):
+            edge_dx, edge_dy = x[src] - x[dst], y[src] - y[dst]
+            edge_dist = np.maximum(np.sqrt(edge_dx * edge_dx + edge_dy * edge_dy), 0.01)
+            scale = spring_constant * (edge_length - edge_dist) / edge_dist
+            for axis, component in ((0, edge_dx * scale), (1, edge_dy * scale)):
+                forces[:, axis] += np.bincount(src, component, n) - np.bincount(dst, component, n)
+
+        # Constant-magnitude pull towards the origin
+        radius = np.sqrt(x * x + y * y)
+        forces -= pos * (central / np.where(radius > 0, radius, 1))[:, None]
+
+        velocity += (forces - damping * velocity) * timestep
+        np.clip(velocity, -max_velocity, max_velocity, out=velocity)
+        velocity[~movable] = 0
+        pos += velocity * timestep
+
+        if np.abs(velocity).max() < min_velocity:
+            break
+    return pos
@@ -1,11 +1,303 @@
 from pyvis.network import Network
+from jinja2 import ChoiceLoader, DictLoader, Environment, FileSystemLoader
+import functools
+import hashlib
+import json
 import math
 
+import numpy as np
 
-def build_recommendation_graph(data, physics_settings=None):
+import config
+from cache import cached
+from graph_layout import force_layout
+from instrumentation import instrumented
+
+
+GRAPH_TEMPLATE = "recommendation_graph.html"
+
+# Start/Stop/Fullscreen controls shown above the network. Start re-enables physics with
+# the solver settings already in the network options, so the snippet is the same for
+# every graph and can be compiled into the page template once.
+GRAPH_CONTROLS_HEAD = """
+<style>
+    .graph-controls {
+        display: flex;
+        gap: 10px;
+        padding: 10px;
+        background: #1a202c;
+        border-radius: 8px 8px 0 0;
+        justify-content: center;
+    }
+    .graph-btn {
+        padding: 10px 20px;
+        border: none;
+        border-radius: 6px;
+        cursor: pointer;
+        font-weight: 600;
+        font-size: 14px;
+        transition: all 0.2s ease;
+        display: flex;
+        align-items: center;
+        gap: 8px;
+    }
+    .graph-btn:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 12px rgba(0,0,0,0.3);
+    }
+    .btn-start {
+        background: linear-gradient(135deg, #10b981, #059669);
+        color: white;
+    }
+    .btn-stop {
+        background: linear-gradient(135deg, #ef4444, #dc2626);
+        color: white;
+    }
+    .btn-fullscreen {
+        background: linear-gradient(135deg, #3b82f6, #2563eb);
+        color: white;
+    }
+    .graph-wrapper {
+        position: relative;
+    }
+    #mynetwork:fullscreen, #mynetwork:-webkit-full-screen {
+        background-color: #2d3748;
+        width: 100vw !important;
+        height: 100vh !important;
+    }
+</style>
+<script>
+function startPhysics() {
+    if (typeof network !== 'undefined') {
+        network.setOptions({ physics: { enabled: true } });
+    }
+}
+
+function stopPhysics() {
+    if (typeof network !== 'undefined') {
+        network.setOptions({ physics: { enabled: false } });
+    }
+}
+
+function toggleFullscreen() {
+    var elem = document.getElementById('mynetwork');
+    if (!document.fullscreenElement && !document.webkitFullscreenElement) {
+        if (elem.requestFullscreen) {
+            elem.requestFullscreen();
+        } else if (elem.webkitRequestFullscreen) {
+            elem.webkitRequestFullscreen();
+        }
+    } else {
+        if (document.exitFullscreen) {
+            document.exitFullscreen();
+        } else if (document.webkitExitFullscreen) {
+            document.webkitExitFullscreen();
+        }
+    }
+}
+</script>
+"""
+
+GRAPH_CONTROLS_BODY = """
+<div class="graph-controls">
+    <button class="graph-btn btn-start" onclick="startPhysics()" title="Resume graph animation">
+        ▶ Start
+    </button>
+    <button class="graph-btn btn-stop" onclick="stopPhysics()" title="Freeze graph position">
+        ⏹ Stop
+    </button>
+    <button class="graph-btn btn-fullscreen" onclick="toggleFullscreen()" title="Toggle fullscreen mode">
+        ⛶ Fullscreen
+    </button>
+</div>
+"""
+
+_CARD_DIV = '<div class="card" style="width: 100%">'
+
+
+def graph_payload(net):
+    """
+    Plain-JSON form of a built network for the graph component (see graph_component.py).
+
+    Returns {"nodes": {id: node}, "edges": {id: edge}, "options": dict}; edges get a
+    stable "from->to" id so successive payloads can be diffed.
+    """
+    nodes, edges, _, _, _, options = net.get_network_data()
+    return {
+        "nodes": {node["id"]: node for node in nodes},
+        "edges": {f"{edge['from']}->{edge['to']}": dict(edge, id=f"{edge['from']}->{edge['to']}") for edge in edges},
+        "options": json.loads(options) if isinstance(options, str) else options,
+    }
+
+
+def diff_payload(previous, current):
+    """
+    Changes that turn payload previous into current.
+
+    Returns {"nodes": {"upsert", "remove"}, "edges": {"upsert", "remove"}, "options"},
+    with options None when unchanged, or None if nothing changed at all.
+    """
+    diff = {"options": current["options"] if current["options"] != previous["options"] else None}
+    for part in ("nodes", "edges"):
+        before, after = previous[part], current[part]
+        diff[part] = {
+            "upsert": [item for item_id, item in after.items() if before.get(item_id) != item],
+            "remove": [item_id for item_id in before if item_id not in after],
+        }
+    if diff["options"] is None and not any(diff[part]["upsert"] or diff[part]["remove"] for part in ("nodes", "edges")):
+        return None
+    return diff
+
+
+@functools.lru_cache(maxsize=None)
+def _template_env(template_dir):
+    """
+    Jinja environment holding pyvis' page template with the graph controls spliced in.
+
+    pyvis creates a fresh Environment, and so recompiles its template, for every Network;
+    sharing one environment per process means the page is compiled once and reused.
+    """
+    base = FileSystemLoader(template_dir)
+    source = base.get_source(Environment(), "template.html")[0]
+    for marker in ("</head>", _CARD_DIV, "</body>"):
+        if marker not in source:
+            raise ValueError(f"Unexpected pyvis template: {marker!r} not found")
+    raw = lambda html: "{% raw %}" + html + "{% endraw %}"
+    source = (
+        source.replace("</head>", raw(GRAPH_CONTROLS_HEAD) + "</head>", 1)
+        .replace(_CARD_DIV, '<div class="graph-wrapper">' + raw(GRAPH_CONTROLS_BODY) + _CARD_DIV, 1)
+        .replace("</body>", "</div></body>", 1)
+    )
+    return Environment(loader=ChoiceLoader([DictLoader({GRAPH_TEMPLATE: source}), base]))
+
+
+def render_graph_html(net):
+    """Render a network built by build_recommendation_graph, with controls, to an HTML string."""
+    net.templateEnv = _template_env(net.template_dir)
+    net.path = GRAPH_TEMPLATE
+    return net.generate_html()
+
+
+def level_of_detail(data, node_budget=None, edge_budget=None, expanded=()):
+    """
+    Bound the size of a recommendation network by clustering minor tags.
+
+    When books plus tags exceed node_budget, the tags shared by the fewest books are
+    collapsed into one cluster node per sharing degree ("14 tags on 1 book"), and only the
+    edge_budget heaviest edges are kept (main-book edges first, then by how many books share
+    the tag). Clusters whose id is in expanded are shown as individual tags again, up to
+    GRAPH_CLUSTER_EXPAND_LIMIT tags each.
+
+    Returns (rows, clusters): rows in the shape build_recommendation_graph expects, and
+    {cluster_id: {"label", "tags"}} for every collapsible group so the caller can offer
+    expanding them.
+    """
+    node_budget = node_budget or config.GRAPH_NODE_BUDGET
+    edge_budget = edge_budget or config.GRAPH_EDGE_BUDGET
+
+    books = dict.fromkeys(record["book_title"] for record in data)
+    tag_books = {}
+    for record in data:
+        tag_books.setdefault(record["tag"], set()).add(record["book_title"])
+    degree = {tag: len(titles) for tag, titles in tag_books.items()}
+    ranked = sorted(tag_books, key=lambda tag: (-degree[tag], tag))
+
+    tag_slots = node_budget - len(books)
+    if len(ranked) <= tag_slots:
+        kept = ranked
+    else:
+        # Leave room for one cluster node per sharing degree among the collapsed tags
+        kept = ranked[:max(tag_slots - len(set(degree.values())), 0)]
+    collapsed = ranked[len(kept):]
+
+    clusters = {}
+    for tag in collapsed:
+        cluster = clusters.setdefault(f"cluster-{degree[tag]}", {"degree": degree[tag], "tags": []})
+        cluster["tags"].append(tag)
+    for cluster in clusters.values():
+        count, shared = len(cluster["tags"]), cluster.pop("degree")
+        cluster["label"] = f"{count} tags on {shared} book{'s' if shared != 1 else ''}"
+
+    cluster_of = {}
+    shown = set(kept)
+    for cluster_id, cluster in clusters.items():
+        if cluster_id in expanded:
+            shown.update(cluster["tags"][:config.GRAPH_CLUSTER_EXPAND_LIMIT])
+            remaining = cluster["tags"][config.GRAPH_CLUSTER_EXPAND_LIMIT:]
+        else:
+            remaining = cluster["tags"]
+        for tag in remaining:
+            cluster_of[tag] = cluster_id
+
+    rows = []
+    cluster_rows = {}
+    for record in data:
+        cluster_id = cluster_of.get(record["tag"])
+        if cluster_id is None:
+            rows.append(dict(record, weight=degree[record["tag"]]))
+            continue
+        key = (record["book_title"], cluster_id)
+        if key not in cluster_rows:
+            cluster_rows[key] = dict(record, tag=f"[+] {clusters[cluster_id]['label']}",
+                                     cluster=cluster_id, cluster_tags=[], weight=0)
+            rows.append(cluster_rows[key])
+        cluster_rows[key]["cluster_tags"].append(record["tag"])
+        cluster_rows[key]["weight"] += 1
+
+    if len(rows) > edge_budget:
+        order = sorted(range(len(rows)), key=lambda i: (-rows[i]["is_main"], -rows[i]["weight"]))
+        rows = [rows[i] for i in sorted(order[:edge_budget])]
+    return rows, clusters
+
+
+@cached(skip_args=3)
+def _cached_layout(start, edges, fixed, layout_key, graph_digest, physics, edge_length):
+    # Keyed on the query that produced the graph, a digest of its nodes and edges and the
+    # physics settings; the arrays themselves are left out of the key
+    settings = dict(physics)
+    return force_layout(
+        start, edges, edge_length, settings['repulsion'], settings['central'], settings['damping'],
+        max_iterations=config.GRAPH_LAYOUT_MAX_ITERATIONS, fixed=fixed,
+    )
+
+
+def _graph_digest(net):
+    """Digest of net's node ids (in order) and edge pairs."""
+    digest = hashlib.sha1()
+    for node in net.nodes:
+        digest.update(repr(node["id"]).encode())
+        digest.update(b"\0")
+    digest.update(b"\1")
+    for edge in net.edges:
+        digest.update(repr((edge["from"], edge["to"])).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _apply_layout(net, fixed_node, physics_settings, edge_length, layout_key):
+    """Replace the ring positions of net's nodes with a relaxed force-directed layout."""
+    index = {node["id"]: i for i, node in enumerate(net.nodes)}
+    start = np.array([[node.get("x", 0), node.get("y", 0)] for node in net.nodes], dtype=np.float64)
+    edges = np.array([[index[edge["from"]], index[edge["to"]]] for edge in net.edges], dtype=np.int64)
+    fixed = np.array([node["id"] == fixed_node for node in net.nodes])
+    args = (start, edges, fixed, layout_key, _graph_digest(net),
+            tuple(sorted(physics_settings.items())), edge_length)
+    positions = _cached_layout(*args) if layout_key is not None else None
+    if positions is None or len(positions) != len(net.nodes):
+        positions = _cached_layout.__wrapped__(*args)
+    for node, (x, y) in zip(net.nodes, positions):
+        node["x"], node["y"] = int(round(x)), int(round(y))
+
+
+@instrumented("graph")
+def build_recommendation_graph(data, physics_settings=None, layout_key=None):
     """
     Build an interactive graph showing book communities and their shared tags.
     Shows how multiple books connect through common genres/tags.
+
+    Node positions are computed server-side (see graph_layout.py), so the browser only runs
+    a short stabilisation. layout_key identifies the query behind data, e.g.
+    (title, num_books, min_rating, backend); with it the layout is cached per key, graph
+    contents and physics settings.
     """
     
     if not data:
@@ -23,6 +315,7 @@ def build_recommendation_graph(data, physics_settings=None):
     added_nodes = set()
     tag_connections = {}
     book_info = {}
+    cluster_tags = {}  # cluster node -> tags it stands for (see level_of_detail)
 
     # Collect book and tag information
     for record in data:
@@ -40,10 +333,12 @@ def build_recommendation_graph(data, physics_settings=None):
                 'tag_count': tag_count,
                 'shared_tags': []
             }
-        book_info[book_title]['shared_tags'].append(tag)
+        book_info[book_title]['shared_tags'].extend(record.get("cluster_tags") or [tag])
         
         # Count tag usage
         tag_connections[tag] = tag_connections.get(tag, 0) + 1
+        if record.get("cluster"):
+            cluster_tags.setdefault(tag, set()).update(record["cluster_tags"])
 
     # Add MAIN BOOK first to ensure it's prominent
     main_book = None
@@ -146,6 +441,16 @@ def build_recommendation_graph(data, physics_settings=None):
             'borderWidth': 2
         }
         
+        if tag in cluster_tags:
+            # Collapsed minor tags - grey diamond listing what it stands for
+            members = sorted(cluster_tags[tag])
+            more = f"\n... and {len(members) - 15} more" if len(members) > 15 else ""
+            node_kwargs.update(
+                title=f"CLUSTER: {tag[4:]}\n\n" + "\n".join(members[:15]) + more,
+                color="#9ca3af",
+                shape="diamond",
+            )
+
         # Set initial position to help with layout
         if tag_x is not None and tag_y is not None:
             node_kwargs['x'] = tag_x
@@ -159,12 +464,13 @@ def build_recommendation_graph(data, physics_settings=None):
         tag = record["tag"]
         is_main = record["is_main"]
         
+        dashes = bool(record.get("cluster"))  # edges into a cluster node
         if is_main:
             # Main book connections - MUCH thicker, brighter, more visible
-            net.add_edge(book_title, tag, color="#3b82f6", width=5)  # Thicker and brighter
+            net.add_edge(book_title, tag, color="#3b82f6", width=5, dashes=dashes)  # Thicker and brighter
         else:
             # Similar book connections - thinner
-            net.add_edge(book_title, tag, color="#94a3b8", width=1.5)
+            net.add_edge(book_title, tag, color="#94a3b8", width=1.5, dashes=dashes)
 
     # Use provided physics settings or defaults
     if physics_settings is None:
@@ -179,6 +485,8 @@ def build_recommendation_graph(data, physics_settings=None):
     total_nodes = len(book_info) + len(tag_connections)
     # Good node distance for separation while allowing movement
     node_distance = max(physics_settings['spring'] + 200, 500)
+
+    _apply_layout(net, main_book, physics_settings, node_distance * 0.6, layout_key)
     
     # Build physics options - use barnesHut solver which is better for many nodes
     options = f"""
@@ -204,7 +512,7 @@ def build_recommendation_graph(data, physics_settings=None):
         "width": 1
       }},
       "layout": {{
-        "improvedLayout": true,
+        "improvedLayout": false,
         "hierarchical": {{
           "enabled": false
         }}
@@ -222,7 +530,7 @@ def build_recommendation_graph(data, physics_settings=None):
         }},
         "stabilization": {{
           "enabled": true,
-          "iterations": 2500,
+          "iterations": {config.GRAPH_STABILIZATION_ITERATIONS},
           "fit": true,
           "onlyDynamicEdges": false
         }},
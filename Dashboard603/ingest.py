@@ -0,0 +1,286 @@
+"""
+Bulk-load the Goodbooks CSV exports from Dashboard603/data into SQL and Neo4j.
+
+Replaces hand-editing the LOAD DATA LOCAL INFILE paths in Analytical SQL Queries.sql and
+restoring a Neo4j dump. Each CSV is streamed in chunks with typed parsing:
+
+- SQL: missing tables are created from the schema below, and every chunk is written with
+  one executemany INSERT. Tables without dependencies between them load in parallel
+  (books and tags first, then book_tags, ratings and to_read). Any SQLAlchemy URL works,
+  so a local SQLite (or DuckDB, with duckdb_engine installed) file can stand in for MySQL.
+- Neo4j: Book, Tag and Author nodes plus TAGGED_AS and WRITTEN_BY relationships are
+  MERGEd with batched UNWIND writes, followed by the index bootstrap from neo4j_schema.py.
+
+Progress is printed per chunk with rows/sec, and a summary per table at the end.
+
+Usage (from Dashboard603/):
+    python ingest.py                                   # MySQL from config.py and Neo4j
+    python ingest.py --target sql --sql-url sqlite:///goodbooks.db
+    python ingest.py --target neo4j --batch-size 5000
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from sqlalchemy import (
+    BigInteger, Column, ForeignKey, Index, Integer, MetaData, Numeric, String, Table,
+    create_engine,
+)
+
+import config
+import weighted_ratings
+from datasets import data_path
+
+
+metadata = MetaData()
+
+books_table = Table(
+    "books", metadata,
+    Column("book_id", Integer, primary_key=True, autoincrement=False),
+    Column("goodreads_book_id", Integer, unique=True),
+    Column("best_book_id", Integer),
+    Column("work_id", Integer),
+    Column("books_count", Integer),
+    Column("isbn", String(20)),
+    Column("isbn13", BigInteger),
+    Column("authors", String(1000)),
+    Column("original_publication_year", Integer),
+    Column("original_title", String(1000)),
+    Column("title", String(1000)),
+    Column("language_code", String(20)),
+    Column("average_rating", Numeric(3, 2)),
+    Column("ratings_count", Integer),
+    Column("work_ratings_count", Integer),
+    Column("work_text_reviews_count", Integer),
+    Column("ratings_1", Integer),
+    Column("ratings_2", Integer),
+    Column("ratings_3", Integer),
+    Column("ratings_4", Integer),
+    Column("ratings_5", Integer),
+    Column("image_url", String(500)),
+    Column("small_image_url", String(500)),
+    Column("weighted_rating", Numeric(5, 4)),  # filled by weighted_ratings.py
+    Index(weighted_ratings.INDEX_NAME, *weighted_ratings.INDEX_COLUMNS),
+)
+
+tags_table = Table(
+    "tags", metadata,
+    Column("tag_id", Integer, primary_key=True, autoincrement=False),
+    Column("tag_name", String(200)),
+)
+
+book_tags_table = Table(
+    "book_tags", metadata,
+    Column("goodreads_book_id", Integer, ForeignKey("books.goodreads_book_id")),
+    Column("tag_id", Integer, ForeignKey("tags.tag_id")),
+    Column("count", Integer),
+)
+
+ratings_table = Table(
+    "ratings", metadata,
+    # SQLite only auto-increments INTEGER PRIMARY KEY columns
+    Column("rating_id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("user_id", Integer),
+    Column("book_id", Integer, ForeignKey("books.book_id")),
+    Column("rating", Integer),
+    Index("idx_ratings_user", "user_id"),
+)
+
+to_read_table = Table(
+    "to_read", metadata,
+    Column("user_id", Integer),
+    Column("book_id", Integer, ForeignKey("books.book_id")),
+    Index("idx_to_read_user", "user_id"),
+)
+
+# CSV file, target table and parse dtypes; columns missing from the schema are skipped
+CSV_TABLES = {
+    "books": ("books.csv", books_table, {
+        "book_id": "int32", "goodreads_book_id": "int64", "best_book_id": "int64", "work_id": "int64",
+        "books_count": "int32", "isbn": "string", "isbn13": "float64", "authors": "string",
+        "original_publication_year": "float64", "original_title": "string", "title": "string",
+        "language_code": "string", "average_rating": "float64", "ratings_count": "int64",
+        "work_ratings_count": "int64", "work_text_reviews_count": "int64", "ratings_1": "int64",
+        "ratings_2": "int64", "ratings_3": "int64", "ratings_4": "int64", "ratings_5": "int64",
+        "image_url": "string", "small_image_url": "string",
+    }),
+    "tags": ("tags.csv", tags_table, {"tag_id": "int32", "tag_name": "string"}),
+    "book_tags": ("book_tags.csv", book_tags_table, {"goodreads_book_id": "int64", "tag_id": "int32", "count": "int64"}),
+    "ratings": ("ratings.csv", ratings_table, {"user_id": "int32", "book_id": "int32", "rating": "int8"}),
+    "to_read": ("to_read.csv", to_read_table, {"user_id": "int32", "book_id": "int32"}),
+}
+
+# Tables in one stage only reference tables of earlier stages
+SQL_STAGES = [["books", "tags"], ["book_tags", "ratings", "to_read"]]
+
+_print_lock = threading.Lock()
+
+
+def _report(name, rows, started, done=False):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    with _print_lock:
+        print(f"{name:<18} {rows:>12,} rows {rows / elapsed:>12,.0f} rows/s{'  done' if done else ''}", flush=True)
+
+
+def read_chunks(name, chunk_size):
+    """Stream one CSV as typed DataFrames; yields nothing if the file is absent."""
+    filename, _, dtypes = CSV_TABLES[name]
+    path = data_path(filename)
+    if not os.path.exists(path):
+        print(f"{name:<18} skipped, {path} not found")
+        return
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {column: dtype for column, dtype in dtypes.items() if column in header}
+    yield from pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, keep_default_na=name != "tags",
+                           chunksize=chunk_size)
+
+
+def _records(chunk, table):
+    # Whole-number floats (isbn13, publication year) become ints; NaN/NA become NULL
+    chunk = chunk[[column for column in chunk.columns if column in table.c]]
+    for column in ("isbn13", "original_publication_year"):
+        if column in chunk:
+            chunk = chunk.assign(**{column: chunk[column].round().astype("Int64")})
+    return chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+
+
+def load_sql_table(engine, name, chunk_size):
+    """Insert one CSV into its table chunk by chunk; returns (rows, seconds)."""
+    _, table, _ = CSV_TABLES[name]
+    started = time.perf_counter()
+    rows = 0
+    for chunk in read_chunks(name, chunk_size):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), _records(chunk, table))
+        rows += len(chunk)
+        _report(name, rows, started)
+    _report(name, rows, started, done=True)
+    return rows, time.perf_counter() - started
+
+
+def load_sql(sql_url=None, chunk_size=50_000, workers=3, truncate=False):
+    """Create missing tables and load every CSV; returns {table: (rows, seconds)}."""
+    engine = create_engine(sql_url or config.SQL_CONNECTION_STRING)
+    metadata.create_all(engine, checkfirst=True)
+    if engine.dialect.name == "sqlite":
+        workers = 1  # SQLite allows one writer at a time
+    results = {}
+    if truncate:
+        # Children first so foreign keys never point at deleted rows
+        for stage in reversed(SQL_STAGES):
+            for name in stage:
+                with engine.begin() as conn:
+                    conn.execute(CSV_TABLES[name][1].delete())
+    with ThreadPoolExecutor(workers) as pool:
+        for stage in SQL_STAGES:
+            futures = {name: pool.submit(load_sql_table, engine, name, chunk_size) for name in stage}
+            results.update({name: future.result() for name, future in futures.items()})
+    # New books get a weighted rating from the stored prior, if one has been built
+    weighted_ratings.score_new_books(engine)
+    engine.dispose()
+    return results
+
+
+NEO4J_CONSTRAINTS = [
+    "CREATE CONSTRAINT book_id IF NOT EXISTS FOR (b:Book) REQUIRE b.book_id IS UNIQUE",
+    "CREATE CONSTRAINT book_goodreads_id IF NOT EXISTS FOR (b:Book) REQUIRE b.goodreads_book_id IS UNIQUE",
+    "CREATE CONSTRAINT tag_id IF NOT EXISTS FOR (t:Tag) REQUIRE t.tag_id IS UNIQUE",
+    "CREATE CONSTRAINT author_name IF NOT EXISTS FOR (a:Author) REQUIRE a.name IS UNIQUE",
+]
+
+MERGE_BOOKS = """
+UNWIND $rows AS row
+MERGE (b:Book {book_id: row.book_id})
+SET b.goodreads_book_id = row.goodreads_book_id,
+    b.title = row.title,
+    b.title_lower = toLower(row.title),
+    b.original_title = row.original_title,
+    b.authors = row.authors,
+    b.original_publication_year = row.original_publication_year,
+    b.language_code = row.language_code,
+    b.average_rating = row.average_rating,
+    b.ratings_count = row.ratings_count
+WITH b, row
+UNWIND [name IN split(coalesce(row.authors, ''), ',') WHERE trim(name) <> '' | trim(name)] AS author
+MERGE (a:Author {name: author})
+MERGE (b)-[:WRITTEN_BY]->(a)
+"""
+
+MERGE_TAGS = """
+UNWIND $rows AS row
+MERGE (t:Tag {tag_id: row.tag_id})
+SET t.name = row.tag_name,
+    t.name_lower = toLower(row.tag_name)
+"""
+
+MERGE_BOOK_TAGS = """
+UNWIND $rows AS row
+MATCH (b:Book {goodreads_book_id: row.goodreads_book_id})
+MATCH (t:Tag {tag_id: row.tag_id})
+MERGE (b)-[r:TAGGED_AS]->(t)
+SET r.count = row.count
+"""
+
+# Graph loads in dependency order; relationship batches touch shared nodes, so they are
+# written one transaction at a time rather than in parallel
+NEO4J_LOADS = [("books", MERGE_BOOKS), ("tags", MERGE_TAGS), ("book_tags", MERGE_BOOK_TAGS)]
+
+
+def load_neo4j(batch_size=10_000):
+    """MERGE books, tags, authors and their relationships; returns {load: (rows, seconds)}."""
+    import neo4j_db
+    import neo4j_schema
+
+    results = {}
+    with neo4j_db.session() as session:
+        for statement in NEO4J_CONSTRAINTS:
+            session.run(statement).consume()
+        for name, query in NEO4J_LOADS:
+            label = f"neo4j:{name}"
+            started = time.perf_counter()
+            rows = 0
+            for chunk in read_chunks(name, batch_size):
+                batch = _records(chunk, CSV_TABLES[name][1])
+                session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+                rows += len(batch)
+                _report(label, rows, started)
+            _report(label, rows, started, done=True)
+            results[label] = (rows, time.perf_counter() - started)
+        neo4j_schema.ensure_schema(session)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the CSVs in data/ into SQL and Neo4j.")
+    parser.add_argument("--target", choices=["all", "sql", "neo4j"], default="all")
+    parser.add_argument("--sql-url", help="SQLAlchemy URL (default: config.SQL_CONNECTION_STRING)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows per SQL insert batch")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="rows per Neo4j UNWIND batch")
+    parser.add_argument("--workers", type=int, default=3, help="SQL tables loaded in parallel")
+    parser.add_argument("--truncate", action="store_true", help="empty the SQL tables before loading")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = {}
+    # The SQL and Neo4j loads are independent and run side by side
+    with ThreadPoolExecutor(2) as pool:
+        jobs = []
+        if args.target in ("all", "sql"):
+            jobs.append(pool.submit(load_sql, args.sql_url, args.chunk_size, args.workers, args.truncate))
+        if args.target in ("all", "neo4j"):
+            jobs.append(pool.submit(load_neo4j, args.batch_size))
+        for job in jobs:
+            results.update(job.result())
+
+    print(f"\n{'table':<18} {'rows':>12} {'seconds':>9} {'rows/s':>12}")
+    for name, (rows, seconds) in results.items():
+        print(f"{name:<18} {rows:>12,} {seconds:>9.1f} {rows / max(seconds, 1e-9):>12,.0f}")
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
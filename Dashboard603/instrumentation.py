@@ -0,0 +1,315 @@
+"""
+Timing, size and cache instrumentation for the dashboard's hot paths.
+
+Query functions (sql_queries.py, Neo4j reads through neo4j_db.py) and the recommendation
+network builder are wrapped with @instrumented, which records for every call:
+
+- wall time, rows returned and the approximate size of the result in bytes
+- whether it was served from the result cache (cache.py)
+- the page and the widget whose change triggered the Streamlit rerun
+
+Calls are aggregated per function into latency histograms and totals, and the most recent
+ones are kept for the sidebar Performance panel. prometheus_text() renders everything in
+the Prometheus text format; with METRICS_PORT set in config.py it is also served over HTTP
+at /metrics, and with METRICS_LOG_PATH every call is appended to a JSON-lines log.
+
+Rerun attribution: app.py calls begin_rerun() with the session state at the start of each
+rerun and end_rerun() at the end. Keyed widgets whose value changed in between are taken as
+the trigger. Buttons count when pressed; a checkbox being cleared shows up as "rerun".
+"""
+
+import contextvars
+import http.server
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+import config
+from cache import _estimate_size, last_call_hit
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_SNAPSHOT_KEY = "_instrumentation_snapshot"
+
+_rerun = contextvars.ContextVar("rerun", default=None)
+_rerun_ids = itertools.count(1)
+
+_lock = threading.Lock()
+_events = deque(maxlen=config.METRICS_RECENT_EVENTS)
+_functions = {}            # (name, kind) -> aggregate counters
+_trigger_seconds = {}      # (page, trigger) -> [reruns, seconds]
+_log_lock = threading.Lock()
+_server = None
+
+
+def _simple(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(isinstance(item, (str, int, float, bool)) for item in value)
+    return False
+
+
+def _widget_values(state):
+    # Widget values are plain scalars or lists of them; skip the app's own bookkeeping
+    return {key: value for key, value in state.items()
+            if not key.startswith("_") and _simple(value)}
+
+
+def begin_rerun(page, state):
+    """
+    Start attributing calls to this rerun; returns its context (id, page, trigger).
+
+    state is st.session_state. Calls made from threads started with a copy of the current
+    context (see panel_scheduler.py) are attributed to the same rerun.
+    """
+    previous = state.get(_SNAPSHOT_KEY)
+    if previous is None:
+        trigger = "initial load"
+    else:
+        changed = [key for key, value in _widget_values(state).items()
+                   if previous.get(key) != value and value is not False]
+        trigger = ",".join(sorted(changed)) or "rerun"
+    rerun = {"id": next(_rerun_ids), "page": page, "trigger": trigger, "started": time.perf_counter()}
+    _rerun.set(rerun)
+    return rerun
+
+
+def end_rerun(state):
+    """
+    Finish the current rerun: count its time against its trigger and remember widget values.
+
+    Returns the rerun's wall time in seconds (None outside a rerun).
+    """
+    rerun = _rerun.get()
+    state[_SNAPSHOT_KEY] = _widget_values(state)
+    if rerun is None:
+        return None
+    seconds = time.perf_counter() - rerun["started"]
+    with _lock:
+        totals = _trigger_seconds.setdefault((rerun["page"], rerun["trigger"]), [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+    _append_log({"event": "rerun", "page": rerun["page"], "trigger": rerun["trigger"], "seconds": seconds})
+    return seconds
+
+
+def current_rerun():
+    """The context of the rerun the calling code runs in, or None outside Streamlit."""
+    return _rerun.get()
+
+
+def _append_log(entry):
+    if not config.METRICS_LOG_PATH:
+        return
+    line = json.dumps(dict(entry, time=time.time()), default=str)
+    with _log_lock, open(config.METRICS_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def record(name, kind, seconds, rows=0, nbytes=0, cache=None, error=False):
+    """Record one call; cache is True (hit), False (miss) or None (not cached)."""
+    rerun = _rerun.get() or {}
+    event = {
+        "name": name,
+        "kind": kind,
+        "seconds": seconds,
+        "rows": rows,
+        "bytes": nbytes,
+        "cache": cache,
+        "error": error,
+        "rerun": rerun.get("id"),
+        "page": rerun.get("page"),
+        "trigger": rerun.get("trigger"),
+    }
+    with _lock:
+        _events.append(event)
+        stats = _functions.setdefault((name, kind), {
+            "calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "bytes": 0,
+            "hits": 0, "misses": 0, "errors": 0, "buckets": [0] * len(BUCKETS),
+        })
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["rows"] += rows
+        stats["bytes"] += nbytes
+        stats["errors"] += bool(error)
+        if cache is not None:
+            stats["hits" if cache else "misses"] += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats["buckets"][i] += 1
+    _append_log(dict(event, event="call"))
+
+
+def record_error(name, kind="sql"):
+    """Count a failure that the function itself handled (e.g. by returning an empty DataFrame)."""
+    record(name, kind, 0.0, error=True)
+
+
+def _result_size(result):
+    if result is None:
+        return 0, 0
+    if hasattr(result, "nodes"):
+        return len(result.nodes), 0  # a pyvis Network; its payload is measured when rendered
+    rows = len(result) if hasattr(result, "__len__") else 1
+    return rows, _estimate_size(result)
+
+
+def instrumented(kind, name=None):
+    """
+    Record every call of the decorated function under name (default module.function).
+
+    Apply it outside @cached so cache hits are timed and counted too.
+    """
+    def decorator(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+        is_cached = hasattr(fn, "lookup")
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                record(label, kind, time.perf_counter() - start, error=True)
+                raise
+            seconds = time.perf_counter() - start
+            rows, nbytes = _result_size(result)
+            record(label, kind, seconds, rows, nbytes, last_call_hit() if is_cached else None)
+            return result
+
+        # Keep the cached function's attributes (lookup, __wrapped__) reachable
+        wrapper.__dict__.update(fn.__dict__)
+        wrapper.__name__ = fn.__name__
+        wrapper.__qualname__ = fn.__qualname__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__module__ = fn.__module__
+        return wrapper
+    return decorator
+
+
+def rerun_events(rerun_id):
+    """The calls recorded during one rerun, in the order they finished."""
+    with _lock:
+        return [dict(event) for event in _events if event["rerun"] == rerun_id]
+
+
+def slowest(limit=10):
+    """Functions by mean wall time over the recent calls: name, kind, calls, p50/p95/max ms, hit rate."""
+    with _lock:
+        events = list(_events)
+    by_function = {}
+    for event in events:
+        if not event["error"]:
+            by_function.setdefault((event["name"], event["kind"]), []).append(event)
+    rows = []
+    for (name, kind), calls in by_function.items():
+        times = sorted(event["seconds"] * 1000 for event in calls)
+        cached = [event["cache"] for event in calls if event["cache"] is not None]
+        rows.append({
+            "function": name,
+            "kind": kind,
+            "calls": len(times),
+            "p50_ms": times[len(times) // 2],
+            "p95_ms": times[min(int(len(times) * 0.95), len(times) - 1)],
+            "max_ms": times[-1],
+            "mean_ms": sum(times) / len(times),
+            "cache_hit_rate": sum(cached) / len(cached) if cached else None,
+        })
+    rows.sort(key=lambda row: row["mean_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _labels(**labels):
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        functions = {key: dict(stats, buckets=list(stats["buckets"])) for key, stats in _functions.items()}
+        triggers = {key: list(totals) for key, totals in _trigger_seconds.items()}
+
+    lines = [
+        "# HELP dashboard_call_seconds Wall time of instrumented dashboard calls.",
+        "# TYPE dashboard_call_seconds histogram",
+    ]
+    for (name, kind), stats in sorted(functions.items()):
+        for bound, count in zip(BUCKETS, stats["buckets"]):
+            lines.append(f"dashboard_call_seconds_bucket{_labels(function=name, kind=kind, le=bound)} {count}")
+        lines.append(f"dashboard_call_seconds_bucket{_labels(function=name, kind=kind, le='+Inf')} {stats['calls']}")
+        lines.append(f"dashboard_call_seconds_sum{_labels(function=name, kind=kind)} {stats['seconds']:.6f}")
+        lines.append(f"dashboard_call_seconds_count{_labels(function=name, kind=kind)} {stats['calls']}")
+
+    counters = [
+        ("dashboard_call_rows_total", "Rows returned by instrumented calls.", "rows"),
+        ("dashboard_call_bytes_total", "Approximate bytes returned by instrumented calls.", "bytes"),
+        ("dashboard_call_errors_total", "Failed instrumented calls.", "errors"),
+    ]
+    for metric, help_text, field in counters:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (name, kind), stats in sorted(functions.items()):
+            lines.append(f"{metric}{_labels(function=name, kind=kind)} {stats[field]}")
+
+    lines += ["# HELP dashboard_cache_lookups_total Result cache lookups by outcome.",
+              "# TYPE dashboard_cache_lookups_total counter"]
+    for (name, kind), stats in sorted(functions.items()):
+        for result, field in (("hit", "hits"), ("miss", "misses")):
+            lines.append(f"dashboard_cache_lookups_total{_labels(function=name, result=result)} {stats[field]}")
+
+    lines += ["# HELP dashboard_rerun_seconds_total Streamlit rerun time by page and triggering widget.",
+              "# TYPE dashboard_rerun_seconds_total counter"]
+    for (page, trigger), (reruns, seconds) in sorted(triggers.items()):
+        lines.append(f"dashboard_rerun_seconds_total{_labels(page=page, trigger=trigger)} {seconds:.6f}")
+    lines += ["# HELP dashboard_reruns_total Streamlit reruns by page and triggering widget.",
+              "# TYPE dashboard_reruns_total counter"]
+    for (page, trigger), (reruns, seconds) in sorted(triggers.items()):
+        lines.append(f"dashboard_reruns_total{_labels(page=page, trigger=trigger)} {reruns}")
+
+    # Connection pool gauges from the SQL engine and the Neo4j session layer
+    import neo4j_db
+    import sql_queries
+    pools = [("sql_pool", sql_queries.get_pool_stats()), ("neo4j", neo4j_db.get_metrics())]
+    for prefix, stats in pools:
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"dashboard_{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=None, host=None):
+    """
+    Serve /metrics on host:port (defaults config.METRICS_HOST / METRICS_PORT) from a daemon
+    thread; once per process.
+    """
+    global _server
+    port = port or config.METRICS_PORT
+    host = host or config.METRICS_HOST
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        _server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
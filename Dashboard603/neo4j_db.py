@@ -0,0 +1,397 @@
+"""
+Shared Neo4j access for the dashboard and the build commands.
+
+One driver per process is created on first use from the settings in config.py, and every
+caller borrows sessions through session(), which caps the number of sessions open at once
+(NEO4J_MAX_SESSIONS) so a burst of concurrent panels queues here instead of exhausting the
+driver's connection pool. On top of that:
+
+- read(fn, ...) runs one transaction function from neo4j_queries.py, serving cached results
+  without opening a session
+- read_many(calls) runs several transaction functions in a single read transaction
+- read_async(fn, ...) / read_many_async(calls) run the same functions on the asyncio
+  driver; the Cypher is captured from the function and streamed with AsyncGraphDatabase.
+  Their sessions come from async_session(), which takes slots from the same
+  NEO4J_MAX_SESSIONS limit. Each event loop gets its own AsyncDriver, closed when the loop
+  shuts down (or earlier with close_async_driver())
+- stream_frames(fn, ...) / read_frame(fn, ...) return the same results as DataFrames built
+  batch by batch from the result cursor, projected to the columns the caller needs, so
+  large results are never held as a list of Record objects
+
+Session acquisition waits, query times and the number of records streamed are counted;
+get_metrics() reports them. Each read is also recorded per query function in
+instrumentation.py.
+"""
+
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+import config
+import instrumentation
+from cache import MISS, _estimate_size, cached, last_call_hit
+
+
+_driver = None
+_driver_lock = threading.Lock()
+_async_drivers = weakref.WeakKeyDictionary()   # event loop -> (AsyncDriver, closer)
+_session_slots = threading.BoundedSemaphore(config.NEO4J_MAX_SESSIONS)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "sessions": 0,
+    "session_wait_seconds_total": 0.0,
+    "session_wait_seconds_max": 0.0,
+    "queries": 0,
+    "query_seconds_total": 0.0,
+    "query_seconds_max": 0.0,
+    "records": 0,
+    "cache_hits": 0,
+}
+
+
+class SessionPoolTimeout(RuntimeError):
+    """No session slot became free within NEO4J_SESSION_TIMEOUT."""
+
+
+def _record(counter, timer, seconds):
+    with _metrics_lock:
+        _metrics[counter] += 1
+        _metrics[f"{timer}_seconds_total"] += seconds
+        _metrics[f"{timer}_seconds_max"] = max(_metrics[f"{timer}_seconds_max"], seconds)
+
+
+def _count(name, amount=1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+
+def _driver_settings():
+    return {
+        "auth": (config.NEO4J_USER, config.NEO4J_PASSWORD),
+        "max_connection_pool_size": config.NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": config.NEO4J_SESSION_TIMEOUT,
+        "max_connection_lifetime": config.NEO4J_MAX_CONNECTION_LIFETIME,
+    }
+
+
+def _session_settings():
+    return {"database": config.NEO4J_DATABASE, "fetch_size": config.NEO4J_FETCH_SIZE}
+
+
+def get_driver():
+    """The process-wide neo4j.Driver, created on first use."""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                from neo4j import GraphDatabase
+                _driver = GraphDatabase.driver(config.NEO4J_URI, **_driver_settings())
+    return _driver
+
+
+def _open_async_driver():
+    from neo4j import AsyncGraphDatabase
+    return AsyncGraphDatabase.driver(config.NEO4J_URI, **_driver_settings())
+
+
+async def _close_at_shutdown(driver):
+    # Left suspended at the yield; loop.shutdown_asyncgens(), which asyncio.run() calls
+    # before closing the loop, finalizes it and so closes the driver on that loop
+    try:
+        yield
+    finally:
+        await driver.close()
+
+
+async def get_async_driver():
+    """
+    The neo4j.AsyncDriver for the running event loop.
+
+    Async connections belong to the loop that opened them, so each loop gets its own driver,
+    closed when the loop shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_drivers.get(loop)
+    if entry is None:
+        driver = _open_async_driver()
+        closer = _close_at_shutdown(driver)
+        await closer.asend(None)  # runs to the yield without suspending
+        entry = _async_drivers[loop] = (driver, closer)
+    return entry[0]
+
+
+async def close_async_driver():
+    """Close the running loop's driver now rather than at loop shutdown."""
+    entry = _async_drivers.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+@contextlib.contextmanager
+def session(**kwargs):
+    """
+    Borrow a session on the configured database.
+
+    Blocks while NEO4J_MAX_SESSIONS sessions are open, and raises SessionPoolTimeout after
+    NEO4J_SESSION_TIMEOUT seconds. Keyword arguments override the session settings.
+    """
+    start = time.perf_counter()
+    if not _session_slots.acquire(timeout=config.NEO4J_SESSION_TIMEOUT):
+        raise SessionPoolTimeout(f"no Neo4j session free after {config.NEO4J_SESSION_TIMEOUT}s")
+    try:
+        with get_driver().session(**{**_session_settings(), **kwargs}) as neo4j_session:
+            # The driver connects lazily, so its own pool wait is counted in the query time
+            _record("sessions", "session_wait", time.perf_counter() - start)
+            yield neo4j_session
+    finally:
+        _session_slots.release()
+
+
+def _release_if_acquired(future):
+    if not future.cancelled() and future.exception() is None and future.result():
+        _session_slots.release()
+
+
+@contextlib.asynccontextmanager
+async def async_session(**kwargs):
+    """
+    session() for the asyncio driver, counted against the same NEO4J_MAX_SESSIONS slots.
+
+    A caller that has to wait for a slot waits in a worker thread, so the event loop keeps
+    running; raises SessionPoolTimeout after NEO4J_SESSION_TIMEOUT seconds.
+    """
+    start = time.perf_counter()
+    if not _session_slots.acquire(blocking=False):
+        acquiring = asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(_session_slots.acquire, timeout=config.NEO4J_SESSION_TIMEOUT))
+        try:
+            acquired = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(_release_if_acquired)  # don't leak a slot taken after cancelling
+            raise
+        if not acquired:
+            raise SessionPoolTimeout(f"no Neo4j session free after {config.NEO4J_SESSION_TIMEOUT}s")
+    try:
+        driver = await get_async_driver()
+        async with driver.session(**{**_session_settings(), **kwargs}) as neo4j_session:
+            _record("sessions", "session_wait", time.perf_counter() - start)
+            yield neo4j_session
+    finally:
+        _session_slots.release()
+
+
+def _timed(fn):
+    def work(tx, *args, **kwargs):
+        start = time.perf_counter()
+        records = fn(tx, *args, **kwargs)
+        _record("queries", "query", time.perf_counter() - start)
+        _count("records", len(records))
+        return records
+    return work
+
+
+def _cached_result(fn, args, kwargs):
+    lookup = getattr(fn, "lookup", None)
+    if lookup is None:
+        return MISS
+    records = lookup(*args, **kwargs)
+    if records is not MISS:
+        _count("cache_hits")
+    return records
+
+
+@contextlib.contextmanager
+def _observed(fn):
+    # Records the call in the dashboard instrumentation; the block sets the outcome
+    outcome = {"result": None, "hit": None}
+    name = f"neo4j_queries.{getattr(fn, '__name__', 'query')}"
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except Exception:
+        instrumentation.record(name, "neo4j", time.perf_counter() - start, error=True)
+        raise
+    result = outcome["result"]
+    rows = len(result) if result is not None else 0
+    instrumentation.record(name, "neo4j", time.perf_counter() - start, rows,
+                           _estimate_size(result), outcome["hit"])
+
+
+def read(fn, *args, **kwargs):
+    """Run a transaction function fn(tx, *args, **kwargs) in a read transaction."""
+    cacheable = hasattr(fn, "lookup")
+    with _observed(fn) as outcome:
+        records = _cached_result(fn, args, kwargs)
+        outcome["hit"] = records is not MISS if cacheable else None
+        if records is MISS:
+            with session() as neo4j_session:
+                records = neo4j_session.execute_read(_timed(fn), *args, **kwargs)
+        outcome["result"] = records
+    return records
+
+
+def _calls(calls):
+    # (fn,), (fn, args) and (fn, args, kwargs) are all accepted
+    return [(call[0], tuple(call[1]) if len(call) > 1 else (), dict(call[2]) if len(call) > 2 else {})
+            for call in calls]
+
+
+def read_many(calls):
+    """
+    Run several transaction functions in one session and one read transaction.
+
+    calls is a list of (fn, args) or (fn, args, kwargs); returns their results in order.
+    Cached results are filled in without querying.
+    """
+    calls = _calls(calls)
+    results = [_cached_result(fn, args, kwargs) for fn, args, kwargs in calls]
+    missing = [i for i, result in enumerate(results) if result is MISS]
+    if missing:
+        def work(tx):
+            return [_timed(calls[i][0])(tx, *calls[i][1], **calls[i][2]) for i in missing]
+        with session() as neo4j_session:
+            for i, records in zip(missing, neo4j_session.execute_read(work)):
+                results[i] = records
+    return results
+
+
+class _CaptureTx:
+    """Transaction stand-in that records the Cypher a transaction function would run."""
+
+    def __init__(self):
+        self.statements = []
+
+    def run(self, query, parameters=None, **kwargs):
+        self.statements.append((query, {**(parameters or {}), **kwargs}))
+        return []
+
+
+class _ReplayTx:
+    """Transaction stand-in that hands a transaction function records fetched elsewhere."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.records
+
+
+def _capture(fn, args, kwargs):
+    # fn must issue a single tx.run(), as every function in neo4j_queries.py does
+    capture = _CaptureTx()
+    getattr(fn, "__wrapped__", fn)(capture, *args, **kwargs)
+    (query, parameters), = capture.statements
+    return query, parameters
+
+
+async def _fetch(tx, query, parameters):
+    result = await tx.run(query, parameters)
+    return [record async for record in result]
+
+
+async def read_async(fn, *args, **kwargs):
+    """
+    Async read(): runs the Cypher of fn(tx, *args, **kwargs) on the asyncio driver.
+
+    fn must issue a single tx.run() and return its records, as every function in
+    neo4j_queries.py does. The result is cached exactly as a synchronous call would be.
+    """
+    with _observed(fn) as outcome:
+        records = _cached_result(fn, args, kwargs)
+        outcome["hit"] = records is not MISS if hasattr(fn, "lookup") else None
+        if records is MISS:
+            query, parameters = _capture(fn, args, kwargs)
+            async with async_session() as neo4j_session:
+                start = time.perf_counter()
+                records = await neo4j_session.execute_read(_fetch, query, parameters)
+            _record("queries", "query", time.perf_counter() - start)
+            _count("records", len(records))
+            # Passing the records back through fn stores them in its result cache
+            records = fn(_ReplayTx(records), *args, **kwargs)
+        outcome["result"] = records
+    return records
+
+
+async def read_many_async(calls):
+    """
+    Run several transaction functions concurrently, one async session each; results in order.
+
+    At most NEO4J_MAX_SESSIONS of them (less any sessions open elsewhere) run at once.
+    """
+    return await asyncio.gather(*(read_async(fn, *args, **kwargs) for fn, args, kwargs in _calls(calls)))
+
+
+def stream_frames(fn, *args, columns=None, batch_size=None, **kwargs):
+    """
+    Yield the result of fn(tx, *args, **kwargs) as DataFrames of up to batch_size rows.
+
+    Records are pulled from the server batch_size (default NEO4J_FETCH_SIZE) at a time and
+    only the named columns (default: all) are kept. The session stays open until the
+    generator is exhausted or closed.
+    """
+    from neo4j import READ_ACCESS
+
+    query, parameters = _capture(fn, args, kwargs)
+    batch_size = batch_size or config.NEO4J_FETCH_SIZE
+    with session(default_access_mode=READ_ACCESS, fetch_size=batch_size) as neo4j_session:
+        with neo4j_session.begin_transaction() as tx:
+            start = time.perf_counter()
+            result = tx.run(query, parameters)
+            keys = list(columns or result.keys())
+            while True:
+                batch = result.fetch(batch_size)
+                if not batch:
+                    break
+                _count("records", len(batch))
+                yield pd.DataFrame.from_records((record.values(*keys) for record in batch), columns=keys)
+            _record("queries", "query", time.perf_counter() - start)
+
+
+@cached()
+def _read_frame(fn, args, kwargs, columns):
+    columns = list(columns) if columns else None
+    frames = list(stream_frames(fn, *args, columns=columns, **dict(kwargs)))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def read_frame(fn, *args, columns=None, **kwargs):
+    """
+    The result of fn(tx, *args, **kwargs) as one DataFrame of the named columns.
+
+    Served from the result cache when either this frame or fn's record list is cached.
+    """
+    with _observed(fn) as outcome:
+        records = _cached_result(fn, args, kwargs)
+        if records is not MISS:
+            keys = list(columns or records[0].keys())
+            frame = pd.DataFrame.from_records((record.values(*keys) for record in records), columns=keys)
+            outcome["hit"] = True
+        else:
+            frame = _read_frame(fn, args, tuple(sorted(kwargs.items())), tuple(columns) if columns else None)
+            outcome["hit"] = last_call_hit()
+        outcome["result"] = frame
+    return frame
+
+
+def get_metrics():
+    """
+    Get cumulative Neo4j access counters for sizing NEO4J_MAX_SESSIONS / NEO4J_MAX_POOL_SIZE.
+
+    Returns a dict with the number of sessions and the total, maximum and average time spent
+    waiting for one; the number of queries and their total, maximum and average time; the
+    records streamed; and the reads answered from the result cache.
+    """
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    for counter, timer in (("sessions", "session_wait"), ("queries", "query")):
+        count = metrics[counter]
+        metrics[f"{timer}_seconds_avg"] = metrics[f"{timer}_seconds_total"] / count if count else 0.0
+    return metrics
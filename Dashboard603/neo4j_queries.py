@@ -1,23 +1,17 @@
-from neo4j import GraphDatabase
+"""
+Cypher transaction functions behind the Graph Database Insights page.
 
-# ---------------------------------------------------------
-# Neo4j connection
-# ---------------------------------------------------------
-# 🔧 Change these to match your Neo4j instance (or use env vars if you want)
-NEO4J_URI = "neo4j://localhost:7687"
-NEO4J_USER = "neo4j"
-NEO4J_PASSWORD = "adminadmin"
+Each function takes a transaction as its first argument and is run through neo4j_db.read(),
+which manages the driver, sessions and the result cache.
+"""
 
-driver = GraphDatabase.driver(
-    NEO4J_URI,
-    auth=(NEO4J_USER, NEO4J_PASSWORD),
-    database="goodbooks-2025-11-20t18-16-45"
-)
+from cache import cached
 
 
 # ---------------------------------------------------------
 # 1. Basic tag + book queries for main dashboard
 # ---------------------------------------------------------
+@cached(skip_args=1)
 def get_all_tags(tx):
     """
     Get all meaningful tags (filters out junk tags like numbers, ratings, years).
@@ -25,6 +19,8 @@ def get_all_tags(tx):
     Dashboard Locations:
     - Graph Database Insights > Book Discovery & Recommendations tab > Browse High-Rated Books by Genre/Tag (tag selector dropdown)
     - Graph Database Insights > Advanced Graph Algorithms tab > Author Influence Analysis (genre filter dropdown)
+    The dropdowns are served from tag_catalog.py; this query is the fallback when the catalog
+    cannot be built.
     """
     query = """
     MATCH (t:Tag)<-[:TAGGED_AS]-(b:Book)
@@ -47,6 +43,7 @@ def get_all_tags(tx):
     return list(tx.run(query))
 
 
+@cached(skip_args=1)
 def get_all_book_titles(tx, limit=1000):
     """
     Get list of book titles for dropdowns, sorted by popularity.
@@ -65,36 +62,42 @@ def get_all_book_titles(tx, limit=1000):
     return list(tx.run(query, limit=limit))
 
 
+@cached(skip_args=1)
 def get_books_by_tag(tx, tag, min_avg_rating):
     """
     Get books filtered by tag/genre with minimum rating threshold.
     
     Dashboard Location: Graph Database Insights > Book Discovery & Recommendations tab > Browse High-Rated Books by Genre/Tag
     Displays a dataframe of books matching the selected tag and minimum rating filter.
+    Ranked by the precomputed weighted_rating (weighted_ratings.py); books not yet scored
+    rank last.
     """
     query = """
-    MATCH (b:Book)-[:TAGGED_AS]->(t:Tag)
-    WHERE toLower(t.name) = toLower($tag)
-      AND b.average_rating >= $min_rating
+    MATCH (t:Tag {name_lower: toLower($tag)})<-[:TAGGED_AS]-(b:Book)
+    WHERE b.average_rating >= $min_rating
     RETURN b.title AS title,
            b.average_rating AS average_rating,
+           b.weighted_rating AS weighted_rating,
            b.ratings_count AS ratings_count
-    ORDER BY average_rating DESC, ratings_count DESC
+    ORDER BY coalesce(b.weighted_rating, 0) DESC, ratings_count DESC
     LIMIT 50
     """
     return list(tx.run(query, tag=tag, min_rating=min_avg_rating))
 
 
+@cached(ttl=300, skip_args=1)
 def search_books_by_keyword(tx, keyword, limit=30):
     """
     Search for books by title keyword.
     
     Dashboard Location: Graph Database Insights > Book Discovery & Recommendations tab > Personalized Book Recommendations
     Used in the book search functionality to find books by title, which then populates the book selection dropdown.
+    The dashboard serves this search from search_index.py and only falls back to this query
+    when the index is unavailable.
     """
     query = """
     MATCH (b:Book)
-    WHERE toLower(b.title) CONTAINS toLower($keyword)
+    WHERE b.title_lower CONTAINS toLower($keyword)
     RETURN b.title AS title,
            b.average_rating AS average_rating
     ORDER BY average_rating DESC
@@ -103,6 +106,7 @@ def search_books_by_keyword(tx, keyword, limit=30):
     return list(tx.run(query, keyword=keyword, limit=limit))
 
 
+@cached(skip_args=1)
 def get_recommendations_for_book(tx, title, limit=30):
     """
     Simple graph-based recommendation:
@@ -110,6 +114,8 @@ def get_recommendations_for_book(tx, title, limit=30):
     
     Dashboard Location: Graph Database Insights > Book Discovery & Recommendations tab > Recommended Books Based on Shared Tags
     Displays a dataframe showing similar books that share common tags with the selected book, sorted by number of shared tags.
+    The dashboard reads these from the precomputed index in similarity_index.py and only runs
+    this query when the index is missing or stale.
     """
     query = """
     MATCH (b:Book {title:$title})-[:TAGGED_AS]->(t:Tag)<-[:TAGGED_AS]-(other:Book)
@@ -123,6 +129,7 @@ def get_recommendations_for_book(tx, title, limit=30):
     return list(tx.run(query, title=title, limit=limit))
 
 
+@cached(skip_args=1)
 def get_recommendation_graph_data(tx, title, num_books=10, min_rating=3.5):
     """
     Data for visualization: Shows multiple books and how they interconnect through tags.
@@ -176,6 +183,7 @@ def get_recommendation_graph_data(tx, title, num_books=10, min_rating=3.5):
 # ---------------------------------------------------------
 # 2. Shortest Path – cleaned output
 # ---------------------------------------------------------
+@cached(skip_args=1)
 def get_shortest_path(tx, title1, title2):
     """
     Returns a single record with:
@@ -185,6 +193,8 @@ def get_shortest_path(tx, title1, title2):
     Dashboard Location: Graph Database Insights > Advanced Graph Algorithms tab > Shortest Path Analysis
     Finds the shortest connection path between two books through tags, authors, or other books.
     Displays the path as a chain (e.g., "Book A → Tag: dystopian → Book B") and shows degrees of separation.
+    The dashboard asks path_service.py first and runs this query only when the exported graph
+    is unavailable or the in-memory search exceeds its time budget.
     """
     query = """
     MATCH (b1:Book {title:$title1}),
@@ -207,6 +217,7 @@ def get_shortest_path(tx, title1, title2):
 # ---------------------------------------------------------
 # 3. Centrality-style queries (simple degree centrality)
 # ---------------------------------------------------------
+@cached(skip_args=1)
 def get_top_authors(tx, limit):
     """
     Get top authors by number of books written (degree centrality).
@@ -226,6 +237,7 @@ def get_top_authors(tx, limit):
     return list(tx.run(query, limit=limit))
 
 
+@cached(skip_args=1)
 def get_authors_by_tag(tx, tag_name, limit=50):
     """
     Get authors who write books with a specific tag/genre.
@@ -235,8 +247,7 @@ def get_authors_by_tag(tx, tag_name, limit=50):
     sorted by number of books written and average rating.
     """
     query = """
-    MATCH (a:Author)-[:WRITTEN_BY]-(b:Book)-[:TAGGED_AS]->(t:Tag)
-    WHERE toLower(t.name) = toLower($tag)
+    MATCH (t:Tag {name_lower: toLower($tag)})<-[:TAGGED_AS]-(b:Book)-[:WRITTEN_BY]-(a:Author)
     WITH a.name AS author,
          COUNT(DISTINCT b) AS books_written,
          AVG(b.average_rating) AS avg_rating
@@ -247,12 +258,14 @@ def get_authors_by_tag(tx, tag_name, limit=50):
     return list(tx.run(query, tag=tag_name, limit=limit))
 
 
+@cached(skip_args=1)
 def get_top_tags(tx, limit):
     """
     Get top tags, filtering out meaningless ones.
     
     Dashboard Location: Graph Database Insights > Advanced Graph Algorithms tab > View Top Tags & Genres
     Displays the most popular tags/genres sorted by number of books associated with each tag.
+    Served from tag_catalog.py when the catalog is available.
     """
     query = """
     MATCH (t:Tag)<-[:TAGGED_AS]-(b:Book)
@@ -268,6 +281,7 @@ def get_top_tags(tx, limit):
     return list(tx.run(query, limit=limit))
 
 
+@cached(skip_args=1)
 def get_book_with_most_tags(tx):
     """
     Get the book(s) with the highest number of tags.
@@ -292,6 +306,7 @@ def get_book_with_most_tags(tx):
 # ---------------------------------------------------------
 # 4. Traversal – related books by tags and authors
 # ---------------------------------------------------------
+@cached(skip_args=1)
 def get_related_books_by_tags(tx, title):
     """
     Find books related to the selected book through shared tags.
@@ -310,6 +325,7 @@ def get_related_books_by_tags(tx, title):
     return list(tx.run(query, title=title))
 
 
+@cached(skip_args=1)
 def get_related_books_by_author(tx, title):
     """
     Find other books written by the same author as the selected book.
@@ -0,0 +1,187 @@
+"""
+Neo4j index bootstrap and query-plan audit for the dashboard queries.
+
+Nearly every query looks books up by title or tags by name, but the dump ships without
+indexes, and toLower(t.name) = toLower($tag) cannot use an index on Tag.name anyway.
+ensure_schema() creates range indexes on the lookup and sort properties, stores normalised
+lowercase copies (Tag.name_lower, Book.title_lower) with their own indexes, and waits for
+the indexes to come online. It is idempotent and cheap once everything exists, and runs
+from the bootstrap command and ingest.py only; the dashboard just checks with
+missing_indexes() that the indexes are online, and disables the panels whose lookups need a
+missing one.
+
+audit() runs every dashboard query under EXPLAIN (or PROFILE) with sample parameters and
+fails if a lookup query falls back to a label or all-nodes scan; PROFILE also reports db hits.
+
+Usage (from Dashboard603/):
+    python neo4j_schema.py bootstrap
+    python neo4j_schema.py audit [--profile]
+"""
+
+import argparse
+import re
+import sys
+
+import neo4j_db
+import neo4j_queries as q
+
+
+INDEXES = [
+    "CREATE INDEX book_title IF NOT EXISTS FOR (b:Book) ON (b.title)",
+    "CREATE INDEX book_authors IF NOT EXISTS FOR (b:Book) ON (b.authors)",
+    "CREATE INDEX book_ratings_count IF NOT EXISTS FOR (b:Book) ON (b.ratings_count)",
+    "CREATE INDEX book_average_rating IF NOT EXISTS FOR (b:Book) ON (b.average_rating)",
+    "CREATE INDEX book_weighted_rating IF NOT EXISTS FOR (b:Book) ON (b.weighted_rating)",
+    "CREATE TEXT INDEX book_title_lower IF NOT EXISTS FOR (b:Book) ON (b.title_lower)",
+    "CREATE INDEX tag_name IF NOT EXISTS FOR (t:Tag) ON (t.name)",
+    "CREATE INDEX tag_name_lower IF NOT EXISTS FOR (t:Tag) ON (t.name_lower)",
+    "CREATE INDEX author_name IF NOT EXISTS FOR (a:Author) ON (a.name)",
+]
+
+INDEX_NAMES = [re.search(r"INDEX (\w+) IF NOT EXISTS", statement).group(1) for statement in INDEXES]
+
+# Normalised properties, written in batches; only nodes that lack them are touched
+NORMALISE = [
+    """
+    MATCH (t:Tag)
+    WHERE t.name IS NOT NULL AND t.name_lower IS NULL
+    CALL { WITH t SET t.name_lower = toLower(t.name) } IN TRANSACTIONS OF 10000 ROWS
+    """,
+    """
+    MATCH (b:Book)
+    WHERE b.title IS NOT NULL AND b.title_lower IS NULL
+    CALL { WITH b SET b.title_lower = toLower(b.title) } IN TRANSACTIONS OF 10000 ROWS
+    """,
+]
+
+SCAN_OPERATORS = {"AllNodesScan", "NodeByLabelScan"}
+
+SAMPLE_TITLE = "The Hunger Games (The Hunger Games, #1)"
+SAMPLE_TITLE_2 = "Divergent (Divergent, #1)"
+SAMPLE_TAG = "fantasy"
+
+# (query function, sample arguments, whether a full label scan is expected).
+# Catalog-wide aggregations have to visit every node of a label; lookups must not.
+AUDITED_QUERIES = [
+    (q.get_all_tags, (), True),
+    (q.get_all_book_titles, (1000,), True),
+    (q.get_books_by_tag, (SAMPLE_TAG, 4.0), False),
+    (q.search_books_by_keyword, ("hunger",), False),
+    (q.get_recommendations_for_book, (SAMPLE_TITLE,), False),
+    (q.get_recommendation_graph_data, (SAMPLE_TITLE, 10, 3.5), False),
+    (q.get_shortest_path, (SAMPLE_TITLE, SAMPLE_TITLE_2), False),
+    (q.get_top_authors, (50,), True),
+    (q.get_authors_by_tag, (SAMPLE_TAG,), False),
+    (q.get_top_tags, (50,), True),
+    (q.get_book_with_most_tags, (), True),
+    (q.get_related_books_by_tags, (SAMPLE_TITLE,), False),
+    (q.get_related_books_by_author, (SAMPLE_TITLE,), False),
+]
+
+
+def ensure_schema(session=None):
+    """Create the dashboard indexes and normalised properties if missing, then wait for them."""
+    if session is None:
+        with neo4j_db.session() as session:
+            return ensure_schema(session)
+    # Normalise first, so an online lowercase index means its property has been filled in
+    for statement in NORMALISE:
+        session.run(statement).consume()
+    for statement in INDEXES:
+        session.run(statement).consume()
+    session.run("CALL db.awaitIndexes(300)").consume()
+
+
+def missing_indexes(session=None):
+    """Names of the dashboard indexes that do not exist or are not online yet."""
+    if session is None:
+        with neo4j_db.session() as session:
+            return missing_indexes(session)
+    online = {record["name"] for record in session.run("SHOW INDEXES YIELD name, state WHERE state = 'ONLINE'")}
+    return [name for name in INDEX_NAMES if name not in online]
+
+
+class _PlanTx:
+    """Transaction stand-in that prefixes every query with EXPLAIN/PROFILE and keeps the plan."""
+
+    def __init__(self, tx, mode):
+        self.tx = tx
+        self.mode = mode
+        self.plans = []
+
+    def run(self, query, parameters=None, **kwargs):
+        result = self.tx.run(f"{self.mode} {query}", parameters, **kwargs)
+        records = list(result)
+        summary = result.consume()
+        self.plans.append(summary.profile if self.mode == "PROFILE" else summary.plan)
+        return records
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("children", []):
+        yield from _walk(child)
+
+
+def _operator(plan):
+    # Operator names carry a runtime suffix, e.g. "NodeByLabelScan@neo4j"
+    return plan.get("operatorType", "").split("@")[0]
+
+
+def _plan(tx, fn, args, mode):
+    plan_tx = _PlanTx(tx, mode)
+    # Call the undecorated function so the result cache cannot skip the query
+    fn.__wrapped__(plan_tx, *args)
+    return plan_tx.plans
+
+
+def audit(profile=False):
+    """
+    Plan every dashboard query and report scans and db hits.
+
+    Returns a list of dicts (query, scans, db_hits, ok); ok is False when a lookup query
+    uses a label or all-nodes scan.
+    """
+    mode = "PROFILE" if profile else "EXPLAIN"
+    report = []
+    with neo4j_db.session() as session:
+        for fn, args, scan_expected in AUDITED_QUERIES:
+            plans = session.execute_read(_plan, fn, args, mode)
+            operators = [op for plan in plans for op in _walk(plan)]
+            scans = sorted({_operator(op) for op in operators if _operator(op) in SCAN_OPERATORS})
+            db_hits = sum(op.get("dbHits", 0) for op in operators) if profile else None
+            report.append({
+                "query": fn.__name__,
+                "scans": scans,
+                "db_hits": db_hits,
+                "ok": scan_expected or not scans,
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap Neo4j indexes or audit dashboard query plans.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("bootstrap", help="create indexes and normalised properties")
+    audit_parser = subparsers.add_parser("audit", help="fail if a lookup query falls back to a label scan")
+    audit_parser.add_argument("--profile", action="store_true", help="execute the queries and report db hits")
+    args = parser.parse_args()
+
+    if args.command == "bootstrap":
+        ensure_schema()
+        print("Indexes and normalised properties are in place.")
+        return
+
+    report = audit(args.profile)
+    print(f"{'query':<32} {'db hits':>10}  {'scans':<28} status")
+    for row in report:
+        hits = "-" if row["db_hits"] is None else f"{row['db_hits']:,}"
+        print(f"{row['query']:<32} {hits:>10}  {', '.join(row['scans']) or '-':<28} {'ok' if row['ok'] else 'FAIL'}")
+    failures = [row["query"] for row in report if not row["ok"]]
+    if failures:
+        print(f"\n{len(failures)} lookup queries fall back to label scans: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
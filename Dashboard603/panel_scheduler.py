@@ -0,0 +1,112 @@
+"""
+Concurrent loading of independent dashboard panels.
+
+Each analytics panel waits on its own SQL or Neo4j query, and running them one after the
+other makes a page as slow as the sum of its queries. A PanelScheduler instead starts every
+panel's query as soon as its widgets have been read, leaves a placeholder where the panel
+goes, and fills the placeholders in whatever order the results arrive, so a page takes
+about as long as its slowest query.
+
+Queries run on a thread pool shared by all sessions of the process. Only the query runs in
+a worker thread; every Streamlit call happens on the script thread in run(). A query that
+outlives its timeout leaves a warning in its panel and is abandoned (its result still lands
+in the query cache for the next rerun).
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import streamlit as st
+
+import config
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The shared worker pool, created on first use with config.PANEL_WORKERS threads."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(config.PANEL_WORKERS, thread_name_prefix="panel")
+    return _executor
+
+
+class _Panel:
+    def __init__(self, placeholder, render, future, deadline, timeout, on_error):
+        self.placeholder = placeholder
+        self.render = render
+        self.future = future
+        self.deadline = deadline
+        self.timeout = timeout
+        self.on_error = on_error
+
+
+def _show_error(error):
+    st.error(f"Query error: {error}")
+
+
+class PanelScheduler:
+    """Dispatch a page's panel queries together and draw each panel as its result lands."""
+
+    def __init__(self, timeout=None):
+        self.timeout = config.PANEL_QUERY_TIMEOUT if timeout is None else timeout
+        self._panels = []
+
+    def panel(self, render, fn, *args, pending=None, on_error=None, timeout=None, **kwargs):
+        """
+        Start fn(*args, **kwargs) in the background and reserve this spot on the page for it.
+
+        render(result) is called inside the placeholder once the query returns; on_error(exc)
+        replaces it when the query raises (default: st.error). pending is shown until then.
+        """
+        placeholder = st.empty()
+        if pending:
+            placeholder.caption(pending)
+        timeout = self.timeout if timeout is None else timeout
+        # Run in a copy of this context, so instrumentation attributes the query to this rerun
+        future = get_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        self._panels.append(_Panel(
+            placeholder, render, future, time.monotonic() + timeout, timeout,
+            on_error or _show_error,
+        ))
+        return future
+
+    def _draw(self, panel):
+        with panel.placeholder.container():
+            try:
+                result = panel.future.result()
+            except Exception as e:
+                panel.on_error(e)
+            else:
+                panel.render(result)
+
+    def run(self):
+        """
+        Fill the placeholders of every panel started so far, in completion order.
+
+        Returns when each panel has been drawn or has timed out.
+        """
+        pending = self._panels
+        self._panels = []
+        while pending:
+            now = time.monotonic()
+            for panel in [p for p in pending if p.deadline <= now and not p.future.done()]:
+                panel.future.cancel()  # only stops queries still waiting for a worker
+                panel.placeholder.warning(f"This panel's query did not finish within {panel.timeout:g}s.")
+                pending.remove(panel)
+            if not pending:
+                break
+            done, _ = wait(
+                [p.future for p in pending],
+                timeout=max(min(p.deadline for p in pending) - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+            for panel in [p for p in pending if p.future in done]:
+                self._draw(panel)
+                pending.remove(panel)
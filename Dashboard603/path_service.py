@@ -0,0 +1,344 @@
+"""
+Shortest connection paths between books over an in-memory copy of the graph.
+
+get_shortest_path runs shortestPath((b1)-[*..6]-(b2)) across every relationship, which can
+explode through hub tags such as "to-read" and is re-run on every click. This service
+exports the Book/Tag/Author graph once into CSR adjacency arrays and answers path queries
+with a vectorised bidirectional BFS:
+
+- hubs (nodes above PATH_HUB_DEGREE neighbours) are reached but not expanded on a first
+  search. A path through hubs can be shorter than the pruned result, so an unpruned search
+  bounded to one hop less than that result confirms it or finds the shorter path; this is
+  cheap for the usual 2-4 hop results;
+- every request has a PATH_TIME_BUDGET, after which the caller falls back to Cypher;
+- complete results, including "not connected", are cached per unordered pair of titles
+  and graph export;
+- optionally the k shortest loopless paths are returned (Yen's algorithm).
+
+Results have the same {"path_nodes", "hops"} shape as neo4j_queries.get_shortest_path.
+
+Usage (from Dashboard603/):
+    python path_service.py export [--source neo4j|csv]
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+import instrumentation
+from cache import cached
+from datasets import replace_file, write_json, write_npy
+
+
+logger = logging.getLogger(__name__)
+
+
+class PathTimeout(Exception):
+    """The search exceeded its time budget; paths holds any found before it ran out."""
+
+    def __init__(self, paths=()):
+        super().__init__()
+        self.paths = list(paths)
+
+
+def graph_dir():
+    return os.path.join(config.ARTIFACT_DIR, "paths")
+
+
+def export_from_neo4j():
+    """Node labels and undirected edges of the Book/Tag/Author graph, read from Neo4j."""
+    import neo4j_db
+    nodes_query = """
+    MATCH (n)
+    WHERE n:Book OR n:Tag OR n:Author
+    RETURN elementId(n) AS id,
+           CASE
+             WHEN n:Book   THEN n.title
+             WHEN n:Tag    THEN 'Tag: ' + n.name
+             WHEN n:Author THEN 'Author: ' + n.name
+           END AS label,
+           n:Book AS is_book
+    """
+    edges_query = """
+    MATCH (a)-[]->(b)
+    WHERE (a:Book OR a:Tag OR a:Author) AND (b:Book OR b:Tag OR b:Author)
+    RETURN elementId(a) AS source, elementId(b) AS target
+    """
+    # One transaction, so nodes and edges come from the same snapshot
+    nodes, edges = neo4j_db.read_many([
+        (lambda tx: list(tx.run(nodes_query)),),
+        (lambda tx: list(tx.run(edges_query)),),
+    ])
+    position = {record["id"]: i for i, record in enumerate(nodes)}
+    labels = [record["label"] or "Node" for record in nodes]
+    books = [i for i, record in enumerate(nodes) if record["is_book"]]
+    sources = np.array([position[r["source"]] for r in edges], dtype=np.int32)
+    targets = np.array([position[r["target"]] for r in edges], dtype=np.int32)
+    return labels, books, sources, targets
+
+
+def export_from_csv():
+    """The same graph rebuilt from books.csv (WRITTEN_BY) and book_tags.csv (TAGGED_AS)."""
+    from datasets import load_book_tags, load_books
+    books = load_books().drop_duplicates("title")
+    book_tags = load_book_tags()
+    labels = list(books["title"])
+    node_of = {title: i for i, title in enumerate(labels)}
+    book_ids = list(range(len(labels)))
+
+    def node(label):
+        if label not in node_of:
+            node_of[label] = len(labels)
+            labels.append(label)
+        return node_of[label]
+
+    sources, targets = [], []
+    for title, tag in zip(book_tags["title"], book_tags["tag_name"]):
+        sources.append(node_of[title])
+        targets.append(node(f"Tag: {tag}"))
+    for title, authors in zip(books["title"], books["authors"].fillna("")):
+        for author in filter(None, (a.strip() for a in authors.split(","))):
+            sources.append(node_of[title])
+            targets.append(node(f"Author: {author}"))
+    return labels, book_ids, np.array(sources, dtype=np.int32), np.array(targets, dtype=np.int32)
+
+
+def export(source="neo4j"):
+    """Export the graph to CSR adjacency arrays under artifacts/paths."""
+    labels, books, sources, targets = export_from_neo4j() if source == "neo4j" else export_from_csv()
+    n = len(labels)
+    both_src = np.concatenate([sources, targets])
+    both_dst = np.concatenate([targets, sources])
+    order = np.lexsort((both_dst, both_src))
+    both_src, both_dst = both_src[order], both_dst[order]
+    keep = np.ones(len(both_src), dtype=bool)
+    keep[1:] = (both_src[1:] != both_src[:-1]) | (both_dst[1:] != both_dst[:-1])
+    keep &= both_src != both_dst
+    both_src, both_dst = both_src[keep], both_dst[keep]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(both_src, minlength=n))
+
+    path = graph_dir()
+    os.makedirs(path, exist_ok=True)
+    replace_file(os.path.join(path, "indptr.npy"), write_npy(indptr))
+    replace_file(os.path.join(path, "indices.npy"), write_npy(both_dst.astype(np.int32)))
+    replace_file(os.path.join(path, "labels.json"), write_json(labels))
+    replace_file(os.path.join(path, "meta.json"), write_json({
+        "source": source, "nodes": n, "edges": int(len(both_dst) // 2),
+        "books": books, "exported_at": time.time(),
+    }))
+    return n, len(both_dst) // 2
+
+
+class PathGraph:
+    """Memory-mapped CSR adjacency with bidirectional BFS."""
+
+    def __init__(self):
+        path = graph_dir()
+        self.meta_mtime = os.path.getmtime(os.path.join(path, "meta.json"))
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "labels.json"), encoding="utf-8") as f:
+            self.labels = json.load(f)
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="r")
+        self.degree = np.diff(self.indptr)
+        self.book_node = {self.labels[i]: i for i in meta["books"]}
+
+    def _expand(self, frontier, dist, parent, depth, hub_limit, removed, blocked):
+        """Visit the unvisited neighbours of a whole BFS layer; returns the next layer."""
+        if hub_limit is not None:
+            frontier = frontier[(self.degree[frontier] <= hub_limit) | (depth == 0)]
+        starts = self.indptr[frontier]
+        lengths = self.indptr[frontier + 1] - starts
+        if not lengths.sum():
+            return frontier[:0]
+        owners = np.repeat(frontier, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        neighbors = self.indices[np.repeat(starts, lengths) + offsets]
+
+        keep = dist[neighbors] < 0
+        if removed is not None:
+            keep &= ~removed[neighbors]
+        if blocked:
+            spur, blocked_nodes = blocked
+            keep &= ~(((owners == spur) & np.isin(neighbors, blocked_nodes)) |
+                      ((neighbors == spur) & np.isin(owners, blocked_nodes)))
+        neighbors, owners = neighbors[keep], owners[keep]
+        neighbors, first = np.unique(neighbors, return_index=True)
+        dist[neighbors] = depth + 1
+        parent[neighbors] = owners[first]
+        return neighbors
+
+    def shortest(self, source, target, max_hops, hub_limit=None, deadline=None, removed=None, blocked=None):
+        """Node ids of one shortest path between source and target, or None."""
+        if source == target:
+            return [source]
+        n = len(self.labels)
+        dist = [np.full(n, -1, dtype=np.int32), np.full(n, -1, dtype=np.int32)]
+        parent = [np.full(n, -1, dtype=np.int32), np.full(n, -1, dtype=np.int32)]
+        frontier = [np.array([source]), np.array([target])]
+        depth = [0, 0]
+        for side, node in ((0, source), (1, target)):
+            dist[side][node] = 0
+
+        while depth[0] + depth[1] < max_hops and len(frontier[0]) and len(frontier[1]):
+            if deadline is not None and time.perf_counter() > deadline:
+                raise PathTimeout()
+            # Expand the cheaper side, measured by the edges it would touch
+            cost = [self.degree[f].sum() for f in frontier]
+            side = 0 if cost[0] <= cost[1] else 1
+            frontier[side] = self._expand(frontier[side], dist[side], parent[side], depth[side],
+                                          hub_limit, removed, blocked)
+            depth[side] += 1
+            meets = frontier[side][dist[1 - side][frontier[side]] >= 0]
+            if len(meets):
+                meet = meets[np.argmin(dist[1 - side][meets])]
+                return self._join(meet, parent)
+        return None
+
+    @staticmethod
+    def _join(meet, parent):
+        forward = [meet]
+        while parent[0][forward[-1]] >= 0:
+            forward.append(int(parent[0][forward[-1]]))
+        backward = []
+        node = meet
+        while parent[1][node] >= 0:
+            node = int(parent[1][node])
+            backward.append(node)
+        return [int(x) for x in reversed(forward)] + backward
+
+    def search(self, source, target, max_hops, hub_limit, deadline, removed=None, blocked=None):
+        """
+        Exact shortest path, searched with hub pruning first.
+
+        The pruned path only bounds the length: an unpruned search up to one hop shorter
+        returns any path through hubs that beats it, and runs to max_hops if pruning found none.
+        """
+        path = None
+        if hub_limit is not None:
+            path = self.shortest(source, target, max_hops, hub_limit, deadline, removed, blocked)
+            if path is not None and len(path) <= 2:
+                return path  # no path is shorter than a direct edge
+        bound = max_hops if path is None else len(path) - 2
+        return self.shortest(source, target, bound, None, deadline, removed, blocked) or path
+
+    def k_shortest(self, source, target, k, max_hops, hub_limit, deadline):
+        """
+        Up to k loopless paths in order of length (Yen's algorithm).
+
+        Raises PathTimeout carrying the paths found so far if the deadline passes.
+        """
+        first = self.search(source, target, max_hops, hub_limit, deadline)
+        if first is None:
+            return []
+        paths, candidates = [first], []
+        n = len(self.labels)
+        while len(paths) < k:
+            previous = paths[-1]
+            for i in range(len(previous) - 1):
+                spur, root = previous[i], previous[:i + 1]
+                blocked_nodes = [p[i + 1] for p in paths if p[:i + 1] == root]
+                removed = np.zeros(n, dtype=bool)
+                removed[root[:-1]] = True
+                try:
+                    spur_path = self.search(spur, target, max_hops - i, hub_limit, deadline,
+                                            removed, (spur, np.array(blocked_nodes)))
+                except PathTimeout:
+                    raise PathTimeout(paths) from None
+                if spur_path is not None:
+                    candidate = root[:-1] + spur_path
+                    if candidate not in paths and candidate not in candidates:
+                        candidates.append(candidate)
+            if not candidates:
+                break
+            candidates.sort(key=len)
+            paths.append(candidates.pop(0))
+        return paths
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def load_graph():
+    """The exported graph, memory-mapped once per process; None if it has not been exported."""
+    global _graph
+    try:
+        mtime = os.path.getmtime(os.path.join(graph_dir(), "meta.json"))
+    except OSError:
+        return None
+    with _graph_lock:
+        if _graph is None or _graph.meta_mtime != mtime:
+            try:
+                _graph = PathGraph()
+            except Exception as e:
+                logger.error("Error loading path graph: %s", e)
+                instrumentation.record_error(f"{__name__}.load_graph", kind="load")
+                return None
+        return _graph
+
+
+@cached(ttl=24 * 3600, skip_args=1, cache_empty=True)
+def _pair_paths(graph, title_a, title_b, k, exported_at):
+    # Keyed on the export's meta.json mtime, so a re-export is not served old paths
+    source, target = graph.book_node.get(title_a), graph.book_node.get(title_b)
+    if source is None or target is None:
+        return None
+    deadline = time.perf_counter() + config.PATH_TIME_BUDGET
+    try:
+        paths = graph.k_shortest(source, target, k, config.PATH_MAX_HOPS, config.PATH_HUB_DEGREE, deadline)
+    except PathTimeout as e:
+        # Raised rather than returned, so partial results are not cached
+        raise PathTimeout([[graph.labels[node] for node in path] for path in e.paths]) from None
+    return [[graph.labels[node] for node in path] for path in paths]
+
+
+def get_shortest_path(title1, title2, k=1):
+    """
+    Drop-in alternative to neo4j_queries.get_shortest_path.
+
+    Returns a list of up to k {"path_nodes", "hops"} dicts (empty if the books are not
+    connected within PATH_MAX_HOPS), or None when the graph has not been exported, a title
+    is unknown or the time budget ran out before any path was found, so the caller can fall
+    back to Cypher. When it runs out after the first path, the paths found so far are
+    returned without being cached.
+    """
+    graph = load_graph()
+    if graph is None:
+        return None
+    # Cache on the unordered pair; paths are stored from the smaller title to the larger
+    reverse = title2 < title1
+    try:
+        paths = _pair_paths(graph, *sorted((title1, title2)), k, graph.meta_mtime)
+    except PathTimeout as e:
+        paths = e.paths or None
+    if paths is None:
+        return None
+    return [
+        {"path_nodes": list(reversed(p)) if reverse else p, "hops": len(p) - 1}
+        for p in paths
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the graph used by the path service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export Book/Tag/Author adjacency")
+    export_parser.add_argument("--source", choices=["neo4j", "csv"], default="neo4j")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    nodes, edges = export(args.source)
+    print(f"Exported {nodes:,} nodes and {edges:,} edges in {time.perf_counter() - start:.1f}s -> {graph_dir()}")
+
+
+if __name__ == "__main__":
+    main()
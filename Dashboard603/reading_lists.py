@@ -0,0 +1,376 @@
+"""
+To-read analytics served from per-book bitmaps of user ids.
+
+Three questions are asked of the to_read table: which books are most wanted, which books
+on a reader's to-read list they have since rated, and what else the readers who want a
+book also want. In SQL those are GROUP BYs over to_read joined to ratings and to_read
+joined to itself. This module instead keeps, for both to_read and ratings, the set of
+user ids of every book in a roaring-style layout:
+
+- a book with few users keeps them as a sorted uint32 array
+- a book with more than 2 * words users, where the array would outgrow a bitset over all
+  user ids, keeps a packed uint64 bitset instead
+
+so the sets are never larger than the raw pairs, and a popular book costs one AND and
+popcount per comparison. The containers are .npy files under artifacts/reading_lists,
+memory-mapped by the dashboard. "Readers who want X also want" is one vectorised pass over
+every container: X's users as a mask gathered at every array entry, and ANDed with every
+bitset row.
+
+Usage (from Dashboard603/):
+    python reading_lists.py build [--source csv|sql]
+    python reading_lists.py status
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import instrumentation
+from datasets import iter_ratings, iter_to_read, load_books, replace_file, source_fingerprint, write_json, write_npy
+
+
+logger = logging.getLogger(__name__)
+
+
+SETS = ("to_read", "ratings")
+ARRAYS = ("indptr", "users", "bitset_row", "bitsets", "cardinality")
+SOURCE_FILES = ("to_read.csv", "ratings.csv")
+
+
+def index_dir():
+    return os.path.join(config.ARTIFACT_DIR, "reading_lists")
+
+
+def _bit(user_ids):
+    return np.left_shift(np.uint64(1), (np.asarray(user_ids) & 63).astype(np.uint64))
+
+
+# Set bits per byte value, for NumPy < 2.0 which has no np.bitwise_count
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _popcount_rows(words):
+    """Number of set bits in each row of a 2-D uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _BYTE_POPCOUNT[np.ascontiguousarray(words).view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+class BookBitmaps:
+    """User-id sets indexed directly by book_id: sorted arrays for small sets, bitsets for large ones."""
+
+    def __init__(self, indptr, users, bitset_row, bitsets, cardinality, n_users):
+        self.indptr = indptr              # book_id -> slice of users (empty for bitset books)
+        self.users = users
+        self.bitset_row = bitset_row      # book_id -> row of bitsets, or -1
+        self.bitsets = bitsets
+        self.cardinality = cardinality
+        self.n_users = n_users
+        self.words = bitsets.shape[1]
+        self.bitset_books = np.flatnonzero(np.asarray(bitset_row) >= 0)  # rows are assigned in book order
+
+    @classmethod
+    def from_pairs(cls, book_ids, user_ids, n_books, n_users):
+        """Build from parallel book_id / user_id arrays; repeated pairs count once."""
+        keys = np.unique(book_ids.astype(np.int64) * n_users + user_ids)
+        book_ids, user_ids = keys // n_users, (keys % n_users).astype(np.uint32)
+        cardinality = np.bincount(book_ids, minlength=n_books).astype(np.int32)
+
+        words = (n_users + 63) // 64
+        dense = cardinality > 2 * words
+        bitset_row = np.full(n_books, -1, dtype=np.int32)
+        bitset_row[dense] = np.arange(dense.sum(), dtype=np.int32)
+        bitsets = np.zeros((int(dense.sum()), words), dtype="<u8")
+        in_bitset = dense[book_ids]
+        dense_users = user_ids[in_bitset]
+        np.bitwise_or.at(bitsets, (bitset_row[book_ids[in_bitset]], dense_users >> 6), _bit(dense_users))
+
+        indptr = np.zeros(n_books + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.where(dense, 0, cardinality))
+        return cls(indptr, user_ids[~in_bitset], bitset_row, bitsets, cardinality, n_users)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            replace_file(os.path.join(path, f"{name}.npy"), write_npy(np.asarray(getattr(self, name))))
+
+    @classmethod
+    def load(cls, path, n_users):
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS]
+        return cls(*arrays, n_users)
+
+    def _known(self, book_id):
+        return 0 <= book_id < len(self.cardinality)
+
+    def members(self, book_id):
+        """Sorted user ids in a book's set."""
+        if not self._known(book_id):
+            return np.empty(0, dtype=np.uint32)
+        row = self.bitset_row[book_id]
+        if row >= 0:
+            bits = np.unpackbits(np.asarray(self.bitsets[row]).view(np.uint8), bitorder="little")
+            return np.flatnonzero(bits).astype(np.uint32)
+        return np.asarray(self.users[self.indptr[book_id]:self.indptr[book_id + 1]])
+
+    def bitset(self, book_id):
+        """A book's set as packed uint64 words over all user ids."""
+        if self._known(book_id) and self.bitset_row[book_id] >= 0:
+            return np.asarray(self.bitsets[self.bitset_row[book_id]])
+        words = np.zeros(self.words, dtype="<u8")
+        users = self.members(book_id)
+        np.bitwise_or.at(words, users >> 6, _bit(users))
+        return words
+
+    def contains(self, book_id, user_ids):
+        """Boolean array: which of user_ids are in a book's set."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not self._known(book_id):
+            return np.zeros(len(user_ids), dtype=bool)
+        row = self.bitset_row[book_id]
+        if row >= 0:
+            inside = user_ids < self.n_users
+            found = np.zeros(len(user_ids), dtype=bool)
+            ids = user_ids[inside]
+            found[inside] = (self.bitsets[row][ids >> 6] & _bit(ids)) != 0
+            return found
+        members = self.members(book_id)
+        positions = np.minimum(np.searchsorted(members, user_ids), max(len(members) - 1, 0))
+        return (members[positions] == user_ids) if len(members) else np.zeros(len(user_ids), dtype=bool)
+
+    def intersection_counts(self, bitset):
+        """|set(b) & bitset| for every book b, as an int64 array indexed by book_id."""
+        mask = np.unpackbits(bitset.view(np.uint8), bitorder="little").view(bool)
+        hits = np.zeros(len(self.users) + 1, dtype=np.int64)
+        np.cumsum(mask[self.users], out=hits[1:])
+        counts = hits[self.indptr[1:]] - hits[self.indptr[:-1]]
+        if len(self.bitset_books):
+            counts[self.bitset_books] = _popcount_rows(self.bitsets & bitset)
+        return counts
+
+    def books_of(self, user_id):
+        """Sorted ids of the books whose set contains user_id."""
+        if not 0 <= user_id < self.n_users:
+            return np.empty(0, dtype=np.int64)
+        positions = np.flatnonzero(np.asarray(self.users) == user_id)
+        books = np.searchsorted(self.indptr, positions, side="right") - 1
+        if len(self.bitset_books):
+            in_bitsets = (self.bitsets[:, user_id >> 6] & _bit(user_id)) != 0
+            books = np.union1d(books, self.bitset_books[in_bitsets])
+        return books
+
+
+def _collect(chunks):
+    book_ids, user_ids = [], []
+    for chunk in chunks:
+        book_ids.append(chunk["book_id"].to_numpy())
+        user_ids.append(chunk["user_id"].to_numpy())
+    return np.concatenate(book_ids), np.concatenate(user_ids)
+
+
+def build(source="csv"):
+    """Build the to_read and ratings bitmaps and write them to disk; returns {set: pairs}."""
+    pairs = {"to_read": _collect(iter_to_read(source=source)), "ratings": _collect(iter_ratings(source=source))}
+    # One user-id universe for both sets, so their bitsets line up word for word
+    n_books = max(int(book_ids.max()) for book_ids, _ in pairs.values()) + 1
+    n_users = max(int(user_ids.max()) for _, user_ids in pairs.values()) + 1
+
+    meta = {"source": source, "fingerprint": source_fingerprint(source, SOURCE_FILES), "users": n_users, "books": n_books}
+    for name, (book_ids, user_ids) in pairs.items():
+        bitmaps = BookBitmaps.from_pairs(book_ids, user_ids, n_books, n_users)
+        bitmaps.save(os.path.join(index_dir(), name))
+        meta[name] = {"pairs": int(bitmaps.cardinality.sum()), "bitset_books": len(bitmaps.bitset_books)}
+    # meta.json is written last; a changed mtime tells running processes to reload
+    replace_file(os.path.join(index_dir(), "meta.json"), write_json(dict(meta, built_at=time.time())))
+    return {name: meta[name]["pairs"] for name in SETS}
+
+
+def _top(values, limit):
+    """Indices of the limit largest values, largest first and ties by lower index, as in SQL."""
+    limit = min(limit, len(values))
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+    # Every value tied with the limit-th largest is a candidate, so ties are not cut arbitrarily
+    threshold = np.partition(values, len(values) - limit)[len(values) - limit]
+    candidates = np.flatnonzero(values >= threshold)
+    return candidates[np.lexsort((candidates, -values[candidates]))[:limit]]
+
+
+class ReadingListIndex:
+    """The memory-mapped to_read and ratings bitmaps written by build()."""
+
+    def __init__(self):
+        self.meta_path = os.path.join(index_dir(), "meta.json")
+        self.meta_mtime = os.path.getmtime(self.meta_path)
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.to_read = BookBitmaps.load(os.path.join(index_dir(), "to_read"), self.meta["users"])
+        self.ratings = BookBitmaps.load(os.path.join(index_dir(), "ratings"), self.meta["users"])
+
+    def is_stale(self):
+        """True when the bitmaps are older than READING_LIST_INDEX_MAX_AGE or their source data changed."""
+        if time.time() - self.meta["built_at"] > config.READING_LIST_INDEX_MAX_AGE:
+            return True
+        fingerprint = self.meta.get("fingerprint")
+        if fingerprint is not None:
+            try:
+                return source_fingerprint(self.meta["source"], SOURCE_FILES) != fingerprint
+            except OSError:
+                return True
+        return False
+
+    def most_wanted(self, limit):
+        """(book_ids, want counts, wanters who also rated the book), most wanted first."""
+        wants = np.asarray(self.to_read.cardinality)
+        top = _top(wants, limit)
+        top = top[wants[top] > 0]
+        rated = [int(self.ratings.contains(b, self.to_read.members(b)).sum()) for b in top]
+        return top, wants[top], np.array(rated, dtype=np.int64)
+
+    def also_wanted(self, book_id, limit):
+        """(book_ids, co-want counts) of the books most often on the same to-read lists as book_id."""
+        if not self.to_read._known(book_id):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        counts = self.to_read.intersection_counts(self.to_read.bitset(book_id))
+        counts[book_id] = 0
+        top = _top(counts, limit)
+        top = top[counts[top] > 0]
+        return top, counts[top]
+
+    def reading_list(self, user_id):
+        """(book_ids, rated flags) of a user's to-read list."""
+        books = self.to_read.books_of(user_id)
+        rated = np.array([bool(self.ratings.contains(b, [user_id])[0]) for b in books], dtype=bool)
+        return books, rated
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_index():
+    """
+    Get the memory-mapped bitmaps, reloading them if they were rebuilt since they were opened.
+
+    Returns None if they have not been built or are stale, so callers fall back to SQL.
+    """
+    global _index
+    try:
+        mtime = os.path.getmtime(os.path.join(index_dir(), "meta.json"))
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or _index.meta_mtime != mtime:
+            try:
+                _index = ReadingListIndex()
+            except Exception as e:
+                logger.error("Error loading reading-list bitmaps: %s", e)
+                instrumentation.record_error(f"{__name__}.load_index", kind="load")
+                return None
+        index = _index
+    return None if index.is_stale() else index
+
+
+@functools.lru_cache(maxsize=None)
+def _books():
+    return load_books().set_index("book_id")[["title", "authors", "average_rating", "ratings_count"]]
+
+
+@functools.lru_cache(maxsize=None)
+def _book_ids():
+    books = load_books().drop_duplicates("title")
+    return dict(zip(books["title"], books["book_id"].tolist()))
+
+
+def _with_books(book_ids, columns, **values):
+    books = _books().reindex(book_ids)
+    frame = pd.DataFrame({"title": books["title"].to_numpy(), "authors": books["authors"].to_numpy(), **values})
+    for column in columns:
+        frame[column] = books[column].to_numpy()
+    return frame
+
+
+def get_most_wanted_books(limit=20):
+    """
+    Books on the most to-read lists, in the shape of sql_queries.get_most_wanted_books.
+
+    already_rated counts the readers who want the book and have also rated it. Returns None
+    when the bitmaps are missing or stale.
+    """
+    index = load_index()
+    if index is None:
+        return None
+    book_ids, wants, rated = index.most_wanted(limit)
+    return _with_books(book_ids, ["average_rating", "ratings_count"], want_count=wants, already_rated=rated)
+
+
+def get_also_wanted_books(title, limit=10):
+    """
+    "Readers who want this also want": the books most often on the same to-read lists.
+
+    Returns a DataFrame of title, authors, co_wanted (readers wanting both) and share (of the
+    readers wanting title), or None when the bitmaps are missing or stale or the title is unknown.
+    """
+    index = load_index()
+    book_id = _book_ids().get(title)
+    if index is None or book_id is None:
+        return None
+    book_ids, counts = index.also_wanted(book_id, limit)
+    wanters = int(index.to_read.cardinality[book_id]) if len(book_ids) else 1
+    return _with_books(book_ids, [], co_wanted=counts, share=np.round(counts / wanters, 3))
+
+
+def get_user_reading_list(user_id):
+    """
+    A user's to-read list, flagging the books they have since rated.
+
+    Returns a DataFrame of title, authors, average_rating and rated, rated books first and
+    then by popularity, or None when the bitmaps are missing or stale.
+    """
+    index = load_index()
+    if index is None:
+        return None
+    book_ids, rated = index.reading_list(user_id)
+    frame = _with_books(book_ids, ["average_rating", "ratings_count"], rated=rated)
+    frame = frame.sort_values(["rated", "ratings_count"], ascending=False, kind="stable")
+    return frame[["title", "authors", "average_rating", "rated"]].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the to-read analytics bitmaps.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="rebuild the bitmaps")
+    build_parser.add_argument("--source", choices=["csv", "sql"], default="csv",
+                              help="read to_read and ratings from data/*.csv or from the SQL database")
+    subparsers.add_parser("status", help="show when the bitmaps were built and whether they are stale")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        counts = build(args.source)
+        print(f"Indexed {counts['to_read']:,} to-read and {counts['ratings']:,} rating pairs "
+              f"in {time.perf_counter() - start:.1f}s -> {index_dir()}")
+    else:
+        try:
+            index = ReadingListIndex()
+        except OSError:
+            print("Bitmaps not built.")
+            return
+        built = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(index.meta["built_at"]))
+        for name in SETS:
+            stats = index.meta[name]
+            print(f"{name}: {stats['pairs']:,} pairs, {stats['bitset_books']:,} books as bitsets")
+        print(f"{index.meta['users']:,} users, built {built} from {index.meta['source']}, "
+              f"{'stale' if index.is_stale() else 'fresh'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Backend selection for tag-based recommendations.
+
+Each function returns None when the chosen backend cannot answer (backend "cypher", or an
+index that is missing, stale or lacks the title); callers then run the Neo4j query.
+"""
+
+import config
+import similarity_index
+import tag_similarity
+
+
+BACKENDS = {
+    "index": "Shared tags (precomputed)",
+    "tfidf": "TF-IDF weighted tags",
+    "cypher": "Shared tags (live Neo4j)",
+}
+
+
+def get_recommendations(title, limit=30, backend=None):
+    """Recommended books for title as a list of dicts, or None to fall back to Cypher."""
+    backend = backend or config.RECOMMENDATION_BACKEND
+    if backend == "index":
+        return similarity_index.get_recommendations(title, limit)
+    if backend == "tfidf":
+        return tag_similarity.get_recommendations(title, limit)
+    return None
+
+
+def get_recommendation_graph_data(title, num_books=10, min_rating=3.5, backend=None):
+    """
+    Network rows for the recommendation graph, or None to fall back to Cypher.
+
+    Only the TF-IDF backend ranks graph neighbours differently; the shared-tag index
+    yields the same books as the Cypher query, so it defers to Cypher here.
+    """
+    backend = backend or config.RECOMMENDATION_BACKEND
+    if backend == "tfidf":
+        return tag_similarity.get_recommendation_graph_data(title, num_books, min_rating)
+    return None
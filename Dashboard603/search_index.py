@@ -0,0 +1,171 @@
+"""
+In-process inverted index for book search.
+
+Replaces the LOWER(title) LIKE '%kw%' scan in sql_queries.search_books and the
+toLower(b.title) CONTAINS scan in neo4j_queries.search_books_by_keyword. Titles, original
+titles and authors are tokenized once; books are numbered in popularity order
+(ratings_count descending) so every posting list is already ranked, and a search is a
+handful of sorted-array intersections followed by a vectorized rating filter.
+
+Every query word matches as a token prefix, so "hung gam" finds "The Hunger Games".
+Ratings folded in since the export (datasets.rating_overlay) replace the exported
+average_rating and ratings_count; the popularity order stays that of the export.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import config
+import instrumentation
+from datasets import load_books, rating_overlay
+
+
+logger = logging.getLogger(__name__)
+
+
+RESULT_COLUMNS = ["title", "authors", "average_rating", "ratings_count", "original_publication_year"]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(value):
+    """Lowercase, accent-folded alphanumeric tokens of a string."""
+    if not isinstance(value, str):
+        return []
+    folded = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(folded.lower())
+
+
+class BookSearchIndex:
+    """Token -> sorted doc id postings over title, original_title and authors."""
+
+    def __init__(self, books):
+        books = books.sort_values("ratings_count", ascending=False, kind="stable").reset_index(drop=True)
+        self.books = self.base_books = books[RESULT_COLUMNS]
+        self.ratings = self.base_ratings = books["average_rating"].to_numpy(dtype=np.float32)
+        self.doc_of = pd.Series(np.arange(len(books)), index=books["book_id"].to_numpy())
+        self.overlay_version = 0
+
+        postings = {}
+        for doc_id, fields in enumerate(zip(books["title"], books["original_title"], books["authors"])):
+            for field in fields:
+                for token in tokenize(field):
+                    docs = postings.setdefault(token, [])
+                    if not docs or docs[-1] != doc_id:
+                        docs.append(doc_id)
+
+        self.vocabulary = sorted(postings)
+        self.postings = {token: np.array(docs, dtype=np.int32) for token, docs in postings.items()}
+        self._prefix_cache = {}
+
+    def sync_ratings(self):
+        """Apply the latest rating overlay on top of the exported ratings, if it changed."""
+        version, overlay = rating_overlay()
+        if version == self.overlay_version:
+            return
+        books, ratings = self.base_books, self.base_ratings
+        if overlay is not None and len(overlay):
+            overlay = overlay[overlay["book_id"].isin(self.doc_of.index)]
+            docs = self.doc_of[overlay["book_id"]].to_numpy()
+            books, ratings = books.copy(), ratings.copy()
+            ratings[docs] = overlay["average_rating"].to_numpy(dtype=np.float32)
+            books.iloc[docs, books.columns.get_loc("average_rating")] = ratings[docs]
+            books.iloc[docs, books.columns.get_loc("ratings_count")] = overlay["ratings_count"].to_numpy(dtype=np.int64)
+        self.books, self.ratings, self.overlay_version = books, ratings, version
+
+    def _prefix_postings(self, prefix):
+        """Union of the posting lists of every token starting with prefix."""
+        docs = self._prefix_cache.get(prefix)
+        if docs is not None:
+            return docs
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, prefix + "\uffff", lo=start)
+        matches = [self.postings[token] for token in self.vocabulary[start:stop]]
+        if not matches:
+            docs = np.empty(0, dtype=np.int32)
+        elif len(matches) == 1:
+            docs = matches[0]
+        else:
+            docs = np.unique(np.concatenate(matches))
+        if len(self._prefix_cache) < 10000:
+            self._prefix_cache[prefix] = docs
+        return docs
+
+    def search_ids(self, keyword="", min_rating=0.0, limit=50):
+        """Doc ids matching every query token with average_rating >= min_rating, most popular first."""
+        tokens = tokenize(keyword)
+        if keyword.strip() and not tokens:
+            # Only punctuation, e.g. "!!!": no token can match it
+            docs = np.empty(0, dtype=np.int32)
+        elif tokens:
+            # Intersect the rarest lists first so the working set shrinks quickly
+            lists = sorted((self._prefix_postings(t) for t in set(tokens)), key=len)
+            docs = lists[0]
+            for other in lists[1:]:
+                if not len(docs):
+                    break
+                docs = np.intersect1d(docs, other, assume_unique=True)
+        else:
+            docs = np.arange(len(self.ratings), dtype=np.int32)
+        if min_rating > 0:
+            docs = docs[self.ratings[docs] >= min_rating]
+        return docs if limit is None else docs[:limit]
+
+    def search(self, keyword="", min_rating=0.0, limit=50, order_by="popularity"):
+        """
+        Search books by title or author.
+
+        order_by: "popularity" (ratings_count descending) or "rating" (average_rating
+                  descending, ranked among all matches before the limit is applied).
+        Returns a DataFrame with RESULT_COLUMNS.
+        """
+        if order_by == "rating":
+            docs = self.search_ids(keyword, min_rating, limit=None)
+            docs = docs[np.argsort(-self.ratings[docs], kind="stable")][:limit]
+        else:
+            docs = self.search_ids(keyword, min_rating, limit)
+        return self.books.iloc[docs].reset_index(drop=True)
+
+
+_index = None
+_failed_at = None  # time of the last failed build
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Get the process-wide search index, building it on first use.
+
+    Returns None if the book data cannot be loaded, so callers can fall back to querying
+    the database. A failed build is not retried for SEARCH_INDEX_RETRY_INTERVAL seconds.
+    """
+    global _index, _failed_at
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if _failed_at is not None and time.monotonic() - _failed_at < config.SEARCH_INDEX_RETRY_INTERVAL:
+                    return None
+                try:
+                    _index = BookSearchIndex(load_books())
+                except Exception as e:
+                    logger.error("Error building search index: %s", e)
+                    instrumentation.record_error(f"{__name__}.get_index", kind="load")
+                    _failed_at = time.monotonic()
+                    return None
+    _index.sync_ratings()
+    return _index
+
+
+def search(keyword="", min_rating=0.0, limit=50, order_by="popularity"):
+    """Search the shared index; returns None when it is unavailable."""
+    index = get_index()
+    if index is None:
+        return None
+    return index.search(keyword, min_rating, limit, order_by)
@@ -0,0 +1,257 @@
+"""
+Precomputed book-to-book shared-tag similarity index.
+
+get_recommendations_for_book expands (b)-[:TAGGED_AS]->(t)<-[:TAGGED_AS]-(other) at
+request time, which touches nearly every book through tags like "to-read". This module
+computes the same shared-tag counts offline as a sparse product B @ B.T of the binary
+book x tag matrix, keeps the top-N neighbours of every book, and stores them as CSR
+arrays (indptr / neighbors / scores .npy files) that are memory-mapped at startup.
+A recommendation is then a slice of those arrays.
+
+Usage (from Dashboard603/):
+    python similarity_index.py build [--source csv|neo4j] [--top-n 50]
+    python similarity_index.py status
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+import config
+import instrumentation
+from datasets import replace_file, source_fingerprint, write_json, write_npy
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_NAME = "shared_tags"
+SOURCE_FILES = ("books.csv", "tags.csv", "book_tags.csv")
+
+
+def index_dir(name):
+    return os.path.join(config.ARTIFACT_DIR, "similarity", name)
+
+
+def load_book_tag_pairs(source):
+    """
+    Book/tag incidence from the CSV exports or from the Neo4j graph.
+
+    Returns a DataFrame with one row per (title, tag) and columns title, tag, count
+    (the book_tags count, 1 when the graph has none) and rating (book average_rating).
+    """
+    import pandas as pd
+    if source == "csv":
+        from datasets import load_book_tags, load_books
+        book_tags = load_book_tags()
+        ratings = load_books().drop_duplicates("title").set_index("title")["average_rating"]
+        return pd.DataFrame({
+            "title": book_tags["title"].astype(str),
+            "tag": book_tags["tag_name"].astype(str),
+            "count": book_tags["count"],
+            "rating": book_tags["title"].map(ratings).astype("float32"),
+        })
+
+    import neo4j_db
+    query = """
+    MATCH (b:Book)-[r:TAGGED_AS]->(t:Tag)
+    RETURN b.title AS title, t.name AS tag, coalesce(r.count, 1) AS count, b.average_rating AS rating
+    """
+    records = neo4j_db.read(lambda tx: list(tx.run(query)))
+    return pd.DataFrame([dict(r) for r in records], columns=["title", "tag", "count", "rating"])
+
+
+def top_neighbors(similarity_rows, row_offset, title_rank, top_n):
+    """
+    Top-N columns of each dense similarity row, best score first and ties by title.
+
+    Returns per-row arrays of neighbour ids and scores, skipping the diagonal and zeros.
+    """
+    n_rows, n_books = similarity_rows.shape
+    rows = np.arange(n_rows)
+    similarity_rows[rows, rows + row_offset] = 0
+
+    # Order by score, then by title ascending, with one integer key per cell
+    scaled = np.rint(similarity_rows * 1e6).astype(np.int64)
+    keys = scaled * (n_books + 1) + (n_books - title_rank)[None, :]
+    k = min(top_n, n_books)
+    candidates = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(keys, candidates, axis=1), axis=1)
+    candidates = np.take_along_axis(candidates, order, axis=1)
+
+    neighbors, scores = [], []
+    for row in range(n_rows):
+        cols = candidates[row]
+        vals = similarity_rows[row, cols]
+        keep = vals > 0
+        neighbors.append(cols[keep].astype(np.int32))
+        scores.append(vals[keep].astype(np.float32))
+    return neighbors, scores
+
+
+def save_index(name, titles, neighbors, scores, meta):
+    """Write per-book neighbour lists as CSR arrays plus titles and metadata."""
+    path = index_dir(name)
+    os.makedirs(path, exist_ok=True)
+    indptr = np.zeros(len(titles) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(n) for n in neighbors])
+    neighbors = np.concatenate(neighbors) if neighbors else np.empty(0, np.int32)
+    scores = np.concatenate(scores) if scores else np.empty(0, np.float32)
+    replace_file(os.path.join(path, "indptr.npy"), write_npy(indptr))
+    replace_file(os.path.join(path, "neighbors.npy"), write_npy(neighbors))
+    replace_file(os.path.join(path, "scores.npy"), write_npy(scores))
+    replace_file(os.path.join(path, "titles.json"), write_json(list(titles)))
+    # meta.json is written last; a changed mtime tells running processes to reload
+    replace_file(os.path.join(path, "meta.json"), write_json(dict(meta, built_at=time.time(), books=len(titles))))
+
+
+def build(source="csv", top_n=None, chunk_size=1000):
+    """Compute the shared-tag neighbour index and write it to disk."""
+    top_n = top_n or config.SIMILARITY_TOP_N
+    pairs = load_book_tag_pairs(source)
+
+    titles, book_idx = np.unique(pairs["title"].to_numpy(dtype=str), return_inverse=True)
+    _, tag_idx = np.unique(pairs["tag"].to_numpy(dtype=str), return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(book_idx), dtype=np.float32), (book_idx, tag_idx)),
+        shape=(len(titles), tag_idx.max() + 1),
+    )
+    incidence.data[:] = 1  # duplicate (book, tag) pairs count once
+    incidence_t = incidence.T.tocsc()
+    title_rank = np.arange(len(titles))  # np.unique already returns titles sorted
+
+    neighbors, scores = [], []
+    for start in range(0, len(titles), chunk_size):
+        shared = (incidence[start:start + chunk_size] @ incidence_t).toarray()
+        chunk_neighbors, chunk_scores = top_neighbors(shared, start, title_rank, top_n)
+        neighbors.extend(chunk_neighbors)
+        scores.extend(chunk_scores)
+
+    save_index(INDEX_NAME, titles, neighbors, scores, {
+        "kind": "shared_tags",
+        "source": source,
+        "fingerprint": source_fingerprint(source, SOURCE_FILES),
+        "top_n": top_n,
+    })
+    return len(titles)
+
+
+class NeighborIndex:
+    """Memory-mapped neighbour lists written by save_index."""
+
+    def __init__(self, name):
+        path = index_dir(name)
+        self.meta_path = os.path.join(path, "meta.json")
+        self.meta_mtime = os.path.getmtime(self.meta_path)
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "titles.json"), encoding="utf-8") as f:
+            self.titles = json.load(f)
+        self.row_of = {title: row for row, title in enumerate(self.titles)}
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.neighbors = np.load(os.path.join(path, "neighbors.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+
+    def is_stale(self):
+        """True when the index is older than SIMILARITY_INDEX_MAX_AGE or its source data changed."""
+        if time.time() - self.meta["built_at"] > config.SIMILARITY_INDEX_MAX_AGE:
+            return True
+        fingerprint = self.meta.get("fingerprint")
+        if fingerprint is not None:
+            try:
+                return source_fingerprint(self.meta["source"], SOURCE_FILES) != fingerprint
+            except OSError:
+                return True
+        return False
+
+    def neighbors_of(self, title, limit):
+        """(titles, scores) of the best neighbours of a book, or None if the title is unknown."""
+        row = self.row_of.get(title)
+        if row is None:
+            return None
+        start = self.indptr[row]
+        stop = min(self.indptr[row + 1], start + limit)
+        return [self.titles[i] for i in self.neighbors[start:stop]], np.asarray(self.scores[start:stop])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def load_index(name):
+    """
+    Get the memory-mapped index, reloading it if it was rebuilt since it was opened.
+
+    Returns None if the index has not been built or is stale, so callers fall back to Cypher.
+    """
+    meta_path = os.path.join(index_dir(name), "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.meta_mtime != mtime:
+            try:
+                index = NeighborIndex(name)
+            except Exception as e:
+                logger.error("Error loading similarity index %s: %s", name, e)
+                instrumentation.record_error(f"{__name__}.load_index", kind="load")
+                return None
+            _indexes[name] = index
+    return None if index.is_stale() else index
+
+
+def get_recommendations(title, limit=30):
+    """
+    Books sharing the most tags with title, in the shape of get_recommendations_for_book.
+
+    Returns a list of {"recommended_title", "shared_tags"} dicts, or None when the index is
+    missing, stale or does not contain the title.
+    """
+    index = load_index(INDEX_NAME)
+    if index is None:
+        return None
+    found = index.neighbors_of(title, limit)
+    if found is None:
+        return None
+    titles, scores = found
+    return [
+        {"recommended_title": t, "shared_tags": int(s)}
+        for t, s in zip(titles, scores)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the shared-tag similarity index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="rebuild the index")
+    build_parser.add_argument("--source", choices=["csv", "neo4j"], default="csv",
+                              help="read book tags from data/book_tags.csv or from the Neo4j graph")
+    build_parser.add_argument("--top-n", type=int, default=config.SIMILARITY_TOP_N)
+    subparsers.add_parser("status", help="show when the index was built and whether it is stale")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        books = build(args.source, args.top_n)
+        print(f"Indexed {books:,} books in {time.perf_counter() - start:.1f}s -> {index_dir(INDEX_NAME)}")
+    else:
+        try:
+            index = NeighborIndex(INDEX_NAME)
+        except OSError:
+            print("Index not built.")
+            return
+        built = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(index.meta["built_at"]))
+        print(f"{index.meta['books']:,} books, top {index.meta['top_n']}, built {built} from {index.meta['source']}, "
+              f"{'stale' if index.is_stale() else 'fresh'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,160 @@
 SQL queries for Goodbooks database analytics.
 """
 
+import logging
+import threading
+import time
+
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
 import config
+import instrumentation
+import reading_lists
+import search_index
+from cache import cached
+from instrumentation import instrumented
+
+
+logger = logging.getLogger(__name__)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_pool_metrics_lock = threading.Lock()
+_pool_metrics = {
+    "connects": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "invalidations": 0,
+    "connect_seconds_total": 0.0,
+    "connect_seconds_max": 0.0,
+    "checked_out_max": 0,
+    "full_pool_checkouts": 0,
+    "borrows": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+_connect_started = threading.local()
+
+
+def _record_pool_metric(name, amount=1):
+    with _pool_metrics_lock:
+        _pool_metrics[name] += amount
+
+
+def _on_do_connect(dialect, connection_record, cargs, cparams):
+    # Dialect event fired just before a new DBAPI connection is opened
+    _connect_started.at = time.perf_counter()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    started = getattr(_connect_started, "at", None)
+    _connect_started.at = None
+    with _pool_metrics_lock:
+        _pool_metrics["connects"] += 1
+        if started is not None:
+            seconds = time.perf_counter() - started
+            _pool_metrics["connect_seconds_total"] += seconds
+            _pool_metrics["connect_seconds_max"] = max(_pool_metrics["connect_seconds_max"], seconds)
+
+
+def _on_checkout(pool):
+    # A checkout that takes the last free connection makes any concurrent request wait
+    checked_out = pool.checkedout()
+    with _pool_metrics_lock:
+        _pool_metrics["checkouts"] += 1
+        _pool_metrics["checked_out_max"] = max(_pool_metrics["checked_out_max"], checked_out)
+        if checked_out >= pool.size() + config.SQL_MAX_OVERFLOW:
+            _pool_metrics["full_pool_checkouts"] += 1
+
+
+def _create_engine():
+    if config.SQL_BACKEND == "duckdb":
+        # Read-only, so several dashboard processes can share the file; the DuckDB dialect
+        # comes from the duckdb-engine package
+        url, connect_args = f"duckdb:///{config.DUCKDB_PATH}", {"read_only": True}
+    else:
+        url, connect_args = config.SQL_CONNECTION_STRING, {}
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=config.SQL_POOL_SIZE,
+        max_overflow=config.SQL_MAX_OVERFLOW,
+        pool_timeout=config.SQL_POOL_TIMEOUT,
+        pool_recycle=config.SQL_POOL_RECYCLE,
+        pool_pre_ping=config.SQL_POOL_PRE_PING,
+    )
+    event.listen(engine, "do_connect", _on_do_connect)
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "checkout", lambda *args: _on_checkout(engine.pool))
+    event.listen(engine, "checkin", lambda *args: _record_pool_metric("checkins"))
+    event.listen(engine, "invalidate", lambda *args: _record_pool_metric("invalidations"))
+    return engine
 
 
 def get_engine():
-    """Get SQL database engine."""
-    return create_engine(config.SQL_CONNECTION_STRING)
+    """
+    Get the shared SQL database engine.
 
+    The engine (and its connection pool) is created once per process and reused by every
+    query function, so dashboard reruns borrow an open connection instead of reconnecting.
+    Pool sizing, pre-ping and recycle settings come from config.py, and SQL_BACKEND selects
+    MySQL or the embedded DuckDB database.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
 
+
+def _connect(engine):
+    """Borrow a pooled connection for a query, counting how long the caller waited for it."""
+    start = time.perf_counter()
+    try:
+        return engine.connect()
+    finally:
+        seconds = time.perf_counter() - start
+        with _pool_metrics_lock:
+            _pool_metrics["borrows"] += 1
+            _pool_metrics["wait_seconds_total"] += seconds
+            _pool_metrics["wait_seconds_max"] = max(_pool_metrics["wait_seconds_max"], seconds)
+
+
+def _query_failed(name, error):
+    """Log a failed query and count it in the dashboard metrics; the caller returns an empty DataFrame."""
+    logger.error("Error in %s: %s", name, error)
+    instrumentation.record_error(f"{__name__}.{name}")
+
+
+def get_pool_stats():
+    """
+    Get connection pool usage counters for sizing SQL_POOL_SIZE / SQL_MAX_OVERFLOW.
+
+    Returns a dict with cumulative connects, checkouts, checkins and invalidations, the total
+    and maximum time spent opening new connections, the most connections checked out at
+    once, the number of checkouts that left no connection free (so concurrent requests
+    waited up to SQL_POOL_TIMEOUT), the total, maximum and average time query functions
+    waited for a connection, and the current pool state (size, checked_out, overflow).
+    """
+    with _pool_metrics_lock:
+        stats = dict(_pool_metrics)
+    for counter, timer in (("connects", "connect"), ("borrows", "wait")):
+        count = stats[counter]
+        stats[f"{timer}_seconds_avg"] = stats[f"{timer}_seconds_total"] / count if count else 0.0
+    if _engine is not None:
+        pool = _engine.pool
+        stats["size"] = pool.size()
+        stats["checked_out"] = pool.checkedout()
+        stats["overflow"] = pool.overflow()
+    return stats
+
+
+@instrumented("sql")
+@cached()
 def get_top_authors(limit=10):
     """
     Get top authors by number of books.
@@ -33,13 +177,16 @@ def get_top_authors(limit=10):
     LIMIT :limit
     """
     try:
-        df = pd.read_sql(text(query), engine, params={"limit": limit})
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"limit": limit})
         return df
     except Exception as e:
-        print(f"Error in get_top_authors: {e}")
+        _query_failed("get_top_authors", e)
         return pd.DataFrame()
 
 
+@instrumented("sql")
+@cached()
 def get_rating_distribution():
     """
     Get distribution of average ratings.
@@ -57,22 +204,40 @@ def get_rating_distribution():
     ORDER BY rating_bucket
     """
     try:
-        df = pd.read_sql(text(query), engine)
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn)
         return df
     except Exception as e:
-        print(f"Error in get_rating_distribution: {e}")
+        _query_failed("get_rating_distribution", e)
         return pd.DataFrame()
 
 
+@instrumented("sql")
+@cached()
 def get_top_rated_books(limit=20, min_ratings=1000):
     """
     Get top-rated books with minimum ratings.
     
     Dashboard Location: SQL Database Analytics > Database Overview tab > Top-Rated Books Analysis
-    Displays books with the highest average ratings, filtered by minimum number of ratings.
+    Displays books with the highest weighted (Bayesian-average) ratings, filtered by minimum number of ratings.
+    Reads the precomputed, indexed weighted_rating column (see weighted_ratings.py) and falls
+    back to sorting by raw average_rating if it has not been built yet.
     """
     engine = get_engine()
-    query = """
+    weighted_query = """
+    SELECT 
+        title,
+        authors,
+        average_rating,
+        weighted_rating,
+        ratings_count,
+        original_publication_year
+    FROM books
+    WHERE weighted_rating IS NOT NULL AND ratings_count >= :min_ratings
+    ORDER BY weighted_rating DESC, ratings_count DESC
+    LIMIT :limit
+    """
+    scan_query = """
     SELECT 
         title,
         authors,
@@ -84,14 +249,12 @@ def get_top_rated_books(limit=20, min_ratings=1000):
     ORDER BY average_rating DESC, ratings_count DESC
     LIMIT :limit
     """
-    try:
-        df = pd.read_sql(text(query), engine, params={"limit": limit, "min_ratings": min_ratings})
-        return df
-    except Exception as e:
-        print(f"Error in get_top_rated_books: {e}")
-        return pd.DataFrame()
+    return _read_summary_or_scan("get_top_rated_books", engine, weighted_query, scan_query,
+                                 {"limit": limit, "min_ratings": min_ratings})
 
 
+@instrumented("sql")
+@cached()
 def get_most_rated_books(limit=20):
     """
     Get books with the most ratings.
@@ -112,13 +275,16 @@ def get_most_rated_books(limit=20):
     LIMIT :limit
     """
     try:
-        df = pd.read_sql(text(query), engine, params={"limit": limit})
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"limit": limit})
         return df
     except Exception as e:
-        print(f"Error in get_most_rated_books: {e}")
+        _query_failed("get_most_rated_books", e)
         return pd.DataFrame()
 
 
+@instrumented("sql")
+@cached()
 def get_books_by_language():
     """
     Get book distribution by language.
@@ -138,13 +304,16 @@ def get_books_by_language():
     ORDER BY book_count DESC
     """
     try:
-        df = pd.read_sql(text(query), engine)
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn)
         return df
     except Exception as e:
-        print(f"Error in get_books_by_language: {e}")
+        _query_failed("get_books_by_language", e)
         return pd.DataFrame()
 
 
+@instrumented("sql")
+@cached()
 def get_publication_trends():
     """
     Get publication trends over years.
@@ -166,22 +335,38 @@ def get_publication_trends():
     ORDER BY year
     """
     try:
-        df = pd.read_sql(text(query), engine)
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn)
         return df
     except Exception as e:
-        print(f"Error in get_publication_trends: {e}")
+        _query_failed("get_publication_trends", e)
         return pd.DataFrame()
 
 
+@instrumented("sql")
+@cached(ttl=600)
 def get_user_rating_stats(limit=20):
     """
     Get statistics about most active users.
     
     Dashboard Location: SQL Database Analytics > Rating Analysis tab > Top Contributors
     Displays the most active users by number of ratings submitted, including their average rating patterns.
+    Reads the precomputed user_rating_summary table (see summaries.py) and falls back to
+    aggregating the raw ratings table if the summary has not been built yet.
     """
     engine = get_engine()
-    query = """
+    summary_query = """
+    SELECT 
+        user_id,
+        books_rated,
+        ROUND(rating_sum / books_rated, 2) as avg_rating_given,
+        min_rating,
+        max_rating
+    FROM user_rating_summary
+    ORDER BY books_rated DESC
+    LIMIT :limit
+    """
+    scan_query = """
     SELECT 
         user_id,
         COUNT(*) as books_rated,
@@ -193,21 +378,28 @@ def get_user_rating_stats(limit=20):
     ORDER BY books_rated DESC
     LIMIT :limit
     """
-    try:
-        df = pd.read_sql(text(query), engine, params={"limit": limit})
-        return df
-    except Exception as e:
-        print(f"Error in get_user_rating_stats: {e}")
-        return pd.DataFrame()
+    return _read_summary_or_scan("get_user_rating_stats", engine, summary_query, scan_query, {"limit": limit})
 
 
-def search_books(keyword="", min_rating=0.0):
+@instrumented("sql")
+def search_books(keyword="", min_rating=0.0, limit=50):
     """
     Search books by title or author.
     
     Dashboard Location: SQL Database Analytics > Rating Analysis tab > Advanced Book Search & Filtering
     Allows users to search for books by title or author name with optional minimum rating filter.
+    Served from the in-process inverted index (search_index.py); the LIKE scan against
+    MySQL is only used when the index cannot be built.
     """
+    results = search_index.search(keyword, min_rating=min_rating, limit=limit)
+    if results is not None:
+        return results
+    return _search_books_like(keyword, min_rating, limit)
+
+
+@cached(ttl=300)
+def _search_books_like(keyword="", min_rating=0.0, limit=50):
+    """Search books with a LOWER(...) LIKE '%keyword%' table scan."""
     engine = get_engine()
     query = """
     SELECT 
@@ -220,11 +412,218 @@ def search_books(keyword="", min_rating=0.0):
     WHERE (LOWER(title) LIKE LOWER(:keyword) OR LOWER(authors) LIKE LOWER(:keyword))
         AND average_rating >= :min_rating
     ORDER BY ratings_count DESC
-    LIMIT 50
+    LIMIT :limit
+    """
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"keyword": f"%{keyword}%", "min_rating": min_rating, "limit": limit})
+        return df
+    except Exception as e:
+        _query_failed("search_books", e)
+        return pd.DataFrame()
+
+
+@instrumented("sql")
+@cached()
+def get_collection_metrics():
+    """
+    Get headline counts for the catalog: books, distinct rating users and total ratings.
+    
+    Dashboard Location: SQL Database Analytics > Database Overview tab > Collection Metrics
+    Displays three metric tiles summarising the size of the collection.
+    Reads the single precomputed rating_stats row (see summaries.py) and falls back to
+    counting the raw tables if the summary has not been built yet.
+    """
+    engine = get_engine()
+    summary_query = """
+    SELECT 
+        book_count,
+        user_count,
+        rating_count
+    FROM rating_stats
+    WHERE id = 1
+    """
+    scan_query = """
+    SELECT 
+        (SELECT COUNT(*) FROM books) as book_count,
+        (SELECT COUNT(DISTINCT user_id) FROM ratings) as user_count,
+        (SELECT COUNT(*) FROM ratings) as rating_count
+    """
+    return _read_summary_or_scan("get_collection_metrics", engine, summary_query, scan_query)
+
+
+def _read_summary_or_scan(name, engine, summary_query, scan_query, params=None):
+    """Run a query against precomputed data (a summary table or column), falling back to the full scan."""
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(summary_query), conn, params=params)
+        if not df.empty:
+            return df
+    except Exception as e:
+        logger.warning("Precomputed data unavailable in %s, running the full query instead: %s", name, e)
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(scan_query), conn, params=params)
+        return df
+    except Exception as e:
+        _query_failed(name, e)
+        return pd.DataFrame()
+
+
+@instrumented("sql")
+@cached(ttl=600)
+def get_user_rated_book_ids(user_id):
+    """
+    Get the ids of every book a user has rated.
+    
+    Dashboard Location: Graph Database Insights > Book Discovery & Recommendations tab > Recommendations for a Reader
+    Used to leave books the reader already rated out of their collaborative-filtering recommendations.
+    """
+    engine = get_engine()
+    query = """
+    SELECT book_id
+    FROM ratings
+    WHERE user_id = :user_id
+    """
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"user_id": user_id})
+        return df
+    except Exception as e:
+        _query_failed("get_user_rated_book_ids", e)
+        return pd.DataFrame()
+
+
+@instrumented("sql")
+def get_most_wanted_books(limit=20):
+    """
+    Get the books on the most to-read lists.
+    
+    Dashboard Location: SQL Database Analytics > Reading Lists tab > Most Wanted Books
+    Shows each book's number of distinct to-read readers and how many of them have also rated it.
+    Served from the to-read bitmaps (reading_lists.py); the to_read/ratings join is only
+    used when they have not been built or are stale.
+    """
+    results = reading_lists.get_most_wanted_books(limit)
+    if results is not None:
+        return results
+    return _most_wanted_books_join(limit)
+
+
+@cached()
+def _most_wanted_books_join(limit=20):
+    """Count to-read readers per book, joined to ratings for the ones who also rated it."""
+    engine = get_engine()
+    query = """
+    SELECT 
+        b.title,
+        b.authors,
+        w.want_count,
+        w.already_rated,
+        b.average_rating,
+        b.ratings_count
+    FROM (
+        SELECT 
+            t.book_id,
+            COUNT(DISTINCT t.user_id) as want_count,
+            COUNT(DISTINCT r.user_id) as already_rated
+        FROM to_read t
+        LEFT JOIN ratings r ON r.user_id = t.user_id AND r.book_id = t.book_id
+        GROUP BY t.book_id
+        ORDER BY want_count DESC, t.book_id
+        LIMIT :limit
+    ) w
+    JOIN books b ON b.book_id = w.book_id
+    ORDER BY w.want_count DESC, w.book_id
+    """
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"limit": limit})
+        return df
+    except Exception as e:
+        _query_failed("get_most_wanted_books", e)
+        return pd.DataFrame()
+
+
+@instrumented("sql")
+def get_also_wanted_books(title, limit=10):
+    """
+    Get the books most often on the same to-read lists as a book.
+    
+    Dashboard Location: SQL Database Analytics > Reading Lists tab > Readers Who Want This Also Want
+    Shows, for every other book, how many readers want both (co_wanted) and what share of the
+    book's readers that is. Served from the to-read bitmaps (reading_lists.py); the to_read
+    self-join is only used when they have not been built or are stale.
+    """
+    results = reading_lists.get_also_wanted_books(title, limit)
+    if results is not None:
+        return results
+    return _also_wanted_books_join(title, limit)
+
+
+@cached()
+def _also_wanted_books_join(title, limit=10):
+    """Count co-occurrences on to-read lists with a to_read self-join."""
+    engine = get_engine()
+    query = """
+    SELECT 
+        b.title,
+        b.authors,
+        COUNT(DISTINCT ty.user_id) as co_wanted,
+        ROUND(COUNT(DISTINCT ty.user_id) / (SELECT COUNT(DISTINCT user_id) FROM to_read WHERE book_id = x.book_id), 3) as share
+    FROM books x
+    JOIN to_read tx ON tx.book_id = x.book_id
+    JOIN to_read ty ON ty.user_id = tx.user_id AND ty.book_id != tx.book_id
+    JOIN books b ON b.book_id = ty.book_id
+    WHERE x.book_id = (SELECT MIN(book_id) FROM books WHERE title = :title)
+    GROUP BY x.book_id, b.book_id, b.title, b.authors
+    ORDER BY co_wanted DESC, b.book_id
+    LIMIT :limit
+    """
+    try:
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"title": title, "limit": limit})
+        return df
+    except Exception as e:
+        _query_failed("get_also_wanted_books", e)
+        return pd.DataFrame()
+
+
+@instrumented("sql")
+def get_user_reading_list(user_id):
+    """
+    Get a user's to-read list, flagging the books they have since rated.
+    
+    Dashboard Location: SQL Database Analytics > Reading Lists tab > Reading List vs. Ratings
+    Shows the overlap between what a reader wants to read and what they have rated, rated books first.
+    Served from the to-read bitmaps (reading_lists.py); the to_read/ratings join is only
+    used when they have not been built or are stale.
+    """
+    results = reading_lists.get_user_reading_list(user_id)
+    if results is not None:
+        return results
+    return _user_reading_list_join(user_id)
+
+
+@cached(ttl=600)
+def _user_reading_list_join(user_id):
+    """Look up each to-read entry of a user in the ratings table."""
+    engine = get_engine()
+    query = """
+    SELECT 
+        b.title,
+        b.authors,
+        b.average_rating,
+        EXISTS (SELECT 1 FROM ratings r WHERE r.user_id = t.user_id AND r.book_id = t.book_id) as rated
+    FROM (SELECT DISTINCT user_id, book_id FROM to_read WHERE user_id = :user_id) t
+    JOIN books b ON b.book_id = t.book_id
+    ORDER BY rated DESC, b.ratings_count DESC
     """
     try:
-        df = pd.read_sql(text(query), engine, params={"keyword": f"%{keyword}%", "min_rating": min_rating})
+        with _connect(engine) as conn:
+            df = pd.read_sql(text(query), conn, params={"user_id": user_id})
+        df["rated"] = df["rated"].astype(bool)
         return df
     except Exception as e:
-        print(f"Error in search_books: {e}")
+        _query_failed("get_user_reading_list", e)
         return pd.DataFrame()
@@ -0,0 +1,168 @@
+"""
+Precomputed rating aggregates for the SQL dashboard.
+
+The Collection Metrics tiles and the Top Contributors table used to scan the ~6M-row
+ratings table on every render. This module maintains two small tables instead:
+
+- user_rating_summary: one row per user (books_rated, rating_sum, min/max rating)
+- rating_stats: a single row with catalog-wide counts and the last aggregated rating_id
+
+Refreshes are incremental: only ratings with rating_id above the stored watermark are
+aggregated and merged into the summary, so appending ratings costs O(new rows). A rating
+whose lower AUTO_INCREMENT id commits after a refresh has read a higher one is missed by
+the watermark, so both tables are also rebuilt from scratch once
+SUMMARIES_REBUILD_INTERVAL has passed since the last rebuild.
+
+Usage:
+    python summaries.py          # incremental refresh
+    python summaries.py --full   # rebuild from scratch
+"""
+
+import argparse
+import datetime
+import time
+
+from sqlalchemy import inspect, text
+
+import config
+from sql_queries import get_engine
+
+
+CREATE_USER_SUMMARY = """
+CREATE TABLE IF NOT EXISTS user_rating_summary (
+    user_id INT PRIMARY KEY,
+    books_rated INT NOT NULL,
+    rating_sum BIGINT NOT NULL,
+    min_rating INT NOT NULL,
+    max_rating INT NOT NULL,
+    INDEX idx_user_summary_books_rated (books_rated)
+)
+"""
+
+CREATE_RATING_STATS = """
+CREATE TABLE IF NOT EXISTS rating_stats (
+    id TINYINT PRIMARY KEY,
+    book_count INT NOT NULL,
+    user_count INT NOT NULL,
+    rating_count BIGINT NOT NULL,
+    last_rating_id BIGINT NOT NULL,
+    refreshed_at DATETIME NOT NULL,
+    rebuilt_at DATETIME
+)
+"""
+
+# rating_stats tables created before the periodic rebuild; NULL makes the next refresh rebuild
+ADD_REBUILT_AT = "ALTER TABLE rating_stats ADD COLUMN rebuilt_at DATETIME"
+
+# Existing databases created before rating_id was added to the schema
+ADD_RATING_ID = """
+ALTER TABLE ratings
+    ADD COLUMN rating_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST,
+    ADD INDEX idx_ratings_user (user_id)
+"""
+
+MERGE_USER_SUMMARY = """
+INSERT INTO user_rating_summary (user_id, books_rated, rating_sum, min_rating, max_rating)
+SELECT
+    user_id,
+    COUNT(*),
+    SUM(rating),
+    MIN(rating),
+    MAX(rating)
+FROM ratings
+WHERE rating_id > :low AND rating_id <= :high
+GROUP BY user_id
+ON DUPLICATE KEY UPDATE
+    books_rated = books_rated + VALUES(books_rated),
+    rating_sum = rating_sum + VALUES(rating_sum),
+    min_rating = LEAST(min_rating, VALUES(min_rating)),
+    max_rating = GREATEST(max_rating, VALUES(max_rating))
+"""
+
+UPSERT_RATING_STATS = """
+INSERT INTO rating_stats (id, book_count, user_count, rating_count, last_rating_id, refreshed_at, rebuilt_at)
+SELECT
+    1,
+    (SELECT COUNT(*) FROM books),
+    COUNT(*),
+    COALESCE(SUM(books_rated), 0),
+    :high,
+    NOW(),
+    :rebuilt_at
+FROM user_rating_summary
+ON DUPLICATE KEY UPDATE
+    book_count = VALUES(book_count),
+    user_count = VALUES(user_count),
+    rating_count = VALUES(rating_count),
+    last_rating_id = VALUES(last_rating_id),
+    refreshed_at = VALUES(refreshed_at),
+    rebuilt_at = COALESCE(VALUES(rebuilt_at), rebuilt_at)
+"""
+
+
+def ensure_schema(engine=None):
+    """Create the summary tables and add ratings.rating_id / the user_id index if missing."""
+    engine = engine or get_engine()
+    columns = {c["name"] for c in inspect(engine).get_columns("ratings")}
+    with engine.begin() as conn:
+        if "rating_id" not in columns:
+            conn.execute(text(ADD_RATING_ID))
+        conn.execute(text(CREATE_USER_SUMMARY))
+        conn.execute(text(CREATE_RATING_STATS))
+    if "rebuilt_at" not in {c["name"] for c in inspect(engine).get_columns("rating_stats")}:
+        with engine.begin() as conn:
+            conn.execute(text(ADD_REBUILT_AT))
+
+
+def _rebuild_due(rebuilt_at):
+    if rebuilt_at is None:
+        return True
+    elapsed = datetime.datetime.now() - rebuilt_at
+    return elapsed.total_seconds() >= config.SUMMARIES_REBUILD_INTERVAL
+
+
+def refresh_summaries(full=False, engine=None):
+    """
+    Bring user_rating_summary and rating_stats up to date with the ratings table.
+
+    Only ratings appended since the last refresh are aggregated unless full=True, or the
+    last rebuild is older than SUMMARIES_REBUILD_INTERVAL; both rebuild the tables from
+    scratch. Returns the number of ratings folded in.
+    """
+    engine = engine or get_engine()
+    ensure_schema(engine)
+
+    with engine.begin() as conn:
+        high = conn.execute(text("SELECT COALESCE(MAX(rating_id), 0) FROM ratings")).scalar()
+        stats = conn.execute(text("SELECT last_rating_id, rebuilt_at FROM rating_stats WHERE id = 1")).first()
+        low = stats[0] if stats is not None else None
+
+        rebuilt_at = None
+        if full or low is None or low > high or _rebuild_due(stats[1]):
+            conn.execute(text("DELETE FROM user_rating_summary"))
+            low = 0
+            rebuilt_at = datetime.datetime.now()
+
+        new_ratings = conn.execute(
+            text("SELECT COUNT(*) FROM ratings WHERE rating_id > :low AND rating_id <= :high"),
+            {"low": low, "high": high},
+        ).scalar()
+        if new_ratings:
+            conn.execute(text(MERGE_USER_SUMMARY), {"low": low, "high": high})
+        conn.execute(text(UPSERT_RATING_STATS), {"high": high, "rebuilt_at": rebuilt_at})
+
+    return new_ratings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh precomputed rating summary tables.")
+    parser.add_argument("--full", action="store_true", help="rebuild the summaries from scratch")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    new_ratings = refresh_summaries(full=args.full)
+    print(f"Aggregated {new_ratings:,} ratings in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
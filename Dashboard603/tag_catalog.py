@@ -0,0 +1,179 @@
+"""
+Precomputed catalog of clean tags with book counts.
+
+get_all_tags and get_top_tags filter junk tags ("to-read", "2015", "5-star", ...) with
+regexes evaluated against every TAGGED_AS edge on each call. This module classifies every
+tag once, counts its books, and keeps the result as a small JSON table under
+artifacts/tags that is loaded into memory. The dashboard stops using it (and falls back to
+Cypher) once tags.csv or book_tags.csv change, until it is rebuilt with the command below.
+
+Two filters are recorded per tag, matching the two Cypher queries:
+- strict: the genre dropdowns (get_all_tags), which also drop years, ratings, ownership
+  and reading-status tags
+- lenient: the Top Tags panel (get_top_tags), which only drops numeric and one-letter tags
+
+Usage (from Dashboard603/):
+    python tag_catalog.py build [--source csv|neo4j]
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import config
+import instrumentation
+from datasets import replace_file, source_fingerprint, write_json
+
+
+logger = logging.getLogger(__name__)
+
+
+# Genre dropdowns only list tags applied to at least this many books
+MIN_DROPDOWN_BOOKS = 10
+
+_JUNK_NAMES = {"-", "--", "---", "1", "2", "3", "mine", "own", "owned", "have", "default"}
+_JUNK_PREFIXES = ("read-", "to-", "my-")
+
+SOURCE_FILES = ("tags.csv", "book_tags.csv")  # a change to either rebuilds the catalog
+
+
+def catalog_path():
+    return os.path.join(config.ARTIFACT_DIR, "tags", "catalog.json")
+
+
+def classify(names):
+    """
+    Label tag names with the dashboard's junk-tag rules.
+
+    names is a pandas Series of strings; returns (strict, lenient) boolean Series.
+    """
+    names = names.fillna("")
+    lenient = (names.str.len() > 1) & ~names.str.fullmatch(r"[0-9-]+")
+    strict = (
+        (names.str.len() > 2)
+        & ~names.str.match(r"[0-9]")
+        & ~names.str.contains(r"[0-9]{4}")
+        & ~names.str.contains("-star")
+        & ~names.str.endswith("star")
+        & ~names.isin(_JUNK_NAMES)
+        & ~names.str.startswith(_JUNK_PREFIXES)
+    )
+    return strict, lenient
+
+
+def build(source="csv"):
+    """Classify every tag, count its books and write the catalog. Returns the number of tags kept."""
+    from similarity_index import load_book_tag_pairs
+    pairs = load_book_tag_pairs(source)
+    counts = pairs.groupby("tag").size().rename("book_count").reset_index()
+    strict, lenient = classify(counts["tag"])
+    counts = counts[strict | lenient]
+
+    path = catalog_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(path, write_json({
+        "source": source,
+        "fingerprint": source_fingerprint(source, SOURCE_FILES),
+        "built_at": time.time(),
+        "tags": counts["tag"].tolist(),
+        "book_counts": counts["book_count"].astype(int).tolist(),
+        "strict": strict[counts.index].tolist(),
+        "lenient": lenient[counts.index].tolist(),
+    }))
+    return len(counts)
+
+
+class TagCatalog:
+    """The clean-tag table, pre-sorted for both dashboard views."""
+
+    def __init__(self, data, mtime):
+        self.meta_mtime = mtime
+        self.source = data["source"]
+        self.fingerprint = data["fingerprint"]
+        rows = list(zip(data["tags"], data["book_counts"], data["strict"], data["lenient"]))
+        self.dropdown_tags = sorted(tag for tag, count, strict, _ in rows if strict and count >= MIN_DROPDOWN_BOOKS)
+        self.top_tags = sorted(((tag, count) for tag, count, _, lenient in rows if lenient),
+                               key=lambda row: (-row[1], row[0]))
+
+    @classmethod
+    def load(cls):
+        path = catalog_path()
+        mtime = os.path.getmtime(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), mtime)
+
+    def is_stale(self):
+        if self.fingerprint is None:
+            return False
+        try:
+            return source_fingerprint(self.source, SOURCE_FILES) != self.fingerprint
+        except OSError:
+            return False  # exports removed; keep serving the last catalog
+
+
+_catalog = None
+_failed_mtime = None  # mtime of a catalog file that could not be loaded
+_catalog_lock = threading.Lock()
+
+
+def load_catalog():
+    """
+    The in-memory catalog, reloaded if it was rebuilt since it was opened.
+
+    Returns None if the catalog has not been built, cannot be loaded or is stale, so callers
+    fall back to Cypher. A file that failed to load is not retried until it changes.
+    """
+    global _catalog, _failed_mtime
+    try:
+        mtime = os.path.getmtime(catalog_path())
+    except OSError:
+        return None
+    with _catalog_lock:
+        if _catalog is None or _catalog.meta_mtime != mtime:
+            if mtime == _failed_mtime:
+                return None
+            try:
+                _catalog = TagCatalog.load()
+            except Exception as e:
+                logger.error("Error loading tag catalog: %s", e)
+                instrumentation.record_error(f"{__name__}.load_catalog", kind="load")
+                _catalog, _failed_mtime = None, mtime
+                return None
+        catalog = _catalog
+    return None if catalog.is_stale() else catalog
+
+
+def get_all_tags():
+    """Clean tags for the genre dropdowns, in the shape of neo4j_queries.get_all_tags, or None."""
+    catalog = load_catalog()
+    if catalog is None:
+        return None
+    return [{"tag": tag} for tag in catalog.dropdown_tags]
+
+
+def get_top_tags(limit):
+    """Most used tags as {"tag", "book_count"} dicts, in the shape of neo4j_queries.get_top_tags, or None."""
+    catalog = load_catalog()
+    if catalog is None:
+        return None
+    return [{"tag": tag, "book_count": count} for tag, count in catalog.top_tags[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the clean tag catalog.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="classify tags and count their books")
+    build_parser.add_argument("--source", choices=["csv", "neo4j"], default="csv",
+                              help="read book tags from data/book_tags.csv or from the Neo4j graph")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    kept = build(args.source)
+    print(f"Cataloged {kept:,} tags in {time.perf_counter() - start:.1f}s -> {catalog_path()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+TF-IDF weighted tag similarity between books.
+
+Raw shared-tag counts treat "favorites" or "books-i-own" the same as "steampunk" and
+ignore how often a tag was applied. This engine builds a sparse book x tag matrix from
+book_tags with sublinear term frequency (1 + log count) and inverse document frequency
+(log N / df, so a tag on every book weighs nothing), L2-normalises the rows, and computes
+cosine neighbours for all books as batched sparse products, optionally across processes.
+
+The neighbour lists use the same memory-mapped CSR layout as similarity_index.py; the
+weighted matrix is stored alongside so recommendation graphs can be assembled without Neo4j.
+Graph ratings and the minimum-rating filter use the book ratings at build time, updated
+with any ratings folded in since (datasets.rating_overlay).
+
+Usage (from Dashboard603/):
+    python tag_similarity.py build [--source csv|neo4j] [--top-n 50] [--workers 4]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+import config
+import instrumentation
+from datasets import rating_overlay, replace_file, source_fingerprint, write_json, write_npy
+from similarity_index import SOURCE_FILES, index_dir, load_book_tag_pairs, load_index, save_index, top_neighbors
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_NAME = "tfidf"
+
+# Same main-tag filter as get_recommendation_graph_data
+_GRAPH_TAG_JUNK = re.compile(r"^[0-9-]+$")
+
+
+def tfidf_matrix(book_idx, tag_idx, counts, n_books, n_tags):
+    """Row-normalised TF-IDF book x tag matrix (CSR, float32)."""
+    counts = sparse.csr_matrix(
+        (counts.astype(np.float32), (book_idx, tag_idx)), shape=(n_books, n_tags)
+    )
+    counts.sum_duplicates()
+    weights = counts.copy()
+    weights.data = 1 + np.log(np.maximum(weights.data, 1))
+
+    doc_freq = np.bincount(weights.indices, minlength=n_tags)
+    idf = np.log(n_books / np.maximum(doc_freq, 1)).astype(np.float32)
+    weights = weights @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    weights = sparse.diags(1 / np.where(norms > 0, norms, 1)) @ weights
+    weights = weights.tocsr().astype(np.float32)
+    weights.eliminate_zeros()
+    return weights
+
+
+_worker_state = {}
+
+
+def _init_worker(matrix, matrix_t, title_rank, top_n):
+    _worker_state.update(matrix=matrix, matrix_t=matrix_t, title_rank=title_rank, top_n=top_n)
+
+
+def _neighbors_chunk(start, stop):
+    state = _worker_state
+    cosine = (state["matrix"][start:stop] @ state["matrix_t"]).toarray()
+    return top_neighbors(cosine, start, state["title_rank"], state["top_n"])
+
+
+def all_neighbors(matrix, top_n, chunk_size=1000, workers=1):
+    """Top-N cosine neighbours for every row, computed chunk by chunk."""
+    matrix_t = matrix.T.tocsc()
+    title_rank = np.arange(matrix.shape[0])
+    chunks = [(start, min(start + chunk_size, matrix.shape[0])) for start in range(0, matrix.shape[0], chunk_size)]
+    initargs = (matrix, matrix_t, title_rank, top_n)
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.map(_neighbors_chunk, *zip(*chunks)))
+    else:
+        _init_worker(*initargs)
+        results = [_neighbors_chunk(start, stop) for start, stop in chunks]
+
+    neighbors, scores = [], []
+    for chunk_neighbors, chunk_scores in results:
+        neighbors.extend(chunk_neighbors)
+        scores.extend(chunk_scores)
+    return neighbors, scores
+
+
+def _write_npz(matrix):
+    def write(path):
+        with open(path, "wb") as f:
+            sparse.save_npz(f, matrix)
+    return write
+
+
+def build(source="csv", top_n=None, workers=1, chunk_size=1000):
+    """Build the TF-IDF matrix and cosine neighbour index and write them to disk."""
+    top_n = top_n or config.SIMILARITY_TOP_N
+    pairs = load_book_tag_pairs(source)
+
+    titles, book_idx = np.unique(pairs["title"].to_numpy(dtype=str), return_inverse=True)
+    tag_names, tag_idx = np.unique(pairs["tag"].to_numpy(dtype=str), return_inverse=True)
+    ratings = np.zeros(len(titles), dtype=np.float32)
+    ratings[book_idx] = pairs["rating"].fillna(0).to_numpy(dtype=np.float32)
+
+    matrix = tfidf_matrix(book_idx, tag_idx, pairs["count"].to_numpy(), len(titles), len(tag_names))
+    neighbors, scores = all_neighbors(matrix, top_n, chunk_size, workers)
+
+    path = index_dir(INDEX_NAME)
+    os.makedirs(path, exist_ok=True)
+    replace_file(os.path.join(path, "matrix.npz"), _write_npz(matrix))
+    replace_file(os.path.join(path, "tags.json"), write_json(list(tag_names)))
+    replace_file(os.path.join(path, "ratings.npy"), write_npy(ratings))
+    save_index(INDEX_NAME, titles, neighbors, scores, {
+        "kind": "tfidf_cosine",
+        "source": source,
+        "fingerprint": source_fingerprint(source, SOURCE_FILES),
+        "top_n": top_n,
+    })
+    return len(titles)
+
+
+class TagModel:
+    """Weighted book x tag matrix loaded next to a neighbour index."""
+
+    def __init__(self, index):
+        path = index_dir(INDEX_NAME)
+        self.index = index
+        self.matrix = sparse.load_npz(os.path.join(path, "matrix.npz")).tocsr()
+        self.ratings = self.base_ratings = np.load(os.path.join(path, "ratings.npy"), mmap_mode="r")
+        self.overlay_version = 0
+        with open(os.path.join(path, "tags.json"), encoding="utf-8") as f:
+            self.tags = json.load(f)
+
+    def sync_ratings(self):
+        """Apply the latest rating overlay on top of the build-time ratings, if it changed."""
+        version, overlay = rating_overlay()
+        if version == self.overlay_version:
+            return
+        ratings = self.base_ratings
+        if overlay is not None and len(overlay):
+            # Rows are titles; when changed books share a title the lowest book_id is used
+            overlay = overlay.sort_values("book_id").drop_duplicates("title")
+            rows = overlay["title"].map(self.index.row_of)
+            found = rows.notna().to_numpy()
+            ratings = np.array(ratings)
+            ratings[rows[found].astype(np.int64).to_numpy()] = overlay["average_rating"].to_numpy(dtype=np.float32)[found]
+        self.ratings, self.overlay_version = ratings, version
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_model():
+    """The TF-IDF model for the current index, or None if it is missing or stale."""
+    global _model
+    index = load_index(INDEX_NAME)
+    if index is None:
+        return None
+    with _model_lock:
+        if _model is None or _model.index is not index:
+            try:
+                _model = TagModel(index)
+            except Exception as e:
+                logger.error("Error loading TF-IDF tag model: %s", e)
+                instrumentation.record_error(f"{__name__}.load_model", kind="load")
+                return None
+        _model.sync_ratings()
+        return _model
+
+
+def get_recommendations(title, limit=30):
+    """
+    Most similar books by TF-IDF cosine over tags.
+
+    Returns a list of {"recommended_title", "similarity"} dicts, or None when the index is
+    missing, stale or does not contain the title.
+    """
+    index = load_index(INDEX_NAME)
+    if index is None:
+        return None
+    found = index.neighbors_of(title, limit)
+    if found is None:
+        return None
+    titles, scores = found
+    return [
+        {"recommended_title": t, "similarity": round(float(s), 4)}
+        for t, s in zip(titles, scores)
+    ]
+
+
+def get_recommendation_graph_data(title, num_books=10, min_rating=3.5):
+    """
+    Network rows in the shape of neo4j_queries.get_recommendation_graph_data.
+
+    Recommended books are ranked by cosine similarity instead of raw shared-tag count.
+    Returns a list of {"main_book", "book_title", "tag", "is_main", "rating"} dicts, or
+    None when the model is unavailable or does not contain the title.
+    """
+    model = load_model()
+    if model is None:
+        return None
+    main = model.index.row_of.get(title)
+    if main is None:
+        return None
+
+    matrix = model.matrix
+    main_tags = matrix.indices[matrix.indptr[main]:matrix.indptr[main + 1]]
+    main_tags = np.array([t for t in main_tags if len(model.tags[t]) > 2 and not _GRAPH_TAG_JUNK.match(model.tags[t])],
+                         dtype=np.int64)
+    if not len(main_tags):
+        return []
+
+    # Candidates must share a displayed tag; one sparse mat-vec scores every book
+    shares_tag = np.asarray(matrix[:, main_tags].sum(axis=1)).ravel() > 0
+    similarity = (matrix @ matrix[main].T).toarray().ravel()
+    ratings = np.asarray(model.ratings)
+    eligible = shares_tag & (ratings >= min_rating)
+    eligible[main] = False
+    candidates = np.flatnonzero(eligible)
+    order = np.lexsort((-ratings[candidates], -similarity[candidates]))
+    top_books = candidates[order[:num_books]]
+
+    main_tag_set = set(main_tags.tolist())
+    rows = []
+    for book in [main] + sorted(top_books.tolist(), key=lambda b: -ratings[b]):
+        book_tags = matrix.indices[matrix.indptr[book]:matrix.indptr[book + 1]]
+        for tag in book_tags:
+            if tag in main_tag_set:
+                rows.append({
+                    "main_book": title,
+                    "book_title": model.index.titles[book],
+                    "tag": model.tags[tag],
+                    "is_main": int(book == main),
+                    "rating": float(ratings[book]),
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the TF-IDF tag similarity index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="rebuild the index")
+    build_parser.add_argument("--source", choices=["csv", "neo4j"], default="csv")
+    build_parser.add_argument("--top-n", type=int, default=config.SIMILARITY_TOP_N)
+    build_parser.add_argument("--workers", type=int, default=1, help="processes used for the cosine products")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    books = build(args.source, args.top_n, args.workers)
+    print(f"Indexed {books:,} books in {time.perf_counter() - start:.1f}s -> {index_dir(INDEX_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
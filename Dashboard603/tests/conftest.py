@@ -0,0 +1,70 @@
+"""
+Shared fixtures: a small synthetic Goodbooks dataset (benchmarks/synthetic.py) and SQLite
+copies of it loaded with ingest.py, so the tests need neither MySQL nor Neo4j.
+
+Run from Dashboard603/:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import config  # noqa: E402
+import datasets  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+
+SCALE = 0.01  # 100 books, 342 tags, ~60k ratings, ~9k to_read entries
+
+
+def _clear_loaders():
+    for loader in (datasets.load_books, datasets.load_tags, datasets.load_book_tags):
+        loader.cache_clear()
+    cache.data_reloaded()
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """Point config at a freshly generated synthetic dataset; yields its data directory."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(config, "ARTIFACT_DIR", str(tmp_path_factory.mktemp("artifacts")))
+        synthetic.generate(SCALE)
+        patch.setattr(config, "DATA_DIR", os.path.join(synthetic.dataset_dir(SCALE), "data"))
+        _clear_loaders()
+        yield config.DATA_DIR
+    _clear_loaders()
+
+
+@pytest.fixture(scope="session")
+def load_sqlite(dataset, tmp_path_factory):
+    """Factory for SQLite databases loaded from the synthetic CSVs with ingest.py."""
+    import ingest
+
+    def load(name):
+        url = f"sqlite:///{tmp_path_factory.mktemp('sql') / name}.db"
+        ingest.load_sql(url, chunk_size=20_000, workers=1)
+        return create_engine(url)
+    return load
+
+
+@pytest.fixture(scope="session")
+def sqlite_engine(load_sqlite):
+    """A read-only SQLite copy of the synthetic dataset shared by the comparison tests."""
+    return load_sqlite("goodbooks")
+
+
+@pytest.fixture
+def sql_engine(sqlite_engine, monkeypatch):
+    """Make sql_queries.get_engine() return the shared SQLite copy."""
+    import sql_queries
+
+    monkeypatch.setattr(sql_queries, "_engine", sqlite_engine)
+    cache.data_reloaded()
+    yield sqlite_engine
+    cache.data_reloaded()
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import book_ratings
+
+
+@pytest.fixture
+def engine(load_sqlite):
+    engine = load_sqlite("book_ratings")
+    book_ratings.ensure_schema(engine)
+    return engine
+
+
+def read_books(engine):
+    with engine.connect() as conn:
+        books = book_ratings._read_books(conn, "books")
+    return book_ratings._normalize(books).sort_index()
+
+
+def new_ratings(tmp_path, name, size, seed):
+    rng = np.random.default_rng(seed)
+    path = tmp_path / f"{name}.csv"
+    pd.DataFrame({
+        "user_id": rng.integers(1, 600, size),
+        "book_id": rng.integers(1, 101, size),
+        "rating": rng.integers(1, 6, size),
+    }).to_csv(path, index=False)
+    return path
+
+
+def test_fold_in_matches_reconcile(engine, tmp_path):
+    baseline = read_books(engine)
+    appended = []
+    for batch in range(3):
+        path = new_ratings(tmp_path, f"batch{batch}", 500, seed=batch)
+        result = book_ratings.append(path, neo4j=False, engine=engine)
+        assert result["inserted"] == 500
+        assert not result["reconciled"]
+        appended.append(pd.read_csv(path))
+    folded = read_books(engine)
+
+    # The histograms grew by exactly the appended ratings
+    appended = pd.concat(appended, ignore_index=True)
+    stars = pd.crosstab(appended["book_id"], appended["rating"]).reindex(columns=range(1, 6), fill_value=0)
+    stars = stars.reindex(baseline.index, fill_value=0).to_numpy()
+    assert (folded[book_ratings.STAR_COLUMNS].to_numpy() == baseline[book_ratings.STAR_COLUMNS].to_numpy() + stars).all()
+    assert (folded["ratings_count"] == baseline["ratings_count"] + stars.sum(axis=1)).all()
+
+    result = book_ratings.refresh(full=True, neo4j=False, engine=engine)
+    assert result["reconciled"]
+    assert result["books"] == 0
+    pd.testing.assert_frame_equal(read_books(engine)[book_ratings.RATING_COLUMNS], folded[book_ratings.RATING_COLUMNS])
+
+
+def test_refresh_without_new_ratings_changes_nothing(engine):
+    before = read_books(engine)
+    result = book_ratings.refresh(neo4j=False, engine=engine)
+    assert result["ratings"] == 0 and result["books"] == 0
+    pd.testing.assert_frame_equal(read_books(engine), before)
+
+
+def test_rating_overlay_lists_the_books_rated_since_the_baseline(engine, tmp_path):
+    assert book_ratings.load_rating_overlay(engine).empty
+    path = new_ratings(tmp_path, "overlay", 50, seed=7)
+    book_ratings.append(path, neo4j=False, engine=engine)
+    overlay = book_ratings.load_rating_overlay(engine).set_index("book_id")
+    assert set(overlay.index) == set(pd.read_csv(path)["book_id"])
+    books = read_books(engine).loc[overlay.index]
+    assert np.allclose(overlay["average_rating"], books["average_rating"])
+
+
+def test_weighted_ratings_score_books_loaded_after_the_build(engine):
+    import weighted_ratings
+
+    weighted_ratings.build(neo4j=False, engine=engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE books SET weighted_rating = NULL WHERE book_id <= 10"))
+    assert weighted_ratings.score_new_books(engine) == 10
+    with engine.connect() as conn:
+        unscored = conn.execute(text("SELECT COUNT(*) FROM books WHERE weighted_rating IS NULL")).scalar()
+    assert unscored == 0
+
+
+def test_check_for_updates_clears_the_cache_when_the_watermark_moves(engine, tmp_path, monkeypatch):
+    import cache
+    import datasets
+
+    monkeypatch.setattr(book_ratings, "get_engine", lambda: engine)
+    monkeypatch.setattr(book_ratings, "_seen_watermark", None)
+    monkeypatch.setattr(datasets, "_rating_overlay", (0, None))
+    generation = cache._generation
+    assert not book_ratings.check_for_updates()  # first sight publishes the overlay only
+    assert datasets.rating_overlay()[1].empty
+    assert not book_ratings.check_for_updates()
+    book_ratings.append(new_ratings(tmp_path, "watch", 20, seed=3), neo4j=False, engine=engine)
+    assert book_ratings.check_for_updates()
+    assert cache._generation > generation
+    assert len(datasets.rating_overlay()[1]) > 0
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+import cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.data_reloaded()
+    yield
+    cache.data_reloaded()
+
+
+def counting(**options):
+    """A cached function that records its calls."""
+    calls = []
+
+    @cache.cached(**options)
+    def query(tx, title, limit=5):
+        calls.append((title, limit))
+        return [f"{title}:{limit}"]
+    return query, calls
+
+
+def test_key_binds_positional_keyword_and_default_arguments():
+    query, calls = counting(skip_args=1)
+    assert query(None, "a") == query(None, "a", 5) == query(None, "a", limit=5) == query(None, title="a")
+    assert calls == [("a", 5)]
+    query(None, "a", 6)
+    query(None, "b")
+    assert calls == [("a", 5), ("a", 6), ("b", 5)]
+
+
+def test_skipped_arguments_are_left_out_of_the_key():
+    query, calls = counting(skip_args=1)
+    query("first transaction", "a")
+    query("second transaction", "a")
+    assert len(calls) == 1
+    assert query.lookup("a") == ["a:5"]
+    assert query.lookup("b") is cache.MISS
+
+
+def test_data_reloaded_invalidates_every_entry():
+    query, calls = counting(skip_args=1)
+    query(None, "a")
+    cache.data_reloaded()
+    assert query.lookup("a") is cache.MISS
+    query(None, "a")
+    assert len(calls) == 2
+
+
+def test_result_of_a_query_running_across_a_reload_is_not_stored():
+    @cache.cached()
+    def query(title):
+        cache.data_reloaded()  # a reload lands while the query runs
+        return [title]
+
+    assert query("a") == ["a"]
+    assert query.lookup("a") is cache.MISS
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    query, calls = counting(ttl=10, skip_args=1)
+    query(None, "a")
+    now[0] += 9
+    query(None, "a")
+    assert len(calls) == 1
+    now[0] += 2
+    query(None, "a")
+    assert len(calls) == 2
+
+
+def test_empty_results_are_not_cached():
+    calls = []
+
+    @cache.cached()
+    def query(title):
+        calls.append(title)
+        return pd.DataFrame()
+
+    query("a")
+    query("a")
+    assert calls == ["a", "a"]
+    assert cache.last_call_hit() is False
+
+
+def test_least_recently_used_entries_are_evicted_over_the_memory_cap(monkeypatch):
+    query, calls = counting(skip_args=1)
+    size = cache._estimate_size(["a:5"])
+    monkeypatch.setattr(cache.config, "CACHE_MAX_BYTES", size * 2)
+    query(None, "a")
+    query(None, "b")
+    query(None, "a")  # "a" becomes the most recently used
+    query(None, "c")
+    assert query.lookup("a") is not cache.MISS
+    assert query.lookup("b") is cache.MISS
+    assert query.lookup("c") is not cache.MISS
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+
+import config
+import neo4j_db
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self.records:
+            yield record
+
+
+class FakeTx:
+    async def run(self, query, parameters):
+        return FakeResult([{"n": parameters["n"]}])
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        self.driver.open += 1
+        self.driver.most_open = max(self.driver.most_open, self.driver.open)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.driver.open -= 1
+
+    async def execute_read(self, work, *args):
+        await asyncio.sleep(0.01)
+        return await work(FakeTx(), *args)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.open = self.most_open = 0
+        self.closed = False
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+def echo(tx, n):
+    return list(tx.run("RETURN $n AS n", n=n))
+
+
+@pytest.fixture
+def drivers(monkeypatch):
+    opened = []
+
+    def open_driver():
+        opened.append(FakeDriver())
+        return opened[-1]
+    monkeypatch.setattr(neo4j_db, "_open_async_driver", open_driver)
+    monkeypatch.setattr(neo4j_db, "_session_slots", threading.BoundedSemaphore(2))
+    return opened
+
+
+def test_async_reads_share_the_session_limit(drivers):
+    results = asyncio.run(neo4j_db.read_many_async([(echo, (n,)) for n in range(6)]))
+    assert [records[0]["n"] for records in results] == list(range(6))
+    driver, = drivers
+    assert driver.most_open == 2
+    assert neo4j_db._session_slots.acquire(blocking=False) and neo4j_db._session_slots.acquire(blocking=False)
+
+
+def test_async_driver_is_closed_when_its_loop_shuts_down(drivers):
+    asyncio.run(neo4j_db.read_async(echo, 1))
+    asyncio.run(neo4j_db.read_async(echo, 2))
+    assert len(drivers) == 2
+    assert all(driver.closed for driver in drivers)
+
+
+def test_async_session_times_out_when_no_slot_frees(drivers, monkeypatch):
+    monkeypatch.setattr(config, "NEO4J_SESSION_TIMEOUT", 0.05)
+    neo4j_db._session_slots.acquire()
+    neo4j_db._session_slots.acquire()
+    with pytest.raises(neo4j_db.SessionPoolTimeout):
+        asyncio.run(neo4j_db.read_async(echo, 1))
@@ -0,0 +1,143 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+import cache
+import config
+import path_service
+from datasets import load_book_tags, load_books
+
+
+@pytest.fixture(scope="module")
+def graph(dataset):
+    path_service.export("csv")
+    return path_service.load_graph()
+
+
+@pytest.fixture(scope="module")
+def reference(dataset):
+    """Adjacency by label, built straight from the CSVs rather than from the exported arrays."""
+    neighbors = {}
+
+    def link(a, b):
+        neighbors.setdefault(a, set()).add(b)
+        neighbors.setdefault(b, set()).add(a)
+    books = load_books().drop_duplicates("title")
+    for title, tag in zip(load_book_tags()["title"], load_book_tags()["tag_name"]):
+        link(title, f"Tag: {tag}")
+    for title, authors in zip(books["title"], books["authors"].fillna("")):
+        for author in filter(None, (a.strip() for a in authors.split(","))):
+            link(title, f"Author: {author}")
+    return neighbors
+
+
+def reference_distance(neighbors, source, target, max_hops):
+    dist = {source: 0}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        if node == target:
+            return dist[node]
+        if dist[node] == max_hops:
+            continue
+        for other in neighbors.get(node, ()):
+            if other not in dist:
+                dist[other] = dist[node] + 1
+                queue.append(other)
+    return None
+
+
+def node_pairs(graph, count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, len(graph.labels), (count, 2))
+
+
+@pytest.mark.parametrize("max_hops", [2, 3, config.PATH_MAX_HOPS])
+def test_bidirectional_bfs_matches_reference_bfs(graph, reference, max_hops):
+    for source, target in node_pairs(graph, 300):
+        path = graph.shortest(int(source), int(target), max_hops)
+        expected = reference_distance(reference, graph.labels[source], graph.labels[target], max_hops)
+        if expected is None:
+            assert path is None
+            continue
+        assert len(path) - 1 == expected
+        assert path[0] == source and path[-1] == target
+        for a, b in zip(path, path[1:]):
+            assert graph.labels[b] in reference[graph.labels[a]]
+
+
+def test_k_shortest_paths_are_distinct_loopless_and_ordered(graph, reference):
+    for source, target in node_pairs(graph, 40, seed=1):
+        if source == target:
+            continue
+        paths = graph.k_shortest(int(source), int(target), 4, config.PATH_MAX_HOPS, None, None)
+        shortest = reference_distance(reference, graph.labels[source], graph.labels[target], config.PATH_MAX_HOPS)
+        assert len(paths[0]) - 1 == shortest
+        assert len({tuple(p) for p in paths}) == len(paths)
+        assert [len(p) for p in paths] == sorted(len(p) for p in paths)
+        for path in paths:
+            assert len(set(path)) == len(path)
+            assert all(graph.labels[b] in reference[graph.labels[a]] for a, b in zip(path, path[1:]))
+
+
+def test_paths_are_cached_per_export_and_timeouts_are_not(graph, monkeypatch):
+    cache.data_reloaded()
+    books = sorted(graph.book_node)
+    title_a, title_b = books[0], books[1]
+    key = (title_a, title_b, 2, graph.meta_mtime)
+
+    monkeypatch.setattr(config, "PATH_TIME_BUDGET", -1.0)
+    assert path_service.get_shortest_path(title_a, title_b, k=2) is None
+    assert path_service._pair_paths.lookup(*key) is cache.MISS
+
+    monkeypatch.setattr(config, "PATH_TIME_BUDGET", 60.0)
+    paths = path_service.get_shortest_path(title_b, title_a, k=2)
+    assert paths and paths[0]["path_nodes"][0] == title_b
+    assert path_service._pair_paths.lookup(*key) is not cache.MISS
+    assert path_service._pair_paths.lookup(title_a, title_b, 2, graph.meta_mtime + 1) is cache.MISS
+
+
+def small_graph(edges):
+    """A PathGraph over an edge list of labels, without an export on disk."""
+    labels = sorted({node for edge in edges for node in edge})
+    ids = {label: i for i, label in enumerate(labels)}
+    adjacency = [[] for _ in labels]
+    for a, b in edges:
+        adjacency[ids[a]].append(ids[b])
+        adjacency[ids[b]].append(ids[a])
+    graph = object.__new__(path_service.PathGraph)
+    graph.labels = labels
+    graph.indptr = np.concatenate([[0], np.cumsum([len(n) for n in adjacency])])
+    graph.indices = np.array([n for neighbors in adjacency for n in sorted(neighbors)], dtype=np.int64)
+    graph.degree = np.diff(graph.indptr)
+    return graph, ids
+
+
+def test_hub_pruned_search_finds_paths_through_two_hubs():
+    # a-hub1-mid-hub2-b is the shortest path, but neither hub is expanded when pruning,
+    # which leaves only the 6-hop detour a-d1-...-d5-b
+    edges = [("a", "hub1"), ("hub1", "mid"), ("mid", "hub2"), ("hub2", "b")]
+    edges += [(hub, f"{hub}-leaf{i}") for hub in ("hub1", "hub2") for i in range(5)]
+    detour = ["a", "d1", "d2", "d3", "d4", "d5", "b"]
+    edges += list(zip(detour, detour[1:]))
+    graph, ids = small_graph(edges)
+    assert len(graph.shortest(ids["a"], ids["b"], 6, hub_limit=3)) - 1 == 6
+    path = graph.search(ids["a"], ids["b"], 6, 3, None)
+    assert [graph.labels[node] for node in path] == ["a", "hub1", "mid", "hub2", "b"]
+
+
+def test_hub_pruned_search_matches_reference_bfs(graph, reference):
+    hub_limit = int(np.median(graph.degree))
+    for source, target in node_pairs(graph, 300, seed=2):
+        path = graph.search(int(source), int(target), config.PATH_MAX_HOPS, hub_limit, None)
+        expected = reference_distance(reference, graph.labels[source], graph.labels[target], config.PATH_MAX_HOPS)
+        assert (path is None) if expected is None else len(path) - 1 == expected
+
+
+def test_unconnected_pairs_are_cached(graph, monkeypatch):
+    cache.data_reloaded()
+    monkeypatch.setattr(config, "PATH_MAX_HOPS", 1)  # books are never adjacent to books
+    title_a, title_b = sorted(graph.book_node)[:2]
+    assert path_service.get_shortest_path(title_a, title_b) == []
+    assert path_service._pair_paths.lookup(title_a, title_b, 1, graph.meta_mtime) == []
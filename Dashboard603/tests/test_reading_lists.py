@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import reading_lists
+import sql_queries
+
+
+@pytest.fixture(scope="module")
+def bitmaps(dataset):
+    reading_lists.build("csv")
+    reading_lists._books.cache_clear()
+    reading_lists._book_ids.cache_clear()
+    assert reading_lists.load_index() is not None
+
+
+def test_most_wanted_matches_sql_join(bitmaps, sql_engine):
+    expected = sql_queries._most_wanted_books_join.__wrapped__(limit=25)
+    actual = reading_lists.get_most_wanted_books(limit=25)
+    assert actual["title"].tolist() == expected["title"].tolist()
+    assert actual["want_count"].tolist() == expected["want_count"].tolist()
+    assert actual["already_rated"].tolist() == expected["already_rated"].tolist()
+
+
+def test_also_wanted_matches_sql_self_join(bitmaps, sql_engine):
+    titles = reading_lists.get_most_wanted_books(limit=100)["title"]
+    for title in [titles.iloc[0], titles.iloc[len(titles) // 2], titles.iloc[-1]]:
+        expected = sql_queries._also_wanted_books_join.__wrapped__(title, limit=15)
+        actual = reading_lists.get_also_wanted_books(title, limit=15)
+        assert actual["title"].tolist() == expected["title"].tolist()
+        assert actual["co_wanted"].tolist() == expected["co_wanted"].tolist()
+
+
+def test_user_reading_list_matches_sql_join(bitmaps, sql_engine):
+    with sql_engine.connect() as conn:
+        users = conn.execute(text("SELECT DISTINCT user_id FROM to_read ORDER BY user_id LIMIT 30")).scalars().all()
+    for user_id in users + [10**6]:
+        expected = sql_queries._user_reading_list_join.__wrapped__(user_id)
+        actual = reading_lists.get_user_reading_list(user_id)
+        assert sorted(zip(actual["title"], actual["rated"])) == sorted(zip(expected["title"], expected["rated"]))
+
+
+def test_intersection_counts_without_bitwise_count(bitmaps, monkeypatch):
+    # The byte-table popcount used on NumPy 1.x gives the same counts
+    index = reading_lists.load_index()
+    book_id = int(np.argmax(index.to_read.cardinality))
+    bitset = index.to_read.bitset(book_id)
+    expected = index.to_read.intersection_counts(bitset)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert (index.to_read.intersection_counts(bitset) == expected).all()
+    assert len(index.to_read.bitset_books) > 0
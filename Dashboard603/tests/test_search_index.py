@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import config
+import datasets
+import search_index
+
+
+@pytest.fixture
+def index(dataset, monkeypatch):
+    monkeypatch.setattr(datasets, "_rating_overlay", (0, None))
+    return search_index.BookSearchIndex(datasets.load_books())
+
+
+def test_every_query_word_matches_a_token_prefix(index):
+    books = datasets.load_books().set_index("title")
+    found = index.search("synth book 1", limit=None)
+    assert len(found) > 0
+    for title in found["title"]:
+        book = books.loc[title]
+        tokens = search_index.tokenize(f"{title} {book['original_title']} {book['authors']}")
+        assert all(any(token.startswith(word) for token in tokens) for word in ("synth", "book", "1"))
+
+
+@pytest.mark.parametrize("keyword", ["!!!", "--", " ? "])
+def test_punctuation_only_keywords_match_nothing(index, keyword):
+    assert len(index.search_ids(keyword)) == 0
+
+
+def test_blank_keyword_lists_every_book(index):
+    assert len(index.search_ids("  ", limit=None)) == len(datasets.load_books())
+
+
+def test_rating_overlay_replaces_exported_ratings(index):
+    book = datasets.load_books().iloc[0]
+    datasets.set_rating_overlay(pd.DataFrame({
+        "book_id": [book["book_id"]], "title": [book["title"]], "average_rating": [1.0], "ratings_count": [7],
+    }))
+    index.sync_ratings()
+    found = index.search(book["title"], limit=None)
+    row = found[found["title"] == book["title"]].iloc[0]
+    assert row["average_rating"] == 1.0 and row["ratings_count"] == 7
+    assert book["title"] not in index.search(book["title"], min_rating=1.5, limit=None)["title"].tolist()
+
+
+def test_failed_build_is_not_retried_until_the_backoff_passes(monkeypatch):
+    calls = []
+
+    def broken_books():
+        calls.append(1)
+        raise OSError("books.csv missing")
+    monkeypatch.setattr(search_index, "load_books", broken_books)
+    monkeypatch.setattr(search_index, "_index", None)
+    monkeypatch.setattr(search_index, "_failed_at", None)
+    assert search_index.search("anything") is None
+    assert search_index.search("anything") is None
+    assert len(calls) == 1
+    monkeypatch.setattr(config, "SEARCH_INDEX_RETRY_INTERVAL", 0)
+    assert search_index.search("anything") is None
+    assert len(calls) == 2
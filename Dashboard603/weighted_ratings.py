@@ -0,0 +1,203 @@
+"""
+Bayesian-average ("weighted") rating of every book, computed in batch and stored indexed.
+
+Ranked by raw average_rating, a book with a few dozen 5-star ratings outranks one that
+averages 4.6 over millions, and every change of the Top-Rated slider re-sorts the catalog.
+The weighted rating pulls each book's average towards the catalog mean, harder the fewer
+ratings it has:
+
+    weighted_rating = (C * m + sum(star * ratings_star)) / (C + sum(ratings_star))
+
+m is the mean of all ratings in the catalog, from the ratings_1..5 histograms. C, the
+weight of the prior in ratings, is the WEIGHTED_RATING_PRIOR_QUANTILE of the books' rating
+counts. build() stores the score in books.weighted_rating, indexed together with
+ratings_count in the Top-Rated sort order, and on the Book nodes (index
+book_weighted_rating). The Top-Rated and by-tag queries then read the ranking from an index
+instead of sorting raw averages.
+
+book_ratings.py rescores the books it updates with the stored prior, and its reconcile
+recomputes the prior and every score. Books loaded after the last build are scored with the
+stored prior by score_new_books(), which ingest.py and book_ratings.py run. The DuckDB
+backend computes the column in its books view (duckdb_store.py).
+
+Usage (from Dashboard603/):
+    python weighted_ratings.py build [--no-neo4j]
+"""
+
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+
+import config
+from sql_queries import get_engine
+
+
+STAR_COLUMNS = [f"ratings_{star}" for star in range(1, 6)]
+STARS = np.arange(1, 6)
+
+ADD_COLUMN = "ALTER TABLE books ADD COLUMN weighted_rating DECIMAL(5, 4)"
+INDEX_NAME = "idx_books_weighted_rating"
+INDEX_COLUMNS = ["weighted_rating", "ratings_count"]  # the Top-Rated ORDER BY, so LIMIT stops the index scan
+ADD_INDEX = f"CREATE INDEX {INDEX_NAME} ON books ({', '.join(INDEX_COLUMNS)})"
+
+CREATE_PRIOR = """
+CREATE TABLE IF NOT EXISTS weighted_rating_prior (
+    id TINYINT PRIMARY KEY,
+    prior_mean DOUBLE NOT NULL,
+    prior_count DOUBLE NOT NULL,
+    computed_at DATETIME NOT NULL
+)
+"""
+
+UPDATE_SCORE = "UPDATE books SET weighted_rating = :weighted_rating WHERE book_id = :book_id"
+
+# Matched like book_ratings.SET_BOOK_NODES: on book_id, else on title for dump-restored graphs
+SET_BOOK_SCORES = """
+UNWIND $rows AS row
+OPTIONAL MATCH (byId:Book {book_id: row.book_id})
+OPTIONAL MATCH (byTitle:Book {title: row.title}) WHERE byId IS NULL
+WITH row, coalesce(byId, byTitle) AS b
+WHERE b IS NOT NULL
+SET b.weighted_rating = row.weighted_rating
+"""
+
+
+def prior(stars):
+    """(mean, count) of the prior from an (n_books, 5) array of star counts."""
+    stars = np.asarray(stars, dtype=np.float64)
+    totals = stars.sum(axis=1)
+    mean = float(stars.sum(axis=0) @ STARS / max(totals.sum(), 1))
+    count = float(np.quantile(totals, config.WEIGHTED_RATING_PRIOR_QUANTILE)) if len(totals) else 0.0
+    return mean, count
+
+
+def score(stars, prior_mean, prior_count):
+    """Weighted rating of each row of an (n_books, 5) array of star counts, rounded to 4 places."""
+    stars = np.asarray(stars, dtype=np.float64)
+    totals = stars.sum(axis=1)
+    return np.round((prior_count * prior_mean + stars @ STARS) / np.maximum(prior_count + totals, 1e-9), 4)
+
+
+def score_sql(prior_mean, prior_count):
+    """score() as a SQL expression over the ratings_1..5 columns."""
+    weighted_sum = " + ".join(f"{star} * {column}" for star, column in zip(STARS, STAR_COLUMNS))
+    total = " + ".join(STAR_COLUMNS)
+    return (f"ROUND(({prior_count!r} * {prior_mean!r} + {weighted_sum}) / "
+            f"GREATEST({prior_count!r} + {total}, 1e-9), 4)")
+
+
+def ensure_schema(engine=None):
+    """Add books.weighted_rating with its (weighted_rating, ratings_count) index and the prior table if they are missing."""
+    engine = engine or get_engine()
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("books")}
+    indexes = {i["name"]: i["column_names"] for i in inspector.get_indexes("books")}
+    with engine.begin() as conn:
+        if "weighted_rating" not in columns:
+            conn.execute(text(ADD_COLUMN))
+        if indexes.get(INDEX_NAME) != INDEX_COLUMNS:
+            if INDEX_NAME in indexes:  # the single-column index of earlier versions
+                on_table = " ON books" if conn.dialect.name == "mysql" else ""
+                conn.execute(text(f"DROP INDEX {INDEX_NAME}{on_table}"))
+            conn.execute(text(ADD_INDEX))
+        conn.execute(text(CREATE_PRIOR))
+
+
+def load_prior(conn):
+    """The stored (mean, count), or None before the first build."""
+    try:
+        row = conn.execute(text("SELECT prior_mean, prior_count FROM weighted_rating_prior WHERE id = 1")).first()
+    except Exception:
+        return None
+    return (float(row[0]), float(row[1])) if row is not None else None
+
+
+def score_new_books(engine=None):
+    """
+    Score the books without a weighted_rating (loaded since the last build) with the stored prior.
+
+    Returns the number of books scored; 0 before the first build, when there is no prior.
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        prior = load_prior(conn)
+        if prior is None:
+            return 0
+        books = pd.read_sql(text(
+            f"SELECT book_id, {', '.join(STAR_COLUMNS)} FROM books WHERE weighted_rating IS NULL"
+        ), conn)
+        scores = score(books[STAR_COLUMNS].apply(pd.to_numeric).fillna(0).to_numpy(), *prior)
+        rows = [{"book_id": int(book_id), "weighted_rating": float(weighted)}
+                for book_id, weighted in zip(books["book_id"], scores)]
+        for start in range(0, len(rows), config.BOOK_RATINGS_BATCH_SIZE):
+            conn.execute(text(UPDATE_SCORE), rows[start:start + config.BOOK_RATINGS_BATCH_SIZE])
+    return len(rows)
+
+
+def build(neo4j=True, engine=None):
+    """
+    Recompute the prior and every book's weighted rating, in SQL and on the Book nodes.
+
+    Returns a dict with the books scored, the prior mean and count, and the Book nodes
+    written (None with neo4j=False).
+    """
+    engine = engine or get_engine()
+    ensure_schema(engine)
+    with engine.begin() as conn:
+        books = pd.read_sql(text(f"SELECT book_id, title, {', '.join(STAR_COLUMNS)} FROM books"), conn)
+        stars = books[STAR_COLUMNS].apply(pd.to_numeric).fillna(0).to_numpy()
+        prior_mean, prior_count = prior(stars)
+        books["weighted_rating"] = score(stars, prior_mean, prior_count)
+
+        rows = [{"book_id": int(book_id), "weighted_rating": float(weighted)}
+                for book_id, weighted in zip(books["book_id"], books["weighted_rating"])]
+        for start in range(0, len(rows), config.BOOK_RATINGS_BATCH_SIZE):
+            conn.execute(text(UPDATE_SCORE), rows[start:start + config.BOOK_RATINGS_BATCH_SIZE])
+        conn.execute(text("DELETE FROM weighted_rating_prior"))
+        conn.execute(text("""
+            INSERT INTO weighted_rating_prior (id, prior_mean, prior_count, computed_at)
+            VALUES (1, :mean, :count, :now)
+        """), {"mean": prior_mean, "count": prior_count, "now": datetime.datetime.now()})
+
+    nodes = None
+    if neo4j:
+        nodes = write_book_nodes(books[["book_id", "title", "weighted_rating"]])
+    return {"books": len(books), "prior_mean": prior_mean, "prior_count": prior_count, "nodes": nodes}
+
+
+def write_book_nodes(scores):
+    """SET weighted_rating on the Book nodes from a DataFrame of book_id, title, weighted_rating; returns the rows written."""
+    import neo4j_db
+
+    rows = [{"book_id": int(book_id), "title": title, "weighted_rating": float(weighted)}
+            for book_id, title, weighted in zip(scores["book_id"], scores["title"], scores["weighted_rating"])]
+    with neo4j_db.session() as session:
+        for start in range(0, len(rows), config.BOOK_RATINGS_BATCH_SIZE):
+            batch = rows[start:start + config.BOOK_RATINGS_BATCH_SIZE]
+            session.execute_write(lambda tx: tx.run(SET_BOOK_SCORES, rows=batch).consume())
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the Bayesian-average rating of every book.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="recompute the prior and every score")
+    build_parser.add_argument("--sql-url", help="SQLAlchemy URL (default: the dashboard's engine from config.py)")
+    build_parser.add_argument("--no-neo4j", action="store_true", help="update SQL only")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = create_engine(args.sql_url) if args.sql_url else get_engine()
+    result = build(neo4j=not args.no_neo4j, engine=engine)
+    print(f"Scored {result['books']:,} books (prior: mean {result['prior_mean']:.3f} over "
+          f"{result['prior_count']:,.0f} ratings)"
+          + (f", {result['nodes']:,} Book nodes written" if result["nodes"] is not None else "")
+          + f" in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()